@@ -0,0 +1,157 @@
+import os
+import sys
+import json
+import shutil
+import argparse
+import multiprocessing
+from time import perf_counter, time
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from explorer import SablsUnarchiver
+from tree import PathTree
+import synth
+
+try:
+    import resource
+except ImportError:  # windows, peak memory just doesn't get reported
+    resource = None
+
+# Indexing benchmark
+#   python bench.py "Game Files/all/zm_asylum.all.sabs" --jobs 16
+#
+# Times the single threaded scan against the parallel one on the same archive and prints the speedup.
+# The first run of each warms the OS cache, so the numbers compare scan speed rather than disk speed.
+#
+# Suite
+#   python bench.py --suite 16M 256M 4G 20G --workdir /scratch/sabls-bench --json results.jsonl
+#
+# Times load, index, tree build, selecting one entry and dumping everything on synthetic archives
+#   of each size, made by synth.py with a fixed seed and kept in workdir so later runs measure the
+#   exact same bytes. Every step runs in a fresh process so its peak RSS is its own, note that pages
+#   of the mapped archive count towards it once they've been touched. Steps that need an index load it
+#   out of the index cache (the suite indexes every archive once up front), and the peak from before the
+#   timed step starts is reported next to it as setup, so what the step itself adds is the difference.
+
+def time_it(function, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        best = min(best, perf_counter() - start)
+    return best
+
+def bench_index(archive: Path, jobs: int, repeat: int):
+    size = os.path.getsize(archive)
+    
+    def mapped():
+        with SablsUnarchiver.load_archive(archive) as archive_file:
+            SablsUnarchiver.find_flacs(archive_file, progress_callback=None)
+    
+    runs = [
+        ("find_flacs (mmap)", mapped),
+        ("index_archive (streamed)", lambda: SablsUnarchiver.index_archive(archive, progress_callback=None, use_cache=False)),
+    ]
+    for workers in sorted({1, 2, 4, 8, jobs}):
+        if workers <= jobs:
+            runs.append(("find_flacs_parallel x{}".format(workers), lambda workers=workers: SablsUnarchiver.find_flacs_parallel(archive, workers, progress_callback=None)))
+    
+    entries = len(SablsUnarchiver.index_archive(archive, progress_callback=None, use_cache=False))
+    print("{} - {:0.1f} MiB, {} entries, best of {}".format(archive.name, size / 2**20, entries, repeat))
+    print("{:<28}{:>10}{:>12}{:>10}".format("", "seconds", "MiB/s", "speedup"))
+    baseline = None
+    for name, function in runs:
+        seconds = time_it(function, repeat)
+        baseline = baseline or seconds
+        print("{:<28}{:>10.3f}{:>12.1f}{:>9.2f}x".format(name, seconds, size / 2**20 / seconds, baseline / seconds))
+
+suite_steps = ["load", "index", "tree", "select", "dump"]
+suite_seed = 1
+
+def peak_rss() -> int | None:
+    # Peak resident set in bytes, of this process or the biggest of its workers
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def suite_archive(workdir: Path, size: int) -> Path:
+    # The synthetic archive for size, only written the first time
+    archive = workdir / "synth-{}-{}.sabs".format(size, suite_seed)
+    if not archive.is_file():
+        print("Writing {}".format(archive.name))
+        partial = archive.with_suffix(".partial")
+        entries = synth.entries_for_size(size, 64 * 1024, 1024 * 1024)
+        synth.write_archive(partial, entries, 64 * 1024, 1024 * 1024, suite_seed, spurious=0.02, unnamed=0.01)
+        partial.replace(archive)
+    return archive
+
+def _run_step(step: str, archive: Path, workdir: Path, jobs: int, repeat: int) -> tuple[float, int | None, int | None]:
+    # Runs in its own process, (best seconds, peak rss, peak rss before the step) of one step
+    with SablsUnarchiver.load_archive(archive) as archive_file:
+        flacs = SablsUnarchiver.index_archive(archive, progress_callback=None) if step in ("tree", "select", "dump") else None
+        target = workdir / "dump"
+        setup_peak = peak_rss()
+        
+        def run():
+            if step == "load":
+                SablsUnarchiver.load_archive(archive).close()
+            elif step == "index":
+                SablsUnarchiver.index_archive(archive, progress_callback=None, use_cache=False, jobs=jobs)
+            elif step == "tree":
+                PathTree(flacs)
+            elif step == "select":
+                bytes(SablsUnarchiver.select_file(archive_file, flacs, len(flacs) // 2))
+            elif step == "dump":
+                SablsUnarchiver.dump_archive(target, archive_file, flacs, jobs)
+        
+        seconds = float('inf')
+        for _ in range(repeat):
+            shutil.rmtree(target, ignore_errors=True)
+            start = perf_counter()
+            run()
+            seconds = min(seconds, perf_counter() - start)
+        shutil.rmtree(target, ignore_errors=True)
+    return seconds, peak_rss(), setup_peak
+
+def bench_suite(sizes: list[int], workdir: Path, steps: list[str], jobs: int, repeat: int, record: Path = None):
+    workdir.mkdir(parents=True, exist_ok=True)
+    context = multiprocessing.get_context("spawn")
+    print("{:<12}{:>9}{:<3}{:<8}{:>10}{:>12}{:>12}{:>12}".format("archive", "entries", "", "step", "seconds", "MiB/s", "peak MiB", "setup MiB"))
+    for size in sizes:
+        archive = suite_archive(workdir, size)
+        archive_size = archive.stat().st_size
+        entries = len(SablsUnarchiver.index_archive(archive, progress_callback=None))  # and cached for the steps
+        for step in steps:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                seconds, peak, setup_peak = pool.submit(_run_step, step, archive, workdir, jobs, repeat).result()
+            throughput = archive_size / 2**20 / seconds if step in ("index", "dump") else None
+            print("{:<12}{:>9}{:<3}{:<8}{:>10.3f}{:>12}{:>12}{:>12}".format(
+                "{:0.1f} MiB".format(archive_size / 2**20), entries, "", step, seconds,
+                "{:0.1f}".format(throughput) if throughput else "-", "{:0.1f}".format(peak / 2**20) if peak else "-",
+                "{:0.1f}".format(setup_peak / 2**20) if setup_peak else "-"
+            ))
+            if record:
+                with open(record, "a") as record_file:
+                    record_file.write(json.dumps({
+                        "time": time(), "archive_bytes": archive_size, "entries": entries, "step": step,
+                        "seconds": seconds, "peak_rss": peak, "setup_rss": setup_peak, "jobs": jobs, "repeat": repeat,
+                    }) + "\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark SABLS archive indexing, or the whole pipeline on synthetic archives")
+    parser.add_argument("archive", type=Path, nargs="?")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--suite", type=synth.parse_size, nargs="+", metavar="SIZE", help="archive sizes for the suite, like 16M 1G 20G")
+    parser.add_argument("--steps", nargs="+", choices=suite_steps, default=suite_steps)
+    parser.add_argument("--workdir", type=Path, default=Path("bench"), help="where the synthetic archives are kept and dumped to")
+    parser.add_argument("--json", type=Path, default=None, help="append every result as a JSON line to this file")
+    args = parser.parse_args()
+    
+    if args.suite:
+        bench_suite(args.suite, args.workdir, args.steps, args.jobs, args.repeat, args.json)
+    elif args.archive is None or not args.archive.is_file():
+        print("No archive at {}".format(args.archive))
+        sys.exit(1)
+    else:
+        bench_index(args.archive, args.jobs, args.repeat)
@@ -0,0 +1,233 @@
+import os
+import sys
+import zlib
+import struct
+import hashlib
+from array import array
+from pathlib import Path
+
+# On-disk index cache
+#   One file per archive in the user cache dir, named after a hash of the archive's absolute path.
+#   An entry is only trusted if the archive's path, size, mtime and a fingerprint of its first and
+#   last 64KiB all still match, and the payload checksum is good. Anything else gets thrown out
+#   and the caller rescans.
+#
+#   Layout, all little endian:
+#     header    magic "SBIX", version, entry count, archive size, archive mtime (ns),
+#               fingerprint, payload crc32, length of the archive path, whether hashes are stored
+#     path      the archive's absolute path, utf-8
+#     payload   offsets as u64[count], lengths as u64[count], flags as u8[count], kinds as u8[count],
+#               the raw path table (128 bytes per entry), then the content hashes (16 bytes per entry)
+#               if the index has been hashed
+
+cache_magic = b"SBIX"
+cache_version = 4
+fingerprint_span = 64 * 1024
+
+header = struct.Struct("<4sHIQQ16sIHB")
+
+# Bulk metadata (see metadata.py), one file per archive next to its index
+#   Same checks as the index, plus a crc of the offsets and lengths it was read for so a rescan
+#   that comes out different throws it away
+#     header    magic "SBMD", version, entry count, archive size, archive mtime (ns), fingerprint,
+#               crc32 of the entries, payload crc32
+#     payload   sample rates u32[count], channels u8[count], bits u8[count], total samples u64[count],
+#               md5s (16 bytes per entry), comment ends u32[count], then the comments
+metadata_magic = b"SBMD"
+metadata_version = 1
+metadata_header = struct.Struct("<4sHIQQ16sII")
+
+# Waveform peaks, one small file per entry under peaks/
+#   An entry's bytes are pinned down by the archive, its size and mtime, and where the entry sits in
+#   it, so those make the file name and there's nothing to check on the way back in but the crc.
+peaks_magic = b"SBPK"
+peaks_version = 1
+peaks_header = struct.Struct("<4sHI")
+
+def cache_dir() -> Path:
+    # $SABLS_CACHE_DIR wins, otherwise wherever the platform keeps caches
+    if os.environ.get("SABLS_CACHE_DIR"):
+        return Path(os.environ["SABLS_CACHE_DIR"])
+    if sys.platform == "win32":
+        base = Path(os.environ.get("LOCALAPPDATA", Path.home() / "AppData" / "Local"))
+    elif sys.platform == "darwin":
+        base = Path.home() / "Library" / "Caches"
+    else:
+        base = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"))
+    return base / "sabls-explorer"
+
+def cache_path(archive: Path) -> Path:
+    key = hashlib.blake2b(str(Path(archive).resolve()).encode("utf-8"), digest_size=16).hexdigest()
+    return cache_dir() / (key + ".sbix")
+
+def fingerprint(archive_file, size: int) -> bytes:
+    # Cheap content check, catches archives that were swapped without the mtime changing
+    digest = hashlib.blake2b(size.to_bytes(8, "little"), digest_size=16)
+    archive_file.seek(0)
+    digest.update(archive_file.read(fingerprint_span))
+    if size > fingerprint_span:
+        archive_file.seek(max(fingerprint_span, size - fingerprint_span))
+        digest.update(archive_file.read(fingerprint_span))
+    return digest.digest()
+
+def _archive_key(archive: Path) -> tuple[bytes, int, int, bytes]:
+    archive = Path(archive).resolve()
+    with open(archive, "rb") as archive_file:
+        stat = os.fstat(archive_file.fileno())
+        return str(archive).encode("utf-8"), stat.st_size, stat.st_mtime_ns, fingerprint(archive_file, stat.st_size)
+
+def load_index(archive: Path) -> tuple[array, array, array, bytes, bytes | None, array] | None:
+    # Returns (offsets, lengths, flags, path table, hashes, kinds) or None when there is no usable entry
+    cached = cache_path(archive)
+    try:
+        with open(cached, "rb") as cache_file:
+            data = cache_file.read()
+    except OSError:
+        return None
+    
+    try:
+        path, size, mtime, digest = _archive_key(archive)
+        magic, version, count, cached_size, cached_mtime, cached_digest, crc, path_length, hashed = header.unpack_from(data)
+        if magic != cache_magic or version != cache_version:
+            raise ValueError("unknown cache format")
+        payload = memoryview(data)[header.size + path_length:]
+        if bytes(data[header.size : header.size + path_length]) != path:
+            return None  # hash collision with some other archive, leave its entry alone
+        if (cached_size, cached_mtime, cached_digest) != (size, mtime, digest):
+            raise ValueError("archive changed")
+        if len(payload) != count * (8 + 8 + 1 + 1 + 128 + (16 if hashed else 0)) or zlib.crc32(payload) != crc:
+            raise ValueError("corrupt cache")
+    except (ValueError, struct.error):
+        drop_index(archive)
+        return None
+    except OSError:
+        return None
+    
+    offsets = _unpack("Q", payload[: count * 8])
+    lengths = _unpack("Q", payload[count * 8 : count * 16])
+    flags = _unpack("B", payload[count * 16 : count * 17])
+    kinds = _unpack("B", payload[count * 17 : count * 18])
+    file_paths = bytes(payload[count * 18 : count * 146])
+    hashes = bytes(payload[count * 146:]) if hashed else None
+    return offsets, lengths, flags, file_paths, hashes, kinds
+
+def store_index(archive: Path, offsets: list[int], lengths: list[int], flags: list[int], file_paths: bytes, hashes: bytes = None, kinds: list[int] = None):
+    # Best effort, a cache that can't be written just means a rescan next time
+    try:
+        path, size, mtime, digest = _archive_key(archive)
+        kinds = kinds if kinds is not None else bytes(len(offsets))
+        payload = _pack("Q", offsets) + _pack("Q", lengths) + _pack("B", flags) + _pack("B", kinds) + bytes(file_paths) + (hashes or b"")
+        
+        cached = cache_path(archive)
+        os.makedirs(cached.parent, exist_ok=True)
+        temp = cached.with_suffix(".tmp{}".format(os.getpid()))
+        with open(temp, "wb") as cache_file:
+            cache_file.write(header.pack(cache_magic, cache_version, len(offsets), size, mtime, digest, zlib.crc32(payload), len(path), hashes is not None))
+            cache_file.write(path)
+            cache_file.write(payload)
+        os.replace(temp, cached)  # readers never see half a file
+    except OSError as error:
+        print("Couldn't write index cache: {}".format(error))
+
+def _pack(typecode: str, values) -> bytes:
+    packed = array(typecode, values)
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return packed.tobytes()
+
+def _unpack(typecode: str, data) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+def drop_index(archive: Path):
+    try:
+        os.remove(cache_path(archive))
+    except OSError:
+        pass
+
+def metadata_path(archive: Path) -> Path:
+    return cache_path(archive).with_suffix(".sbmd")
+
+def _entries_crc(offsets, lengths) -> int:
+    return zlib.crc32(_pack("Q", lengths), zlib.crc32(_pack("Q", offsets)))
+
+def load_metadata(archive: Path, offsets, lengths) -> tuple | None:
+    # Columns for ArchiveMetadata, or None when there is no usable entry for this index
+    try:
+        with open(metadata_path(archive), "rb") as cache_file:
+            data = cache_file.read()
+        _, size, mtime, digest = _archive_key(archive)
+        magic, version, count, cached_size, cached_mtime, cached_digest, entries_crc, crc = metadata_header.unpack_from(data)
+    except (OSError, struct.error):
+        return None
+    payload = memoryview(data)[metadata_header.size:]
+    if (
+        magic != metadata_magic or version != metadata_version or count != len(offsets)
+        or (cached_size, cached_mtime, cached_digest) != (size, mtime, digest)
+        or entries_crc != _entries_crc(offsets, lengths) or zlib.crc32(payload) != crc
+        or len(payload) < count * 34
+    ):
+        return None
+    
+    rates = _unpack("I", payload[: count * 4])
+    channels = _unpack("B", payload[count * 4 : count * 5])
+    bits = _unpack("B", payload[count * 5 : count * 6])
+    totals = _unpack("Q", payload[count * 6 : count * 14])
+    md5s = bytes(payload[count * 14 : count * 30])
+    ends = _unpack("I", payload[count * 30 : count * 34])
+    comments = bytes(payload[count * 34:])
+    return rates, channels, bits, totals, md5s, comments, ends
+
+def store_metadata(archive: Path, offsets, lengths, rates, channels, bits, totals, md5s: bytes, comments: bytes, ends):
+    try:
+        _, size, mtime, digest = _archive_key(archive)
+        payload = (
+            _pack("I", rates) + _pack("B", channels) + _pack("B", bits) + _pack("Q", totals)
+            + bytes(md5s) + _pack("I", ends) + bytes(comments)
+        )
+        cached = metadata_path(archive)
+        os.makedirs(cached.parent, exist_ok=True)
+        temp = cached.with_suffix(".tmp{}".format(os.getpid()))
+        with open(temp, "wb") as cache_file:
+            cache_file.write(metadata_header.pack(
+                metadata_magic, metadata_version, len(offsets), size, mtime, digest,
+                _entries_crc(offsets, lengths), zlib.crc32(payload)
+            ))
+            cache_file.write(payload)
+        os.replace(temp, cached)
+    except OSError as error:
+        print("Couldn't write metadata cache: {}".format(error))
+
+def peaks_path(archive: Path, offset: int, length: int) -> Path:
+    archive = Path(archive).resolve()
+    stat = os.stat(archive)
+    key = "{}\0{}\0{}\0{}\0{}".format(archive, stat.st_size, stat.st_mtime_ns, offset, length)
+    return cache_dir() / "peaks" / (hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest() + ".sbpk")
+
+def load_peaks(archive: Path, offset: int, length: int) -> bytes | None:
+    # The peaks stored for an entry (see waveform.to_bytes) or None
+    try:
+        with open(peaks_path(archive, offset, length), "rb") as peaks_file:
+            data = peaks_file.read()
+        magic, version, crc = peaks_header.unpack_from(data)
+    except (OSError, struct.error):
+        return None
+    payload = data[peaks_header.size:]
+    if magic != peaks_magic or version != peaks_version or zlib.crc32(payload) != crc:
+        return None
+    return payload
+
+def store_peaks(archive: Path, offset: int, length: int, peaks: bytes):
+    try:
+        cached = peaks_path(archive, offset, length)
+        os.makedirs(cached.parent, exist_ok=True)
+        temp = cached.with_suffix(".tmp{}".format(os.getpid()))
+        with open(temp, "wb") as peaks_file:
+            peaks_file.write(peaks_header.pack(peaks_magic, peaks_version, zlib.crc32(peaks)))
+            peaks_file.write(peaks)
+        os.replace(temp, cached)
+    except OSError as error:
+        print("Couldn't write waveform cache: {}".format(error))
@@ -0,0 +1,192 @@
+import os
+import sys
+import argparse
+from time import perf_counter
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from explorer import SablsUnarchiver, SablsArchive
+from index import ArchiveIndex
+import cache
+import extract
+import formats
+
+# Catalog of every archive in a game install
+#   python catalog.py "Game Files/all" --jobs 8
+#
+# Archives are keyed by their path relative to the catalog root ("zm_asylum.all.sabs"), entries by
+#   (archive, index into that archive's ArchiveIndex). Updating a catalog only reindexes archives
+#   that changed since it last looked, anything else comes from memory or the on-disk index cache,
+#   and the archives that do need scanning are spread over a bounded process pool.
+#
+# Extracting from the catalog can dedupe across archives, a stock sound that's in twenty of them
+#   gets written once and hardlinked (or reflinked) everywhere else.
+
+archive_patterns = ("*.sabs", "*.sabl")
+
+class Catalog:
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.archives: dict[str, ArchiveIndex] = {}
+        self.stamps: dict[str, tuple[int, int]] = {}  # (size, mtime) each index was built from
+        self.__by_path = None
+        self.stats = {}
+    
+    def __len__(self) -> int:
+        return sum(len(index) for index in self.archives.values())
+    
+    def __getitem__(self, key: tuple[str, int]) -> tuple[int, bytes, int, int]:
+        archive, entry = key
+        return self.archives[archive][entry]
+    
+    def archive_path(self, archive: str) -> Path:
+        return self.root / archive
+    
+    def entries(self):
+        # Every (archive, entry) in the catalog, archive by archive
+        for archive, index in self.archives.items():
+            for entry in range(len(index)):
+                yield archive, entry
+    
+    def path(self, key: tuple[str, int]) -> str:
+        archive, entry = key
+        return self.archives[archive].path(entry)
+    
+    def find(self, path: str) -> list[tuple[str, int]]:
+        # Every entry with exactly this path (\ separated), across all archives
+        if self.__by_path is None:
+            self.__by_path = {}
+            for key in self.entries():
+                self.__by_path.setdefault(self.path(key).lower(), []).append(key)
+        return self.__by_path.get(path.replace("/", "\\").lower(), [])
+    
+    def discover(self) -> list[str]:
+        return sorted(
+            archive.relative_to(self.root).as_posix()
+            for pattern in archive_patterns
+            for archive in self.root.rglob(pattern)
+            if archive.is_file()
+        )
+    
+    def update(self, jobs: int = None, use_cache: bool = True, progress_callback=None, hashes: bool = False) -> 'Catalog':
+        # Brings the catalog in line with what's on disk, progress is by archives finished
+        #   hashes makes sure every archive's index has its content hashes
+        start = perf_counter()
+        found = self.discover()
+        for gone in set(self.archives) - set(found):
+            del self.archives[gone]
+            del self.stamps[gone]
+        
+        stale = []
+        skipped = 0
+        for archive in found:
+            stat = os.stat(self.archive_path(archive))
+            stamp = (stat.st_size, stat.st_mtime_ns)
+            if self.stamps.get(archive) == stamp and (self.archives[archive].hashes is not None or not hashes):
+                skipped += 1
+                continue
+            cached = cache.load_index(self.archive_path(archive)) if use_cache else None
+            if cached and (cached[4] is not None or not hashes):
+                self.archives[archive] = ArchiveIndex(*cached)
+                self.stamps[archive] = stamp
+                skipped += 1
+            else:
+                stale.append((archive, stamp))
+        
+        scanned_bytes = sum(stamp[0] for _, stamp in stale)
+        if stale:
+            with ProcessPoolExecutor(max_workers=min(jobs or os.cpu_count() or 1, len(stale))) as pool:
+                pending = {
+                    pool.submit(SablsUnarchiver.index_archive, self.archive_path(archive), None, use_cache, 1, hashes): (archive, stamp)
+                    # biggest first, so one huge archive doesn't end up alone at the back of the queue
+                    for archive, stamp in sorted(stale, key=lambda item: -item[1][0])
+                }
+                for done, finished in enumerate(as_completed(pending)):
+                    archive, stamp = pending[finished]
+                    self.archives[archive] = finished.result()
+                    self.stamps[archive] = stamp
+                    if progress_callback:
+                        progress_callback((skipped + done + 1) / len(found) * 100)
+        if progress_callback:
+            progress_callback(float('inf'))
+        
+        self.archives = {archive: self.archives[archive] for archive in found}  # keep them in path order
+        self.__by_path = None
+        seconds = perf_counter() - start
+        self.stats = {
+            "archives": len(found),
+            "scanned": len(stale),
+            "skipped": skipped,
+            "entries": len(self),
+            "scanned_bytes": scanned_bytes,
+            "seconds": seconds,
+            "archives_per_second": len(stale) / seconds if seconds else 0.0,
+            "gb_per_second": scanned_bytes / 1e9 / seconds if seconds else 0.0,
+        }
+        return self
+    
+    def extract(self, unarchive_path: Path, entries=None, jobs: int = None, dedup: str = None, progress_callback=None):
+        # Extracts (archive, entry) pairs, everything by default, each archive into its own directory
+        #   dedup ("hardlink" or "reflink") writes every distinct entry once across all the archives
+        if dedup:
+            self.update(jobs, hashes=True)
+        by_archive = {}
+        for archive, entry in (self.entries() if entries is None else entries):
+            by_archive.setdefault(archive, []).append(entry)
+        
+        plans = []
+        originals = {}
+        links = []
+        for archive, indices in by_archive.items():
+            index = self.archives[archive]
+            copies = [
+                (index.offsets[i], index.lengths[i], Path(unarchive_path) / archive / SablsUnarchiver.to_filepath(index.path_block(i), i, formats.formats[index.kinds[i]].extension))
+                for i in indices
+            ]
+            if dedup:
+                copies, duplicates = extract.dedupe(copies, [(index.content_hash(i), index.lengths[i]) for i in indices], originals)
+                links += duplicates
+            plans.append((archive, copies))
+        
+        total = sum(length for _, copies in plans for _, length, _ in copies) + sum(length for _, _, length in links) or 1
+        done = 0
+        def scaled(stage_bytes: int):
+            # maps one stage's percentage onto the whole extraction
+            def callback(progress: float):
+                if progress_callback and progress != float('inf'):
+                    progress_callback((done + stage_bytes * progress / 100) / total * 100)
+            return callback
+        
+        for archive, copies in plans:
+            stage_bytes = sum(length for _, length, _ in copies)
+            with SablsArchive(self.archive_path(archive)) as mapped:
+                extract.copy_ranges(mapped.path, copies, mapped.view, jobs, scaled(stage_bytes))
+            done += stage_bytes
+        if links:
+            extract.copy_ranges(None, [], None, jobs, scaled(total - done), links, dedup)
+        if progress_callback:
+            progress_callback(float('inf'))
+    
+    def summary(self) -> str:
+        stats = self.stats
+        return "{} archives ({} scanned, {} unchanged), {} entries in {:0.2f}s - {:0.1f} archives/s, {:0.2f} GB/s".format(
+            stats["archives"], stats["scanned"], stats["skipped"], stats["entries"], stats["seconds"],
+            stats["archives_per_second"], stats["gb_per_second"]
+        )
+
+def build_catalog(root: Path, jobs: int = None, use_cache: bool = True, progress_callback=None) -> Catalog:
+    return Catalog(root).update(jobs, use_cache, progress_callback)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index every SABLS archive under a directory")
+    parser.add_argument("root", type=Path)
+    parser.add_argument("--jobs", type=int, default=None, help="archives indexed at once (default: every core)")
+    parser.add_argument("--no-cache", action="store_true", help="ignore and don't write the index cache")
+    args = parser.parse_args()
+    
+    if not args.root.is_dir():
+        print("No directory at {}".format(args.root))
+        sys.exit(1)
+    catalog = build_catalog(args.root, args.jobs, not args.no_cache)
+    for archive, index in catalog.archives.items():
+        print("{:>8}  {}".format(len(index), archive))
+    print(catalog.summary())
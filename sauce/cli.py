@@ -0,0 +1,251 @@
+import os
+import sys
+import json
+import argparse
+from pathlib import Path
+from collections import Counter
+from explorer import SablsUnarchiver
+from index import ArchiveIndex
+from search import PathSearch
+from selection import PathTable
+from tree import PathTree
+import cache
+import diff
+import flac
+import formats
+import tracing
+
+# Command line for scripts and build machines, nothing in here touches Qt
+#   python cli.py list zm_asylum.all.sabs --glob "vox/*" | jq .path
+#   python cli.py tree zm_asylum.all.sabs --depth 2
+#   python cli.py extract zm_asylum.all.sabs out "sound/vox/*" "music/*" --jobs 8
+#   python cli.py extract zm_asylum.all.sabs out --prefix sound/mus/ --regex "_0[0-9]$"
+#   python cli.py stat zm_asylum.all.sabs --json
+#   python cli.py search zm_asylum.all.sabs explosion
+#   python cli.py diff zm_asylum.all.sabs old/zm_asylum.all.sabs
+#   python cli.py update zm_asylum.all.sabs out --prune
+#
+# Globs and prefixes are case insensitive, either separator, * crossing directories, regexes are
+#   searched anywhere in the \ separated path (see selection.py). diff and update match entries by
+#   path and content hash, update keeps a manifest in its output directory (see diff.py).
+#   Anything meant for piping goes to stdout one JSON object per line, progress goes to stderr and
+#   only when that's a terminal.
+
+def _progress(label: str):
+    # Progress callback printing to stderr, None when nobody is watching
+    if not sys.stderr.isatty():
+        return None
+    
+    def report(progress: float):
+        if progress == float('inf'):
+            print("\r{}: done   ".format(label), file=sys.stderr)
+        else:
+            print("\r{}: {:0.1f}%".format(label, progress), end="", file=sys.stderr)
+    return report
+
+def _index(args) -> ArchiveIndex:
+    return SablsUnarchiver.index_archive(
+        args.archive, progress_callback=_progress("Indexing"), use_cache=not args.no_cache,
+        jobs=args.index_jobs, hashes=getattr(args, "hashes", False)
+    )
+
+def _matching(flacs: ArchiveIndex, globs: list[str], regexes: list[str], prefixes: list[str]):
+    # Entries matching any of the queries in archive order, every entry when there are none
+    if not (globs or regexes or prefixes):
+        return range(len(flacs))
+    return PathTable(flacs).select(globs, regexes, prefixes)
+
+def _entry(flacs: ArchiveIndex, index: int) -> dict:
+    entry = {
+        "index": index, "path": flacs.path(index), "kind": formats.kind_name(flacs.kinds[index]),
+        "offset": flacs.offsets[index], "length": flacs.lengths[index],
+    }
+    if flacs.flags[index]:
+        entry["not_flac"] = bool(flacs.flags[index] & flac.NOT_FLAC)
+        entry["unsure_end"] = bool(flacs.flags[index] & flac.UNSURE_END)
+    if flacs.hashes is not None:
+        entry["hash"] = flacs.content_hash(index).hex()
+    return entry
+
+def _write_lines(flacs: ArchiveIndex, indices):
+    write = sys.stdout.write
+    for index in indices:
+        write(json.dumps(_entry(flacs, index)) + "\n")
+
+def list_command(args) -> int:
+    flacs = _index(args)
+    _write_lines(flacs, _matching(flacs, args.glob, args.regex, args.prefix))
+    return 0
+
+def search_command(args) -> int:
+    flacs = _index(args)
+    searcher = PathSearch(flacs)
+    query = getattr(searcher, args.mode or "search")
+    _write_lines(flacs, (entry for _, entry in query(args.query, args.limit)))
+    return 0
+
+def tree_command(args) -> int:
+    # Directories with how many entries and bytes are under each, down to --depth levels
+    flacs = _index(args)
+    tree = PathTree(flacs)
+    print("{}  ({} files, {:0.1f} MiB)".format(args.archive.name, tree.counts[tree.root], tree.sizes[tree.root] / 2**20))
+    for node, depth in tree.walk(max_depth=args.depth):
+        if tree.is_directory(node):
+            print("{}{}  ({} files, {:0.1f} MiB)".format("  " * depth, tree.name(node), tree.counts[node], tree.sizes[node] / 2**20))
+    return 0
+
+def extract_command(args) -> int:
+    flacs = _index(args)
+    indices = _matching(flacs, args.patterns, args.regex, args.prefix)
+    if not indices:
+        print("Nothing matches", file=sys.stderr)
+        return 1
+    total = sum(flacs.lengths[index] for index in indices)
+    with SablsUnarchiver.load_archive(args.archive) as archive_file:
+        SablsUnarchiver.dump_files(args.out, archive_file, flacs, indices, args.jobs, _progress("Extracting"), args.dedup)
+    print("Wrote {} files, {:0.1f} MiB to {}".format(len(indices), total / 2**20, args.out), file=sys.stderr)
+    return 0
+
+def diff_command(args) -> int:
+    # What changed between an older archive (or a manifest, or a directory with one) and this one
+    new = diff.snapshot(_index(args))
+    if args.old.is_dir() or args.old.suffix == ".json":
+        old = diff.load_manifest(args.old)
+        if old is None:
+            print("No manifest at {}".format(args.old), file=sys.stderr)
+            return 1
+    else:
+        old = diff.snapshot(SablsUnarchiver.index_archive(
+            args.old, progress_callback=_progress("Indexing old"), use_cache=not args.no_cache, jobs=args.index_jobs, hashes=True
+        ))
+    changes = diff.compare(old, new)
+    write = sys.stdout.write
+    for kind, path, (content_hash, length, _, index) in changes.records():
+        write(json.dumps({"change": kind, "path": path, "index": index, "length": length, "hash": content_hash.hex()}) + "\n")
+    print(changes.summary(), file=sys.stderr)
+    return 0
+
+def update_command(args) -> int:
+    # Extracts only what changed since the last extract/update into out, then rewrites its manifest
+    flacs = _index(args)
+    with SablsUnarchiver.load_archive(args.archive) as archive_file:
+        changes = diff.update_extraction(args.out, archive_file, flacs, args.jobs, _progress("Extracting"), args.dedup, args.prune)
+    print("{} in {}".format(changes.summary(), args.out), file=sys.stderr)
+    return 0
+
+def stat_command(args) -> int:
+    flacs = _index(args)
+    size = os.path.getsize(args.archive)
+    table = len(flacs) * SablsUnarchiver.path_blocksize
+    stats = {
+        "archive": str(args.archive),
+        "bytes": size,
+        "entries": len(flacs),
+        "entry_bytes": sum(flacs.lengths),
+        "path_table_bytes": table,
+        "unaccounted_bytes": size - table - sum(flacs.lengths),
+        "kinds": {formats.kind_name(kind): count for kind, count in sorted(Counter(flacs.kinds).items())},
+        "not_flac": sum(1 for flags in flacs.flags if flags & flac.NOT_FLAC),
+        "unsure_end": sum(1 for flags in flacs.flags if flags & flac.UNSURE_END),
+        "unnamed": sum(1 for index in range(len(flacs)) if not flacs.raw_path(index)),
+        "cached_index": cache.cache_path(args.archive).is_file(),
+    }
+    if flacs.hashes is not None:
+        stats["distinct_entries"] = len({flacs.content_hash(index) for index in range(len(flacs))})
+    if args.metadata:
+        from metadata import read_metadata  # only pulls in the process pool when it's asked for
+        metadata = read_metadata(args.archive, flacs, args.index_jobs, not args.no_cache)
+        stream_formats = {}
+        for index in range(len(flacs)):
+            name = metadata.format(index) or "Not FLAC"
+            stream_formats[name] = stream_formats.get(name, 0) + 1
+        stats["seconds"] = round(sum(metadata.duration(index) or 0.0 for index in range(len(flacs))), 3)
+        stats["formats"] = stream_formats
+    
+    if args.json:
+        print(json.dumps(stats))
+    else:
+        for key, value in stats.items():
+            print("{:<20}{}".format(key, value))
+    return 0
+
+def parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Browse and unarchive SABLS archives without the GUI")
+    parser.add_argument("--trace", type=Path, default=None, help="write a Chrome trace of the run here and print a summary")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    def command(name: str, function, help: str) -> argparse.ArgumentParser:
+        sub = commands.add_parser(name, help=help)
+        sub.set_defaults(function=function)
+        sub.add_argument("archive", type=Path)
+        sub.add_argument("--no-cache", action="store_true", help="ignore and don't write the index cache")
+        sub.add_argument("--index-jobs", type=int, default=1, help="processes scanning the archive when it isn't cached (0: every core)")
+        return sub
+    
+    def selecting(sub: argparse.ArgumentParser):
+        sub.add_argument("--regex", action="append", default=[], help="only entries whose path this is found in, can be repeated")
+        sub.add_argument("--prefix", action="append", default=[], help="only entries whose path starts with this, can be repeated")
+    
+    sub = command("list", list_command, "every entry as a line of JSON")
+    sub.add_argument("--glob", action="append", default=[], help="only entries matching this, can be repeated")
+    selecting(sub)
+    sub.add_argument("--hashes", action="store_true", help="include content hashes (hashes the archive once, then cached)")
+    
+    sub = command("tree", tree_command, "directories with their file counts and sizes")
+    sub.add_argument("--depth", type=int, default=None)
+    
+    sub = command("extract", extract_command, "write entries out as files")
+    sub.add_argument("out", type=Path)
+    sub.add_argument("patterns", nargs="*", help="globs picking what to write, everything when there are none")
+    selecting(sub)
+    sub.add_argument("--jobs", type=int, default=None, help="threads copying (default: every core)")
+    sub.add_argument("--dedup", choices=("hardlink", "reflink"), default=None, help="write identical entries once and link the rest")
+    
+    sub = command("diff", diff_command, "added, changed and removed entries since an older archive, as lines of JSON")
+    sub.add_argument("old", type=Path, help="the older archive, a manifest, or a directory extracted with update")
+    sub.set_defaults(hashes=True)
+    
+    sub = command("update", update_command, "write only what changed since the last update into a directory")
+    sub.add_argument("out", type=Path)
+    sub.add_argument("--jobs", type=int, default=None, help="threads copying (default: every core)")
+    sub.add_argument("--dedup", choices=("hardlink", "reflink"), default=None, help="write identical entries once and link the rest")
+    sub.add_argument("--prune", action="store_true", help="delete the files of entries that are gone from the archive")
+    sub.set_defaults(hashes=True)
+    
+    sub = command("stat", stat_command, "what's in the archive, in numbers")
+    sub.add_argument("--metadata", action="store_true", help="also read every entry's FLAC metadata for durations and formats")
+    sub.add_argument("--json", action="store_true")
+    
+    sub = command("search", search_command, "entries whose path matches, as lines of JSON")
+    sub.add_argument("query")
+    mode = sub.add_mutually_exclusive_group()
+    mode.add_argument("--prefix", action="store_const", const="prefix", dest="mode")
+    mode.add_argument("--glob", action="store_const", const="glob", dest="mode")
+    mode.add_argument("--substring", action="store_const", const="substring", dest="mode")
+    sub.add_argument("--limit", type=int, default=None)
+    return parser
+
+def main(argv: list[str] = None) -> int:
+    args = parser().parse_args(argv)
+    if not args.archive.is_file():
+        print("No archive at {}".format(args.archive), file=sys.stderr)
+        return 1
+    args.index_jobs = args.index_jobs or None
+    if args.trace:
+        tracing.enable()
+    try:
+        return args.function(args)
+    except BrokenPipeError:
+        # whatever was reading stdout stopped early (| head), that's fine
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    except (OSError, ValueError) as error:
+        print("Couldn't finish {}: {}".format(args.command, error), file=sys.stderr)
+        return 1
+    finally:
+        if args.trace:
+            tracing.write_chrome_trace(args.trace)
+            print(tracing.summary(), file=sys.stderr)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+import os
+import json
+from pathlib import Path
+from explorer import SablsUnarchiver, SablsArchive
+from index import ArchiveIndex
+from tree import unnamed, unnamed_file
+import tracing
+
+# What a patch changed in an archive, and re-extracting only that
+#   changes = compare(snapshot(old_flacs), snapshot(new_flacs))   # two indexed archives
+#   changes = compare(load_manifest(out), snapshot(new_flacs))     # what got extracted last time
+#   update_extraction(out, archive_file, new_flacs)                # writes the delta and a new manifest
+#
+# Entries are matched by path and compared by content hash and length, so the index has to have
+#   its hashes (index_archive(hashes=True) keeps them in the index cache). Entries without a path are
+#   called "No Name\File 0042" by index like the tree and extraction name them, but an entry added or
+#   removed further up shifts every index after it, so compare matches them by content first (see
+#   match_unnamed) and only falls back to the index for what that leaves over. When a path turns up
+#   more than once the last entry with it wins, same as it does extracting.
+#
+# A snapshot is {path: (hash, length, file, index)}, file being where dump_files writes the entry
+#   relative to the output directory and index its place in the archive (-1 out of a manifest).
+#   The manifest is that as JSON in the output directory, written after every extraction.
+
+manifest_name = ".sabls-manifest.json"
+manifest_version = 1
+
+class Changes:
+    # Paths of what was added, changed, removed and left alone, in the new archive's order
+    #   (removed ones in the old order)
+    kinds = ("added", "changed", "removed")
+    
+    def __init__(self, old: dict, new: dict):
+        self.old = old
+        self.new = new
+        self.added = []
+        self.changed = []
+        self.unchanged = []
+        for path, (content_hash, length, _, _) in new.items():
+            before = old.get(path)
+            if before is None:
+                self.added.append(path)
+            elif before[0] != content_hash or before[1] != length:
+                self.changed.append(path)
+            else:
+                self.unchanged.append(path)
+        self.removed = [path for path in old if path not in new]
+    
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+    
+    def indices(self, paths: list[str]) -> list[int]:
+        # New archive indices of paths, in archive order
+        return sorted(self.new[path][3] for path in paths)
+    
+    def files(self, paths: list[str]) -> list[str]:
+        # Their files in the new snapshot, in the same order as indices gives them
+        return [file for _, file in sorted((self.new[path][3], self.new[path][2]) for path in paths)]
+    
+    def records(self):
+        # (kind, path, entry) for everything that changed, entry out of the new snapshot (the old one for removed)
+        for kind in self.kinds:
+            side = self.old if kind == "removed" else self.new
+            for path in getattr(self, kind):
+                yield kind, path, side[path]
+    
+    def summary(self) -> str:
+        return "{} added, {} changed, {} removed, {} unchanged".format(
+            len(self.added), len(self.changed), len(self.removed), len(self.unchanged)
+        )
+
+def snapshot(flacs: ArchiveIndex) -> dict:
+    if flacs.hashes is None:
+        raise ValueError("the index has no content hashes, index it with hashes=True first")
+    entries = {}
+    hashes, size = flacs.hashes, ArchiveIndex.hash_size
+    with tracing.span("diff.snapshot", entries=len(flacs)):
+        for index, length in enumerate(flacs.lengths):
+            file = SablsUnarchiver.entry_file(flacs, index)
+            path = flacs.path(index) or "{}\\{}".format(unnamed, unnamed_file(index))
+            entries[path] = (hashes[index * size : (index + 1) * size], length, file, index)
+    return entries
+
+def _is_unnamed(path: str) -> bool:
+    return path.startswith(unnamed + "\\")
+
+def match_unnamed(old: dict, new: dict) -> dict:
+    # new with its unnamed entries renamed after the old unnamed entries holding the same bytes
+    #   A match takes over the old entry's name and file, so an unchanged entry stays where it was
+    #   extracted to whatever its index is now. The rest keep their own name, and so get compared by
+    #   index, unless a match took it, then they get a fresh "File 0042 (2)" name of their own
+    by_content = {}
+    for path, (content_hash, length, _, _) in old.items():
+        if _is_unnamed(path):
+            by_content.setdefault((content_hash, length), []).append(path)
+    for paths in by_content.values():
+        paths.reverse()  # popped off the end, in old order
+    matched = {}
+    for path, (content_hash, length, _, _) in new.items():
+        paths = by_content.get((content_hash, length)) if _is_unnamed(path) else None
+        if paths:
+            matched[path] = paths.pop()
+    if not matched:
+        return new
+    
+    taken = set(matched.values())
+    renamed = {}
+    for path, (content_hash, length, file, index) in new.items():
+        if path in matched:
+            renamed[matched[path]] = (content_hash, length, old[matched[path]][2], index)
+            continue
+        if path in taken:
+            extension = os.path.splitext(file)[1]
+            count = 2
+            while "{} ({})".format(path, count) in taken or "{} ({})".format(path, count) in new:
+                count += 1
+            path = "{} ({})".format(path, count)
+            file = path.replace("\\", "/") + extension
+            taken.add(path)
+        renamed[path] = (content_hash, length, file, index)
+    return renamed
+
+def compare(old: dict, new: dict) -> Changes:
+    with tracing.span("diff.compare", entries=len(old) + len(new)):
+        return Changes(old, match_unnamed(old, new))
+
+def manifest_path(out: Path) -> Path:
+    return Path(out) / manifest_name
+
+def load_manifest(path: Path) -> dict | None:
+    # Snapshot out of a manifest file, or the one in an output directory. None if there isn't one
+    source = Path(path)
+    if source.is_dir():
+        source = manifest_path(source)
+    try:
+        with open(source, "r", encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+    except FileNotFoundError:
+        return None
+    if manifest.get("version") != manifest_version:
+        raise ValueError("{} is a manifest version this doesn't read".format(source))
+    return {
+        path: (bytes.fromhex(content_hash), length, file, -1)
+        for path, (content_hash, length, file) in manifest["entries"].items()
+    }
+
+def store_manifest(out: Path, archive: Path, entries: dict):
+    # Written next to the files and swapped in whole, so a run that dies halfway leaves the old one
+    target = manifest_path(out)
+    temporary = target.with_name(target.name + ".tmp")
+    manifest = {
+        "version": manifest_version,
+        "archive": Path(archive).name if archive is not None else None,
+        "entries": {path: [content_hash.hex(), length, file] for path, (content_hash, length, file, _) in entries.items()},
+    }
+    os.makedirs(out, exist_ok=True)
+    with open(temporary, "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, separators=(",", ":"))
+    os.replace(temporary, target)
+
+def update_extraction(
+        out: Path, archive: SablsArchive, flacs: ArchiveIndex, jobs: int = None,
+        progress_callback=None, dedup: str = None, prune: bool = False) -> Changes:
+    # Brings an extraction of an older version of the archive up to date and writes its new manifest
+    #   Only added and changed entries get written, plus any unchanged ones whose file has gone missing
+    #   since. prune deletes the files of removed entries, unless something still in the archive
+    #   writes to the same file. Without a manifest in out everything counts as added.
+    out = Path(out)
+    if flacs.hashes is None:
+        SablsUnarchiver.hash_entries(archive, flacs, jobs)
+    changes = compare(load_manifest(out) or {}, snapshot(flacs))
+    
+    isfile, join = os.path.isfile, os.path.join
+    missing = [path for path in changes.unchanged if not isfile(join(out, changes.new[path][2]))]
+    paths = changes.added + changes.changed + missing
+    indices = changes.indices(paths)
+    if indices:
+        # to the files in the snapshot, unnamed entries that were matched by content keep their old ones
+        SablsUnarchiver.dump_files(out, archive, flacs, indices, jobs, progress_callback, dedup, changes.files(paths))
+    elif progress_callback:
+        progress_callback(float('inf'))
+    
+    if prune:
+        kept = {file for _, _, file, _ in changes.new.values()}
+        for path in changes.removed:
+            file = changes.old[path][2]
+            if file not in kept:
+                try:
+                    os.unlink(out / file)
+                except FileNotFoundError:
+                    pass
+                # and the directories that leaves empty
+                directory = (out / file).parent
+                while directory != out and directory.is_dir() and not any(directory.iterdir()):
+                    directory.rmdir()
+                    directory = directory.parent
+    store_manifest(out, getattr(archive, "path", None), changes.new)
+    return changes
@@ -1,16 +1,62 @@
 import re
 import os
+import mmap
+import hashlib
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import cache
+import extract
+import flac
+import formats
+import tracing
+from index import ArchiveIndex
+from tree import PathTree, unnamed, unnamed_file
+
+class SablsArchive:
+    # Read-only handle on an archive backed by mmap
+    #   Slicing hands out memoryviews into the mapping, so neither the archive nor
+    #   the entries get copied into ram, the OS just pages in whatever is touched
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as archive_file:
+            self.size = os.fstat(archive_file.fileno()).st_size
+            # mmap refuses empty files, an empty view is just as good for those
+            self.map = mmap.mmap(archive_file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self.view = memoryview(self.map) if self.map is not None else memoryview(b"")
+    
+    def __len__(self) -> int:
+        return self.size
+    
+    def __getitem__(self, key) -> memoryview:
+        return self.view[key]
+    
+    def __buffer__(self, flags) -> memoryview:
+        # Python 3.12+ lets the handle be passed anywhere a bytes-like is expected
+        return self.view
+    
+    def close(self):
+        # Only works once every memoryview handed out has been released
+        self.view.release()
+        if self.map is not None:
+            self.map.close()
+    
+    def __enter__(self) -> 'SablsArchive':
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+class Cancelled(Exception):
+    # Raise from a progress callback to stop whatever is reporting to it
+    pass
 
 class SablsUnarchiver:
     path_blocksize = 32 * 4
     
-    def load_archive(archive: Path) -> bytearray:
-        # Load file into ram
-        with open(archive, "rb") as archive_file:
-            archive_data = archive_file.read()
-        
-        return archive_data
+    def load_archive(archive: Path) -> SablsArchive:
+        # Map file instead of reading it, entries are sliced out as memoryviews
+        with tracing.span("archive.load"):
+            return SablsArchive(archive)
     
     def __default_progress_callback(progress: float):
         if progress != float('inf'):
@@ -18,78 +64,333 @@ class SablsUnarchiver:
         else:
             print("\rArchived Indexed")
     
-    def find_flacs(archive: bytearray, progress_callback=__default_progress_callback) -> list[(int, str)]:
+    scan_chunk_size = 16 * 1024 * 1024  # 16MiB per read, big enough that the search dominates the loop
+    
+    def __chunks(source, overlap: int, chunk_size: int, progress_callback):
+        # (offset, bytes) of source a chunk at a time, for scanning
+        #   source is either a file opened "rb" (streamed through one fixed buffer) or anything sliceable
+        #   like a SablsArchive. Consecutive chunks overlap by overlap bytes so a signature split across
+        #   the boundary is still found. Progress is reported once per chunk.
+        if hasattr(source, "readinto"):
+            total = os.fstat(source.fileno()).st_size
+            buffer = bytearray(chunk_size + overlap)
+            view = memoryview(buffer)
+            base = source.tell()  # file offset of buffer[0]
+            kept = 0  # tail of the previous chunk that was moved to the front of the buffer
+            while True:
+                read = source.readinto(view[kept:])
+                if not read:
+                    break
+                filled = kept + read
+                yield base, view[:filled]
+                
+                kept = min(overlap, filled)
+                buffer[:kept] = buffer[filled - kept : filled]
+                base += filled - kept
+                if progress_callback and total:
+                    progress_callback((base + kept) / total * 100)
+        else:
+            total = len(source)
+            for start in range(0, total, chunk_size):
+                end = min(start + chunk_size, total)
+                yield start, source[start : min(end + overlap, total)]  # a view, not a copy
+                if progress_callback:
+                    progress_callback(end / total * 100)
+    
+    def scan_entries(source, chunk_size: int = scan_chunk_size, progress_callback=None):
+        # Generator over (offset, kind) of every registered format's signature in source, in order
+        #   source is read once however many formats there are. Each chunk gets one literal search per
+        #   signature, which is several times quicker in re than one search for an alternation of them
+        #   (that falls back to testing every byte against a set), and the hits are merged.
+        searches = [(re.compile(re.escape(entry_format.signature)), entry_format.kind) for entry_format in formats.formats]
+        overlap = formats.overlap()
+        last = -1  # a short signature can fit in the overlap whole and turn up twice
+        for base, chunk in SablsUnarchiver.__chunks(source, overlap, chunk_size, progress_callback):
+            found = [(match.start(), kind) for pattern, kind in searches for match in pattern.finditer(chunk)]
+            found.sort()
+            for offset, kind in found:
+                if base + offset > last:
+                    last = base + offset
+                    yield last, kind
+    
+    def find_flacs(archive: SablsArchive, progress_callback=__default_progress_callback) -> ArchiveIndex:
         # Search archive for flac files
-        #   Looking for files via magic nums, if there are other filetypes in the archive
-        #     Ill need to also search for those
-        #     Also, im not tracking how big the flacs are, im just relying on the next file's magic num
-        #       to be where this file ends. If there are other types of files in the archive, this is gonna fuck up
+        #   Looking for files via magic nums, every format in formats.py gets looked for in the one pass
+        #     so WAVs and Oggs mixed in between the FLACs get entries (and paths) of their own
+        #   Each match gets checked against its format's structure (see measure_entries), so a fLaC that
+        #     just happens to show up inside audio data no longer splits an entry in two
+        
+        # find locations of file magic numbers
+        with tracing.span("index.scan", bytes=len(archive)) as span:
+            matches = list(SablsUnarchiver.scan_entries(archive, progress_callback=progress_callback))
+            span.entries = len(matches)
+        flacs = SablsUnarchiver.__finish_index(archive, matches)
+        if progress_callback:
+            progress_callback(float('inf'))
+        return flacs
+    
+    parallel_range_size = 64 * 1024 * 1024  # smallest byte range worth shipping to another process
+    
+    def find_flacs_parallel(archive: Path, jobs: int = None, progress_callback=__default_progress_callback) -> ArchiveIndex:
+        # Same result as find_flacs, but the archive is cut into byte ranges that get scanned by a process pool
+        #   Every worker maps the same file, so the pages are shared through the OS cache rather than copied.
+        #   Each range is scanned a signature's length past its end and only keeps matches that start inside it,
+        #   that way a fLaC straddling two ranges is found by exactly one of them.
+        jobs = jobs or os.cpu_count() or 1
+        size = os.path.getsize(archive)
+        count = max(1, min(jobs * 4, size // SablsUnarchiver.parallel_range_size))  # a few ranges per worker keeps them all busy
+        bounds = [size * i // count for i in range(count + 1)]
         
-        flacs = [] # [ (offset, file path), (offset, file path), (offset, filepath), ... ]
+        matches = []
+        with tracing.span("index.scan_parallel", bytes=size) as span, ProcessPoolExecutor(max_workers=min(jobs, count)) as pool:
+            ranges = pool.map(_scan_range, [archive] * count, bounds[:-1], bounds[1:])
+            for i, found in enumerate(ranges):  # map yields in submission order, so this is already sorted
+                matches.extend(found)
+                if progress_callback:
+                    progress_callback(bounds[i + 1] / size * 100)
+            span.entries = len(matches)
         
-        # find locations of file magic numbers (I think they're all FLACs)
-        magic_nums = re.finditer(bytes("fLaC".encode("utf-8")), archive)
-        for magic_num in magic_nums:
-            flacs.append((magic_num.start(), None))
+        with SablsArchive(archive) as mapped:
+            flacs = SablsUnarchiver.__finish_index(mapped, matches)
+        if progress_callback:
+            progress_callback(float('inf'))
+        return flacs
+    
+    def index_archive(archive: Path, progress_callback=__default_progress_callback, use_cache: bool = True, jobs: int = 1, hashes: bool = False) -> ArchiveIndex:
+        # Same result as find_flacs, but streams the file instead of needing it loaded or mapped
+        #   The index is built while the file is still being read and memory stays at one chunk
+        #   no matter how big the archive is. Only the entry headers, the last frame of each entry
+        #   and the path table get read a second time.
+        #
+        # Finished indexes are kept in the user cache, reopening an unchanged archive skips the scan entirely
+        # jobs other than 1 hands the scan to find_flacs_parallel, None meaning every core
+        # hashes makes sure the index comes with content hashes, those get cached along with it
+        with tracing.span("index.cache") as span:
+            cached = cache.load_index(archive) if use_cache else None
+            span.entries = len(cached[0]) if cached else 0
+        if cached and (cached[4] is not None or not hashes):
+            tracing.count("index.cache_hit")
             if progress_callback:
-                progress_callback(magic_num.start()/len(archive)*100)
+                progress_callback(float('inf'))
+            return ArchiveIndex(*cached)
+        
+        if cached:  # only the hashes are missing
+            flacs = ArchiveIndex(*cached)
+            with SablsArchive(archive) as mapped:
+                SablsUnarchiver.hash_entries(mapped, flacs, jobs)
+            cache.store_index(archive, flacs.offsets, flacs.lengths, flacs.flags, flacs.file_paths(), flacs.hashes, flacs.kinds)
+            if progress_callback:
+                progress_callback(float('inf'))
+            return flacs
+        
+        if jobs != 1:
+            flacs = SablsUnarchiver.find_flacs_parallel(archive, jobs, progress_callback)
+        else:
+            with open(archive, "rb") as archive_file, tracing.span("index.scan", bytes=os.path.getsize(archive)) as span:
+                matches = list(SablsUnarchiver.scan_entries(archive_file, progress_callback=progress_callback))
+                span.entries = len(matches)
+            with SablsArchive(archive) as mapped:
+                flacs = SablsUnarchiver.__finish_index(mapped, matches)
+            if progress_callback:
+                progress_callback(float('inf'))
+        
+        if hashes:
+            with SablsArchive(archive) as mapped:
+                SablsUnarchiver.hash_entries(mapped, flacs, jobs)
+        if use_cache:
+            cache.store_index(archive, flacs.offsets, flacs.lengths, flacs.flags, flacs.file_paths(), flacs.hashes, flacs.kinds)
+        return flacs
+    
+    def hash_entries(archive: SablsArchive, flacs: ArchiveIndex, jobs: int = None, progress_callback=None) -> bytes:
+        # blake2b (16 bytes) of every entry's bytes, kept on the index as flacs.hashes
+        #   Threads are enough here, hashlib lets go of the GIL while it chews through a big buffer,
+        #   and the memoryviews mean the entries are hashed straight out of the mapping
+        view = archive.view if isinstance(archive, SablsArchive) else memoryview(archive)
+        
+        def digest(index: int) -> bytes:
+            with view[flacs.offsets[index] : flacs.offsets[index] + flacs.lengths[index]] as entry:
+                return hashlib.blake2b(entry, digest_size=ArchiveIndex.hash_size).digest()
+        
+        digests = []
+        with tracing.span("index.hash", sum(flacs.lengths), len(flacs)), ThreadPoolExecutor(max_workers=jobs) as pool:
+            for i, hashed in enumerate(pool.map(digest, range(len(flacs)))):
+                digests.append(hashed)
+                if progress_callback:
+                    progress_callback((i + 1) / len(flacs) * 100)
         if progress_callback:
             progress_callback(float('inf'))
+        flacs.hashes = b"".join(digests)
+        return flacs.hashes
+    
+    def measure_entries(archive: SablsArchive, matches: list[tuple[int, int]]) -> list[(int, int, int, int)]:
+        # Works out which signature matches really start an entry and exactly how long each one is
+        #   matches are (offset, kind) from scan_entries. Returns [ (offset, length, flags, kind), ... ],
+        #   flags being flac.NOT_FLAC / flac.UNSURE_END
+        #
+        # A match without a valid header is dropped if it sits inside an entry whose end was confirmed, or
+        #   if its format doesn't keep_invalid, otherwise it's kept (flagged) since it might be some other
+        #   kind of file. Valid matches inside a confirmed entry are dropped too, those are the pages of an
+        #   Ogg stream or a file embedded in another one. How many entries there are decides where the
+        #   path table starts, which is the limit of the last entry, so that last bit gets repeated until
+        #   the count stops changing.
+        size = len(archive)
+        kinds = formats.formats
+        valid = [kinds[kind].validate(archive, offset, size) for offset, kind in matches]
+        valid_offsets = [offset for (offset, _), ok in zip(matches, valid) if ok]
+        last_valid = valid_offsets[-1] if valid_offsets else None
         
+        def measure(offset: int, kind: int, limit: int):
+            # end of the entry at offset if it was found exactly
+            measured[offset] = kinds[kind].measure(archive, offset, limit)
+            length, flags = measured[offset]
+            return offset + length if not flags else None
+        
+        measured = {}
+        kept = []
+        covered = 0  # end of the last entry that's known to be exact
+        following = 0  # index into valid_offsets of the next valid match
+        last_start = None  # the last valid match that became an entry
+        for (offset, kind), ok in zip(matches, valid):
+            if ok:
+                following += 1
+            if offset < covered:
+                continue
+            if ok:
+                kept.append((offset, kind))
+                last_start = (offset, kind)
+                if offset != last_valid:  # the last one is measured against the path table below
+                    # delimited formats say how long they are, the rest run until the next valid match at most
+                    end = measure(offset, kind, size if kinds[kind].delimited else valid_offsets[following])
+                    covered = end if end is not None else covered
+            elif kinds[kind].keep_invalid and (last_valid is None or offset < last_valid):
+                kept.append((offset, kind))
+        
+        trailing = [
+            (offset, kind) for (offset, kind), ok in zip(matches, valid)
+            if not ok and kinds[kind].keep_invalid and last_valid is not None and offset > last_valid
+        ]
+        tail = []
+        for _ in range(len(trailing) + 1):
+            table_start = size - (len(kept) + len(tail)) * SablsUnarchiver.path_blocksize
+            if last_start:
+                offset, kind = last_start
+                end = measure(offset, kind, max(offset, table_start))
+                covered = end if end is not None else offset
+            settled = [(offset, kind) for offset, kind in trailing if covered <= offset < table_start]
+            if settled == tail:
+                break
+            tail = settled
+        kept += tail
+        
+        table_start = size - len(kept) * SablsUnarchiver.path_blocksize
+        entries = []
+        for i, (offset, kind) in enumerate(kept):
+            limit = kept[i+1][0] if i+1 < len(kept) else table_start
+            length, flags = measured.get(offset, (limit - offset, flac.NOT_FLAC))
+            if flags or offset + length > limit:
+                length = limit - offset  # not exact, so it runs to whatever comes next
+            entries.append((offset, max(length, 0), flags, kind))
+        return entries
+    
+    def __finish_index(archive: SablsArchive, matches: list[tuple[int, int]]) -> ArchiveIndex:
+        # (offset, kind) matches -> full index, the path table gets copied out so the index doesn't keep the mapping alive
+        with tracing.span("index.measure", entries=len(matches)):
+            entries = SablsUnarchiver.measure_entries(archive, matches)
+        tail = len(entries) * SablsUnarchiver.path_blocksize
+        with tracing.span("index.paths", tail, len(entries)):
+            file_paths = bytes(archive[len(archive) - tail:]) if tail else b""
+            return SablsUnarchiver.__pair_paths(
+                [entry[0] for entry in entries],
+                [entry[1] for entry in entries],
+                [entry[2] for entry in entries],
+                file_paths,
+                [entry[3] for entry in entries]
+            )
+    
+    def __pair_paths(offsets: list[int], lengths: list[int], flags: list[int], file_paths: bytes, kinds: list[int] = None) -> ArchiveIndex:
         # there appears to be file structure info at the end of the archive
         #   however, there doenst seem to be a preamble/magic number to indicate the start of filenames.
         #
         # it appears each path is 128 bytes long, (4 32byte words?)
-        #   and they are in the order of the FLAC files. 
-        # Also, if there is a filetype that I dont know about, ig this is just kinda fucked.
-        #   Maybe I should search for other magic numbers?
-        file_paths = archive[ -(len(flacs) * SablsUnarchiver.path_blocksize) : ]  # slice off last n-many blocks
-        for i in range(len(flacs)): 
-            flacs[i] = (flacs[i][0], file_paths[ (i * SablsUnarchiver.path_blocksize) : ((i + 1) * SablsUnarchiver.path_blocksize) ])
-        
-        return flacs
+        #   and they are in the order of the entries, whatever format they're in.
+        # Anything that none of formats.py's signatures find still throws the count (and every path
+        #   after it) off, register its format if it turns up.
+        return ArchiveIndex(offsets, lengths, flags, file_paths, kinds=kinds)
     
-    def select_file(archive: bytearray, flacs: list[(int, str)], index: int) -> bytearray:
+    def entry_range(archive_size: int, flacs: ArchiveIndex, index: int) -> tuple[int, int]:
+        # (start, end) of an entry
+        #   Also takes the old list of (offset, path) tuples, those fall back to running until the
+        #   next entry or the path table
+        if isinstance(flacs, ArchiveIndex):
+            return flacs.offsets[index], flacs.offsets[index] + flacs.lengths[index]
+        if len(flacs[index]) > 2:
+            return flacs[index][0], flacs[index][0] + flacs[index][2]
         if index+1 == len(flacs):
-            file = archive[flacs[index][0]:-(len(flacs) * SablsUnarchiver.path_blocksize)]
-        else:
-            file = archive[flacs[index][0]:flacs[index+1][0]]
-        return file
+            return flacs[index][0], archive_size - (len(flacs) * SablsUnarchiver.path_blocksize)
+        return flacs[index][0], flacs[index+1][0]
+    
+    def as_index(archive_size: int, flacs: ArchiveIndex) -> ArchiveIndex:
+        # flacs as an ArchiveIndex, the old tuple lists get converted (every entry FLAC, lengths
+        #   worked out like entry_range does) so code past here only has the one kind of index to deal with
+        if isinstance(flacs, ArchiveIndex):
+            return flacs
+        bounds = [SablsUnarchiver.entry_range(archive_size, flacs, index) for index in range(len(flacs))]
+        return ArchiveIndex(
+            [start for start, _ in bounds], [end - start for start, end in bounds],
+            [entry[3] if len(entry) > 3 else 0 for entry in flacs],
+            b"".join(bytes(entry[1]).ljust(SablsUnarchiver.path_blocksize, b"\0") for entry in flacs)
+        )
     
-    def dump_archive(unarchive_path: Path, archive: bytearray, flacs: list[(int, str)]):
+    def select_file(archive: SablsArchive, flacs: ArchiveIndex, index: int) -> memoryview:
+        # memoryview into the archive, nothing is copied until someone writes it out
+        start, end = SablsUnarchiver.entry_range(len(archive), flacs, index)
+        tracing.count("entry.select")
+        return archive[start:end]
+    
+    def dump_archive(unarchive_path: Path, archive: SablsArchive, flacs: ArchiveIndex, jobs: int = None, progress_callback=None, dedup: str = None):
         # Unarchives the entire archive
-        for i in range(len(flacs)):
-            SablsUnarchiver.write_file(
-                unarchive_path / SablsUnarchiver.to_filepath(flacs[i][1]),
-                SablsUnarchiver.select_file(archive, flacs, i)
-            )
+        SablsUnarchiver.dump_files(unarchive_path, archive, flacs, range(len(flacs)), jobs, progress_callback, dedup)
     
-    def dump_file(unarchive_path: Path, archive: bytearray, flacs: list[(int, str)], index: int):
+    def dump_file(unarchive_path: Path, archive: SablsArchive, flacs: ArchiveIndex, index: int):
         # Unarchives specific file
-        SablsUnarchiver.write_file(
-            unarchive_path / SablsUnarchiver.to_filepath(flacs[index][1]),
-            SablsUnarchiver.select_file(archive, flacs, index)
-        )
+        SablsUnarchiver.dump_files(unarchive_path, archive, flacs, [index], jobs=1)
     
-    def array_path_tree(input, silent=False):
-        # If I was smart I would strip the flacs[] for just the 2nd value in each tuple, but Im not
+    def dump_files(
+            unarchive_path: Path, archive: SablsArchive, flacs: ArchiveIndex, indices: list[int], jobs: int = None,
+            progress_callback=None, dedup: str = None, files: list[str] = None):
+        # Unarchives a batch of files with the extraction engine, the bytes go from the archive file to
+        #   the targets in the kernel when it can, and jobs threads do the copying
+        # dedup ("hardlink" or "reflink") writes every distinct entry once and links the copies to it,
+        #   the index gets hashed first if it hasn't been already
+        # files, / separated and one per index, puts entries somewhere other than where to_filepath would
+        flacs = SablsUnarchiver.as_index(len(archive), flacs)
+        copies = []
+        for i, index in enumerate(indices):
+            start, end = SablsUnarchiver.entry_range(len(archive), flacs, index)
+            if files is not None:
+                target = unarchive_path / files[i]
+            else:
+                target = unarchive_path / SablsUnarchiver.to_filepath(flacs[index][1], index, formats.formats[flacs.kinds[index]].extension)
+            copies.append((start, end - start, target))
         
-        # creates a dict shaped like the file tree
-        tree = {}
-        untitled = 0
-        for path in input:
-            path = path[1].strip(b'\0').decode("utf-8")
-            if path != "":
-                layer = tree
-                for level in path.split("\\"):
-                    if not level in layer.keys():
-                        layer.update({level: {}})
-                    layer = layer[level]
+        links = []
+        if dedup:
+            if flacs.hashes is None:
+                SablsUnarchiver.hash_entries(archive, flacs, jobs)
+            copies, links = extract.dedupe(copies, [(flacs.content_hash(index), flacs.lengths[index]) for index in indices])
+        
+        with tracing.span("extract.dump", sum(copy[1] for copy in copies), len(copies) + len(links)):
+            if isinstance(archive, SablsArchive):
+                extract.copy_ranges(archive.path, copies, archive.view, jobs, progress_callback, links, dedup)
             else:
-                untitled += 1
-                if not "No Name" in tree.keys():
-                    tree.update({"No Name": {}})
-                tree["No Name"].update({"file {:04d}".format(untitled): {}})
+                extract.copy_ranges(None, copies, memoryview(archive), jobs, progress_callback, links, dedup)
+    
+    def array_path_tree(input: ArchiveIndex, silent=False):
+        # creates a dict shaped like the file tree
+        if isinstance(input, ArchiveIndex):
+            tree = PathTree(input).to_dict()
+        else:
+            tree = SablsUnarchiver.__tuple_path_tree(input)
         
         # pretty-er dict print
         def print_tree(layer, indent=1):
@@ -107,18 +408,49 @@ class SablsUnarchiver:
             print_tree(tree)
         return tree
     
-    def write_file(filepath: Path, contents: bytearray):
+    def __tuple_path_tree(input: list) -> dict:
+        # array_path_tree for old lists of (offset, path block) tuples
+        tree = {}
+        with tracing.span("tree.build", entries=len(input)):
+            for i in range(len(input)):
+                levels = input[i][1].strip(b'\0').decode("utf-8").split("\\")
+                if levels and levels != [""]:
+                    layer = tree
+                    for level in levels:
+                        if not level in layer.keys():
+                            layer.update({level: {}})
+                        layer = layer[level]
+                else:
+                    tree.setdefault(unnamed, {})[unnamed_file(i)] = {}  # by index, like PathTree names them
+        return tree
+    
+    def write_file(filepath: Path, contents: memoryview):
         # Prepares filepath and writes file
         os.makedirs(os.path.dirname(filepath), exist_ok=True)
         with open(filepath, "wb") as file:
             file.write(contents)
     
-    def to_filepath(path: bytearray) -> Path:
+    def to_filepath(path: bytearray, index: int, extension: str = ".flac") -> Path:
         # Clean up unarchived data into a useful path
-        file_name = path.strip(b'\0').replace(b'\\', b'/').decode("utf-8") + ".flac"
+        #   Entries without a path go under No Name by index, where the tree has them, so they don't all land on .flac
+        file_name = path.strip(b'\0').replace(b'\\', b'/').decode("utf-8")
         if file_name == "":
-            file_name = "not-named"
-        return Path(file_name)
+            file_name = "{}/{}".format(unnamed, unnamed_file(index))
+        return Path(file_name + extension)
+    
+    def entry_file(flacs: ArchiveIndex, index: int) -> str:
+        # What to_filepath makes of an entry as a / separated string, without building a Path
+        path = flacs.path(index)
+        if not path:
+            path = "{}/{}".format(unnamed, unnamed_file(index))
+        return path.replace("\\", "/") + formats.formats[flacs.kinds[index]].extension
+
+def _scan_range(archive: Path, start: int, end: int) -> list[int]:
+    # find_flacs_parallel's worker, lives out here so the process pool can pickle it
+    overlap = formats.overlap()  # the same as scan_entries, so a signature over the boundary is still found
+    with SablsArchive(archive) as mapped:
+        with mapped[start : min(end + overlap, len(mapped))] as view:
+            return [(start + offset, kind) for offset, kind in SablsUnarchiver.scan_entries(view) if offset < end - start]
 
 def cancer():
     def array_path_tree(input):
@@ -208,20 +540,8 @@ def cancer():
 
 
 if __name__ == "__main__":
-    archive_path = Path("./Game Files/all/zm_asylum.all.sabs")
-    unarchive_path = Path("./experiments/unarchive")
-    
-    archive_data = SablsUnarchiver.load_archive(archive_path)
-    flacs = SablsUnarchiver.find_flacs(archive_data)
-    
-    if len(flacs) == 0:
-        print("Archive appears to be empty")
-        exit(1)
-    
-    archive_tree = SablsUnarchiver.array_path_tree(flacs)
-    SablsUnarchiver.dump_archive(archive_data, flacs)
-    
-    import json
-    with open("./experiments/test_tree.json", "w") as file:
-        file.write(json.dumps(archive_tree))
+    # Same thing as running cli.py
+    import sys
+    from cli import main
+    sys.exit(main())
 
@@ -0,0 +1,194 @@
+import os
+import shutil
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Bulk extraction engine
+#   Takes a list of (offset, length, target) copies out of one archive and does them all at once.
+#   The directory skeleton is made up front, then the byte ranges go straight from the archive to
+#   the targets in the kernel with copy_file_range, or sendfile where that isn't available, and
+#   only as a last resort through a buffer. The copies fan out over a thread pool, the syscalls
+#   release the GIL so this ends up limited by the disks rather than by python.
+#
+# Given content keys, entries holding the same bytes are only written once and the rest become
+#   hardlinks or reflinks of that first copy.
+
+buffer_size = 1024 * 1024
+
+try:
+    import fcntl
+    ficlone = 0x40049409  # linux's FICLONE ioctl, clones one file's extents into another
+except ImportError:
+    fcntl = None
+    ficlone = None
+
+class Copier:
+    # Remembers which copy method works so a failing syscall is only tried once per extraction
+    def __init__(self, source: Path | None, view: memoryview | None):
+        self.source = source
+        self.view = view
+        self.methods = []
+        if source is not None:
+            if hasattr(os, "copy_file_range"):
+                self.methods.append(self.__copy_file_range)
+            if hasattr(os, "sendfile"):
+                self.methods.append(self.__sendfile)
+            if hasattr(os, "pread"):
+                self.methods.append(self.__buffered)
+        self.methods.append(self.__from_view)
+        self.lock = threading.Lock()
+        self.source_fd = os.open(source, os.O_RDONLY | getattr(os, "O_BINARY", 0)) if source is not None else None
+    
+    def close(self):
+        if self.source_fd is not None:
+            os.close(self.source_fd)
+            self.source_fd = None
+    
+    def copy(self, offset: int, length: int, target: Path):
+        _remove(target)
+        with open(target, "wb") as target_file:
+            for method in list(self.methods):
+                try:
+                    method(offset, length, target_file)
+                    return
+                except OSError:
+                    if method == self.methods[-1]:
+                        raise
+                    with self.lock:
+                        if method in self.methods:  # another thread may have dropped it already
+                            self.methods.remove(method)
+                    target_file.seek(0)
+                    target_file.truncate()
+    
+    # every method copies from the offsets it is given rather than the fd's position, so the
+    #   threads can share the one source fd
+    
+    def __copy_file_range(self, offset: int, length: int, target_file):
+        target_fd = target_file.fileno()
+        done = 0
+        while done < length:
+            copied = os.copy_file_range(self.source_fd, target_fd, length - done, offset + done)
+            if copied == 0:
+                raise OSError("copy_file_range stopped short")
+            done += copied
+    
+    def __sendfile(self, offset: int, length: int, target_file):
+        target_fd = target_file.fileno()
+        done = 0
+        while done < length:
+            sent = os.sendfile(target_fd, self.source_fd, offset + done, length - done)
+            if sent == 0:
+                raise OSError("sendfile stopped short")
+            done += sent
+    
+    def __buffered(self, offset: int, length: int, target_file):
+        done = 0
+        while done < length:
+            chunk = os.pread(self.source_fd, min(buffer_size, length - done), offset + done)
+            if not chunk:
+                raise OSError("archive ended early")
+            target_file.write(chunk)
+            done += len(chunk)
+    
+    def __from_view(self, offset: int, length: int, target_file):
+        # Writes straight out of the mapping, for when there's no file to hand to the kernel
+        if self.view is None:
+            raise OSError("no way left to read the archive")
+        target_file.write(self.view[offset : offset + length])
+
+def make_skeleton(targets: list[Path]):
+    # Every directory is made once, parents before children
+    for directory in sorted({target.parent for target in targets}):
+        os.makedirs(directory, exist_ok=True)
+
+def last_per_target(copies: list[tuple[int, int, Path]]) -> list[tuple[int, int, Path]]:
+    # One copy per target, the one furthest into the archive, which is what writing them one after
+    #   the other left behind. Two threads writing the same file would truncate each other's bytes
+    latest = {}
+    for copy in sorted(copies, key=lambda copy: copy[0]):
+        latest[copy[2]] = copy
+    return list(latest.values())
+
+def dedupe(copies: list[tuple[int, int, Path]], keys: list, originals: dict = None) -> tuple[list[tuple[int, int, Path]], list[tuple[Path, Path, int]]]:
+    # Splits copies into the ones that have to be written and (original, target, length) links for the rest
+    #   keys say which copies hold the same bytes (content hash and length), the first one by offset wins
+    #   Passing the same originals dict to several calls dedupes across all of them
+    originals = {} if originals is None else originals
+    latest = {}  # last_per_target, keeping each copy's key with it
+    for copy, key in sorted(zip(copies, keys), key=lambda pair: pair[0][0]):
+        latest[copy[2]] = (copy, key)
+    unique = []
+    links = []
+    for copy, key in sorted(latest.values(), key=lambda pair: pair[0][0]):
+        if key in originals:
+            links.append((originals[key], copy[2], copy[1]))
+        else:
+            originals[key] = copy[2]
+            unique.append(copy)
+    return unique, links
+
+def link_file(original: Path, target: Path, link: str = "hardlink"):
+    # Makes target hold the same bytes as original without writing them again
+    #   "hardlink" shares the inode, "reflink" shares the blocks (btrfs, xfs, apfs...) but stays a separate
+    #   file. If the filesystem can't do either it ends up a plain copy.
+    _remove(target)
+    if link == "hardlink":
+        try:
+            os.link(original, target)
+            return
+        except OSError:
+            pass
+    elif link == "reflink" and ficlone is not None:
+        with open(original, "rb") as original_file, open(target, "wb") as target_file:
+            try:
+                fcntl.ioctl(target_file.fileno(), ficlone, original_file.fileno())
+                return
+            except OSError:
+                pass
+    shutil.copyfile(original, target)
+
+def _remove(target: Path):
+    # Targets get replaced rather than overwritten, otherwise rewriting a file that's hardlinked
+    #   from an earlier dedup extraction would change every other file sharing it
+    try:
+        os.unlink(target)
+    except FileNotFoundError:
+        pass
+
+def copy_ranges(
+        source: Path | None, copies: list[tuple[int, int, Path]], view: memoryview = None,
+        jobs: int = None, progress_callback=None, links: list[tuple[Path, Path, int]] = (), link: str = "hardlink"):
+    # copies are (offset, length, target), source is the archive's path and/or view its mapped bytes
+    #   links are (original, target, length) from dedupe, they're made once all the copies are done
+    #   progress_callback gets the overall percentage (by bytes) from the calling thread, then inf once done
+    #   Copies sharing a target are cut down to the last one by offset before anything starts
+    copies = last_per_target(copies)
+    make_skeleton([target for _, _, target in copies] + [target for _, target, _ in links])
+    
+    total = (sum(length for _, length, _ in copies) + sum(length for _, _, length in links)) or 1
+    done = 0
+    copier = Copier(source, view)
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            batches = [
+                # submitted in offset order so the reads sweep through the archive front to back
+                [(copier.copy, (offset, length, target), length) for offset, length, target in sorted(copies, key=lambda copy: copy[0])],
+                [(link_file, (original, target, link), length) for original, target, length in links],
+            ]
+            for batch in batches:
+                pending = {pool.submit(task, *arguments): weight for task, arguments, weight in batch}
+                try:
+                    for finished in as_completed(pending):
+                        finished.result()
+                        done += pending[finished]
+                        if progress_callback:
+                            progress_callback(done / total * 100)
+                except BaseException:
+                    for waiting in pending:  # don't start anything else once one copy (or the callback) blew up
+                        waiting.cancel()
+                    raise
+    finally:
+        copier.close()
+    if progress_callback:
+        progress_callback(float('inf'))
@@ -0,0 +1,263 @@
+import sys
+from array import array
+
+# Just enough FLAC to find where a stream starts and stops without decoding any audio
+#   https://xiph.org/flac/format.html
+#
+# A stream is "fLaC", a chain of metadata blocks (STREAMINFO always first), then frames.
+#   Frames don't store their own length, but every frame header has a sync code, the number of
+#   its first sample (or its frame number) and a CRC-8, and every frame ends in a CRC-16 of the
+#   whole frame. So the end of a stream is found by looking backwards for the frame holding the
+#   last sample STREAMINFO promises, then walking forward to where its CRC-16 checks out.
+
+magic = b"fLaC"
+
+# metadata block types
+STREAMINFO = 0
+VORBIS_COMMENT = 4
+
+# entry flags
+NOT_FLAC = 1     # matched the magic number but there's no valid STREAMINFO behind it
+UNSURE_END = 2   # couldn't find the last frame, the entry just runs to whatever comes next
+
+search_window = 64 * 1024  # how far back from the limit to look for the last frame when STREAMINFO doesn't say
+
+def _crc8_table() -> list[int]:
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return table
+
+def _crc16_table() -> array:
+    table = array("H")
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x8005) & 0xFFFF if crc & 0x8000 else (crc << 1) & 0xFFFF
+        table.append(crc)
+    return table
+
+def _crc16_word_table() -> array:
+    # CRC-16 of every 16 bit word, lets crc16 eat two bytes per step which halves the python loop
+    table = array("H", bytes(2 * 65536))
+    for high in range(256):
+        crc = crc16_table[high]
+        for low in range(256):
+            table[(high << 8) | low] = ((crc << 8) & 0xFFFF) ^ crc16_table[(crc >> 8) ^ low]
+    return table
+
+crc8_table = _crc8_table()
+crc16_table = _crc16_table()
+crc16_word_table = None  # 128KiB, only built the first time it's needed
+
+def crc8(data) -> int:
+    crc = 0
+    for byte in data:
+        crc = crc8_table[crc ^ byte]
+    return crc
+
+def crc16(data, crc: int = 0) -> int:
+    global crc16_word_table
+    if crc16_word_table is None:
+        crc16_word_table = _crc16_word_table()
+    
+    data = memoryview(data)
+    if len(data) % 2:
+        crc = ((crc << 8) & 0xFFFF) ^ crc16_table[(crc >> 8) ^ data[0]]
+        data = data[1:]
+    words = array("H")
+    words.frombytes(data)
+    if sys.byteorder == "little":
+        words.byteswap()  # the CRC runs over the bytes in order, so the words need to be big endian
+    table = crc16_word_table
+    for word in words:
+        crc = table[crc ^ word]
+    return crc
+
+class StreamInfo:
+    __slots__ = (
+        "min_blocksize", "max_blocksize", "min_framesize", "max_framesize",
+        "sample_rate", "channels", "bits_per_sample", "total_samples", "md5", "audio_start"
+    )
+    
+    def __init__(self, block: bytes, audio_start: int):
+        self.min_blocksize = int.from_bytes(block[0:2], "big")
+        self.max_blocksize = int.from_bytes(block[2:4], "big")
+        self.min_framesize = int.from_bytes(block[4:7], "big")
+        self.max_framesize = int.from_bytes(block[7:10], "big")
+        packed = int.from_bytes(block[10:18], "big")  # 20 bits rate, 3 channels-1, 5 bits-1, 36 samples
+        self.sample_rate = packed >> 44
+        self.channels = ((packed >> 41) & 0x7) + 1
+        self.bits_per_sample = ((packed >> 36) & 0x1F) + 1
+        self.total_samples = packed & 0xFFFFFFFFF
+        self.md5 = bytes(block[18:34])
+        self.audio_start = audio_start  # absolute offset of the first frame
+
+def metadata_blocks(archive, offset: int, limit: int) -> list[tuple[int, int, int]] | None:
+    # (type, start, length) of every metadata block of the stream at offset, start being just past
+    #   the block's header. None if it isn't a FLAC stream or the blocks run past limit
+    if bytes(archive[offset : offset + 4]) != magic:
+        return None
+    blocks = []
+    position = offset + 4
+    while True:
+        block_header = bytes(archive[position : position + 4])
+        if len(block_header) < 4 or block_header[0] & 0x7F == 127:  # 127 is forbidden
+            return None
+        length = int.from_bytes(block_header[1:4], "big")
+        blocks.append((block_header[0] & 0x7F, position + 4, length))
+        position += 4 + length
+        if position > limit:
+            return None
+        if block_header[0] & 0x80:  # last metadata block
+            return blocks
+
+def read_streaminfo(archive, offset: int, limit: int) -> StreamInfo | None:
+    # Walks the metadata blocks of the stream at offset, None if it isn't a real FLAC stream
+    blocks = metadata_blocks(archive, offset, limit)
+    if not blocks or blocks[0][0] != STREAMINFO or blocks[0][2] != 34:
+        return None
+    _, start, _ = blocks[0]
+    _, last_start, last_length = blocks[-1]
+    
+    info = StreamInfo(bytes(archive[start : start + 34]), last_start + last_length)
+    if info.min_blocksize < 16 or info.max_blocksize < info.min_blocksize or info.sample_rate == 0:
+        return None
+    return info
+
+def read_vorbis_comment(block) -> tuple[str, list[str]]:
+    # (vendor, ["TITLE=...", ...]) out of a VORBIS_COMMENT block's body
+    #   Its lengths are little endian, unlike everything else in FLAC. A truncated block gives
+    #   whatever comments were whole.
+    block = bytes(block)
+    def string(position: int) -> tuple[str | None, int]:
+        if position + 4 > len(block):
+            return None, position
+        length = int.from_bytes(block[position : position + 4], "little")
+        end = position + 4 + length
+        if end > len(block):
+            return None, position
+        return block[position + 4 : end].decode("utf-8", errors="replace"), end
+    
+    vendor, position = string(0)
+    if vendor is None or position + 4 > len(block):
+        return vendor or "", []
+    count = int.from_bytes(block[position : position + 4], "little")
+    position += 4
+    comments = []
+    for _ in range(count):
+        comment, position = string(position)
+        if comment is None:
+            break
+        comments.append(comment)
+    return vendor, comments
+
+def read_frame_header(data, position: int, info: StreamInfo) -> tuple[int, int, int] | None:
+    # (first sample, block size, header length) of the frame at data[position], None if it isn't one
+    header = data[position : position + 16]
+    if len(header) < 6 or header[0] != 0xFF or header[1] & 0xFE != 0xF8:
+        return None
+    blocksize_code = header[2] >> 4
+    rate_code = header[2] & 0x0F
+    if blocksize_code == 0 or rate_code == 15 or (header[3] >> 4) > 10 or header[3] & 0x01:
+        return None
+    
+    # UTF-8 style coded frame/sample number
+    lead = header[4]
+    if lead < 0x80:
+        number, length = lead, 1
+    elif lead >= 0xC0 and lead != 0xFF:
+        length = 2
+        while length < 7 and lead & (0x80 >> length):
+            length += 1
+        if len(header) < 4 + length:
+            return None
+        number = lead & (0x7F >> length)
+        for byte in header[5 : 4 + length]:
+            if byte & 0xC0 != 0x80:
+                return None
+            number = (number << 6) | (byte & 0x3F)
+    else:
+        return None
+    cursor = 4 + length
+    
+    if blocksize_code == 1:
+        blocksize = 192
+    elif blocksize_code <= 5:
+        blocksize = 576 << (blocksize_code - 2)
+    elif blocksize_code == 6:
+        blocksize = header[cursor] + 1
+        cursor += 1
+    elif blocksize_code == 7:
+        blocksize = int.from_bytes(header[cursor : cursor + 2], "big") + 1
+        cursor += 2
+    else:
+        blocksize = 256 << (blocksize_code - 8)
+    cursor += {12: 1, 13: 2, 14: 2}.get(rate_code, 0)
+    
+    if cursor >= len(header) or crc8(header[:cursor]) != header[cursor]:
+        return None
+    
+    first_sample = number if header[1] & 0x01 else number * info.min_blocksize  # variable vs fixed blocking
+    return first_sample, blocksize, cursor + 1
+
+def measure(archive, offset: int, limit: int) -> tuple[int, int]:
+    # (length, flags) of the stream starting at offset, limit is where the next thing in the archive starts
+    info = read_streaminfo(archive, offset, limit)
+    if info is None:
+        return limit - offset, NOT_FLAC
+    if info.total_samples == 0:  # encoder didn't know the length, nothing to look for
+        return limit - offset, UNSURE_END
+    
+    found = find_stream_end(archive, info, limit)
+    if found is None:
+        return limit - offset, UNSURE_END
+    end, flags = found
+    return end - offset, flags
+
+def find_stream_end(archive, info: StreamInfo, limit: int) -> tuple[int, int] | None:
+    # Look backwards from the limit for the frame holding the last sample, then forward for its CRC-16
+    #   (end, flags), flags UNSURE_END when the CRC pointed at more than one place the frame could end
+    window = (info.max_framesize * 2 + 64) if info.max_framesize else search_window
+    while True:
+        start = max(info.audio_start, limit - window)
+        data = bytes(archive[start:limit])
+        sync = len(data)
+        while True:
+            sync = max(data.rfind(b"\xff\xf8", 0, sync), data.rfind(b"\xff\xf9", 0, sync))
+            if sync < 0:
+                break
+            frame = read_frame_header(data, sync, info)
+            if frame and frame[0] + frame[1] == info.total_samples:
+                found = _frame_end(data, sync, frame[2], info)
+                return None if found is None else (start + found[0], found[1])
+        
+        if start == info.audio_start or window >= 16 * search_window:
+            return None
+        window *= 4
+
+def _frame_end(data: bytes, start: int, header_length: int, info: StreamInfo) -> tuple[int, int] | None:
+    # (end, flags) of the frame at start. The CRC-16 at the end of a frame covers the frame itself, so
+    #   running it over the frame and its footer leaves 0. The common case is the frame running right up
+    #   to the limit, check that first and only go byte by byte if there's junk after it.
+    if crc16(memoryview(data)[start:]) == 0:
+        return len(data), 0
+    
+    # Any byte has a 1 in 65536 chance of leaving 0 by accident, inside the frame or in the junk after
+    #   it. The first 0 past the shortest the frame can be is taken, and if there's another one after
+    #   it the end gets flagged unsure rather than guessed at without saying so
+    shortest = start + max(info.min_framesize, header_length + 3)
+    longest = start + info.max_framesize if info.max_framesize else len(data)
+    crc = crc16(data[start : start + header_length])
+    table = crc16_table
+    end = None
+    for position in range(start + header_length, min(len(data), longest)):
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ data[position]]
+        if crc == 0 and position + 1 >= shortest:
+            if end is not None:
+                return end, UNSURE_END
+            end = position + 1
+    return None if end is None else (end, 0)
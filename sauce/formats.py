@@ -0,0 +1,124 @@
+import zlib
+import flac
+
+# Kinds of entry the archive scan recognises
+#   Every format brings a signature for the scan to look for, a validator that tells a real header
+#   from the same four bytes turning up by chance inside somebody's audio, and a probe that works out
+#   how long the entry is. An entry's kind is the number of its format, FLAC being 0 so an index
+#   from before kinds existed is all FLAC.
+#     validate(archive, offset, limit) -> bool
+#     measure(archive, offset, limit) -> (length, flags), flags flac.UNSURE_END when the end couldn't be found
+#   delimited formats know their own length from their headers, so they're measured without
+#   needing to know where the next entry starts, and any signature inside them (every Ogg page
+#   starts with OggS) is part of them rather than an entry of its own.
+#   keep_invalid formats still start an entry where the signature doesn't validate (flagged
+#   flac.NOT_FLAC), for the rest it's just noise. Only FLAC does, it's what the archives are
+#   made of and a broken one is still somebody's sound.
+#
+#   register(Format(...)) adds another one, the scan picks up every registered signature.
+
+class Format:
+    __slots__ = ("kind", "name", "signature", "extension", "content_type", "validate", "measure", "delimited", "keep_invalid")
+    
+    def __init__(
+            self, name: str, signature: bytes, extension: str, content_type: str, validate, measure,
+            delimited: bool = False, keep_invalid: bool = False):
+        self.kind = None  # set by register
+        self.name = name
+        self.signature = signature
+        self.extension = extension
+        self.content_type = content_type
+        self.validate = validate
+        self.measure = measure
+        self.delimited = delimited
+        self.keep_invalid = keep_invalid
+
+formats = []  # by kind
+
+def register(entry_format: Format) -> int:
+    if any(known.signature == entry_format.signature for known in formats):
+        raise ValueError("{} is already registered".format(entry_format.signature))
+    entry_format.kind = len(formats)
+    formats.append(entry_format)
+    return entry_format.kind
+
+def overlap() -> int:
+    # How far a signature can hang over the end of a chunk, scans that split the archive read this much further
+    return max(len(entry_format.signature) for entry_format in formats) - 1
+
+def kind_name(kind: int) -> str:
+    return formats[kind].name if kind < len(formats) else "unknown"
+
+def _flac_valid(archive, offset: int, limit: int) -> bool:
+    return flac.read_streaminfo(archive, offset, limit) is not None
+
+# RIFF (WAV, and XWMA and the like): "RIFF", u32 little endian size of what follows, form type,
+#   then chunks. Form type and first chunk id are both four printable ASCII characters.
+
+def _fourcc(code: bytes) -> bool:
+    return len(code) == 4 and code[0] != 0x20 and all(0x20 <= byte <= 0x7E for byte in code)
+
+def _riff_valid(archive, offset: int, limit: int) -> bool:
+    header = bytes(archive[offset : offset + 16])
+    size = int.from_bytes(header[4:8], "little")
+    return len(header) == 16 and size >= 12 and _fourcc(header[8:12]) and _fourcc(header[12:16])
+
+def _riff_measure(archive, offset: int, limit: int) -> tuple[int, int]:
+    length = 8 + int.from_bytes(bytes(archive[offset + 4 : offset + 8]), "little")
+    if offset + length > limit:
+        return limit - offset, flac.UNSURE_END
+    return length, 0
+
+# Ogg: a run of pages, each "OggS", version 0, header type (1 continued, 2 first page of a stream,
+#   4 last page), granule position, serial number, page number, CRC-32, then a segment table saying
+#   how long the page is. A physical stream ends once every logical stream in it has had its last page.
+
+_reversed_bits = bytes(int("{:08b}".format(byte)[::-1], 2) for byte in range(256))
+
+def ogg_crc(data) -> int:
+    # Ogg's CRC-32 is zlib's polynomial the other way round, without the inversions. Reversing the
+    #   bits of every byte going in and of the result coming out lets zlib do the work in C
+    crc = ~zlib.crc32(bytes(data).translate(_reversed_bits), 0xFFFFFFFF) & 0xFFFFFFFF
+    return int("{:032b}".format(crc)[::-1], 2)
+
+def ogg_page(archive, position: int, limit: int, check_crc: bool = False) -> tuple[int, int, int, int] | None:
+    # (header type, serial, page number, length) of the page at position, None if there isn't one
+    header = bytes(archive[position : position + 27])
+    if len(header) < 27 or header[:4] != b"OggS" or header[4] != 0 or header[5] & 0xF8:
+        return None
+    segments = header[26]
+    table = bytes(archive[position + 27 : position + 27 + segments])
+    length = 27 + segments + sum(table)
+    if len(table) < segments or position + length > limit:
+        return None
+    if check_crc:
+        page = bytearray(archive[position : position + length])
+        page[22:26] = bytes(4)  # the CRC is worked out with its own field zeroed
+        if ogg_crc(page) != int.from_bytes(header[22:26], "little"):
+            return None
+    return header[5], int.from_bytes(header[14:18], "little"), int.from_bytes(header[18:22], "little"), length
+
+def _ogg_valid(archive, offset: int, limit: int) -> bool:
+    # Only the first page of a stream starts an entry, and it has to check out
+    page = ogg_page(archive, offset, limit, check_crc=True)
+    return page is not None and page[0] & 0x02 and page[2] == 0
+
+def _ogg_measure(archive, offset: int, limit: int) -> tuple[int, int]:
+    streams = set()  # serials that have started and not ended yet
+    position = offset
+    while True:
+        page = ogg_page(archive, position, limit)
+        if page is None:
+            return limit - offset, flac.UNSURE_END
+        header_type, serial, _, length = page
+        position += length
+        if header_type & 0x02:
+            streams.add(serial)
+        if header_type & 0x04:
+            streams.discard(serial)
+            if not streams:
+                return position - offset, 0
+
+FLAC = register(Format("flac", flac.magic, ".flac", "audio/flac", _flac_valid, flac.measure, keep_invalid=True))
+RIFF = register(Format("riff", b"RIFF", ".wav", "audio/wav", _riff_valid, _riff_measure, delimited=True))
+OGG = register(Format("ogg", b"OggS", ".ogg", "audio/ogg", _ogg_valid, _ogg_measure, delimited=True))
@@ -0,0 +1,114 @@
+import sys
+from array import array
+from bisect import bisect_right
+
+class ArchiveIndex:
+    # Compact index of an archive
+    #   Rather than a tuple, a few ints and a 128 byte bytes object per entry, everything lives in a
+    #   handful of flat buffers:
+    #     offsets, lengths   u64 arrays
+    #     flags              u8 array (flac.NOT_FLAC, flac.UNSURE_END)
+    #     kinds              u8 array, which format each entry is (formats.FLAC, formats.RIFF...)
+    #     paths              every path block with its NUL padding cut off, back to back in one bytes
+    #     path_ends          u32 array, where each path stops inside paths
+    #     hashes             16 byte blake2b of every entry's bytes back to back, None until hashed
+    #   Paths are only decoded when somebody asks, once, and their components are interned so the
+    #   thousands of repeats of "sound" or "zm_asylum" are all the same string.
+    #
+    # Indexing or iterating still hands out the old (offset, path block, length, flags) tuples, so
+    #   anything written against the list of tuples keeps working.
+    path_blocksize = 32 * 4
+    
+    hash_size = 16
+    
+    def __init__(self, offsets, lengths, flags, file_paths: bytes, hashes: bytes = None, kinds=None):
+        # file_paths is the raw path table out of the archive, path_blocksize bytes per entry
+        #   kinds defaults to every entry being FLAC
+        self.offsets = array("Q", offsets)
+        self.lengths = array("Q", lengths)
+        self.flags = array("B", flags)
+        self.kinds = array("B", kinds) if kinds is not None else array("B", bytes(len(self.offsets)))
+        
+        packed = []
+        self.path_ends = array("I")
+        end = 0
+        for i in range(len(self.offsets)):
+            block = bytes(file_paths[i * self.path_blocksize : (i + 1) * self.path_blocksize]).rstrip(b"\0")
+            packed.append(block)
+            end += len(block)
+            self.path_ends.append(end)
+        self.paths = b"".join(packed)
+        self.hashes = bytes(hashes) if hashes is not None else None
+        
+        self.__decoded = {}
+        self.__components = {}
+    
+    def __len__(self) -> int:
+        return len(self.offsets)
+    
+    def __getitem__(self, index: int) -> tuple[int, bytes, int, int]:
+        if index < 0:
+            index += len(self)
+        return self.offsets[index], self.path_block(index), self.lengths[index], self.flags[index]
+    
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+    
+    def __eq__(self, other) -> bool:
+        if isinstance(other, ArchiveIndex):
+            return (
+                self.offsets == other.offsets and self.lengths == other.lengths and self.flags == other.flags
+                and self.kinds == other.kinds
+                and self.paths == other.paths and self.path_ends == other.path_ends
+            )
+        return NotImplemented
+    
+    def __reduce__(self):
+        # For handing indexes between processes
+        return ArchiveIndex, (self.offsets, self.lengths, self.flags, self.file_paths(), self.hashes, self.kinds)
+    
+    def content_hash(self, index: int) -> bytes | None:
+        if self.hashes is None:
+            return None
+        return self.hashes[index * self.hash_size : (index + 1) * self.hash_size]
+    
+    def raw_path(self, index: int) -> bytes:
+        # The path block minus its padding
+        return self.paths[self.path_ends[index - 1] if index else 0 : self.path_ends[index]]
+    
+    def path_block(self, index: int) -> bytes:
+        # The path block exactly like it is in the archive
+        return self.raw_path(index).ljust(self.path_blocksize, b"\0")
+    
+    def file_paths(self) -> bytes:
+        # The whole path table exactly like it is in the archive
+        return b"".join(self.path_block(i) for i in range(len(self)))
+    
+    def path(self, index: int) -> str:
+        # Decoded path with \ separators, "" for entries that don't have one
+        path = self.__decoded.get(index)
+        if path is None:
+            path = sys.intern(self.raw_path(index).strip(b"\0").decode("utf-8", errors="replace"))
+            self.__decoded[index] = path
+        return path
+    
+    def components(self, index: int) -> tuple[str, ...]:
+        # Path split into its directories and name, every component interned
+        components = self.__components.get(index)
+        if components is None:
+            path = self.path(index)
+            components = tuple(sys.intern(level) for level in path.split("\\")) if path else ()
+            self.__components[index] = components
+        return components
+    
+    def entry_at(self, offset: int) -> int | None:
+        # Index of the entry holding the byte at offset, binary search over the sorted offsets
+        index = bisect_right(self.offsets, offset) - 1
+        if index >= 0 and offset < self.offsets[index] + self.lengths[index]:
+            return index
+        return None
+    
+    def nbytes(self) -> int:
+        # Roughly what the index costs in ram, decoded paths not included
+        return sum(sys.getsizeof(part) for part in (self.offsets, self.lengths, self.flags, self.paths, self.path_ends))
@@ -0,0 +1,203 @@
+import os
+import sys
+import argparse
+from array import array
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from explorer import SablsUnarchiver, SablsArchive
+from index import ArchiveIndex
+import cache
+import flac
+import tracing
+
+# Bulk FLAC metadata for every entry of an index
+#   Only the metadata blocks at the front of each entry get read, STREAMINFO for the format and
+#   length and VORBIS_COMMENT for the tags, no audio is touched. Like ArchiveIndex everything is
+#   kept in columns:
+#     sample_rates          u32 array, 0 for entries that aren't FLAC
+#     channels, bits        u8 arrays
+#     total_samples         u64 array, 0 when the encoder didn't know
+#     md5s                  16 bytes per entry back to back, the MD5 of the decoded audio
+#     comments              every entry's comments as utf-8 "KEY=value" joined by NULs, back to back
+#     comment_ends          u32 array, where each entry's comments stop inside comments
+#
+# Big indexes get read by a process pool, and the columns are cached next to the index.
+
+parallel_threshold = 20000  # below this the pool costs more than it saves
+serial_batch = 1000  # entries read between progress reports without the pool, so a cancel gets through
+
+class ArchiveMetadata:
+    def __init__(self, sample_rates, channels, bits, total_samples, md5s: bytes, comments: bytes, comment_ends):
+        self.sample_rates = array("I", sample_rates)
+        self.channels = array("B", channels)
+        self.bits = array("B", bits)
+        self.total_samples = array("Q", total_samples)
+        self.md5s = bytes(md5s)
+        self.comments_blob = bytes(comments)
+        self.comment_ends = array("I", comment_ends)
+    
+    def __len__(self) -> int:
+        return len(self.sample_rates)
+    
+    def __reduce__(self):
+        return ArchiveMetadata, self.columns()
+    
+    def columns(self) -> tuple:
+        return (
+            self.sample_rates, self.channels, self.bits, self.total_samples,
+            self.md5s, self.comments_blob, self.comment_ends
+        )
+    
+    def duration(self, index: int) -> float | None:
+        # Seconds, None when the stream doesn't say
+        if not self.sample_rates[index] or not self.total_samples[index]:
+            return None
+        return self.total_samples[index] / self.sample_rates[index]
+    
+    def format(self, index: int) -> str:
+        # "FLAC 48kHz 16-bit stereo", "" for entries that aren't FLAC
+        rate = self.sample_rates[index]
+        if not rate:
+            return ""
+        channels = {1: "mono", 2: "stereo"}.get(self.channels[index], "{}ch".format(self.channels[index]))
+        return "FLAC {:g}kHz {}-bit {}".format(rate / 1000, self.bits[index], channels)
+    
+    def md5(self, index: int) -> bytes:
+        return self.md5s[index * 16 : (index + 1) * 16]
+    
+    def comments(self, index: int) -> list[tuple[str, str]]:
+        # (key, value) pairs, keys upper cased like the spec says to compare them
+        start = self.comment_ends[index - 1] if index else 0
+        raw = self.comments_blob[start : self.comment_ends[index]]
+        pairs = []
+        for comment in raw.decode("utf-8", errors="replace").split("\0") if raw else ():
+            key, _, value = comment.partition("=")
+            pairs.append((key.upper(), value))
+        return pairs
+    
+    def info(self, index: int) -> list[tuple[str, str]]:
+        # (name, value) rows describing an entry, for showing to people
+        if not self.sample_rates[index]:
+            return [("Format", "Not FLAC")]
+        duration = self.duration(index)
+        rows = [
+            ("Format", self.format(index)),
+            ("Duration", "{:0.3f}s".format(duration) if duration is not None else "Unknown"),
+            ("Samples", str(self.total_samples[index])),
+            ("MD5", self.md5(index).hex()),
+        ]
+        return rows + self.comments(index)
+
+def read_entry(archive, offset: int, limit: int) -> tuple[int, int, int, int, bytes, bytes]:
+    # (sample rate, channels, bits, total samples, md5, comments blob) of the stream at offset
+    blocks = flac.metadata_blocks(archive, offset, limit)
+    if not blocks or blocks[0][0] != flac.STREAMINFO or blocks[0][2] != 34:
+        return 0, 0, 0, 0, bytes(16), b""
+    info = flac.StreamInfo(bytes(archive[blocks[0][1] : blocks[0][1] + 34]), 0)
+    comments = b""
+    for block_type, start, length in blocks:
+        if block_type == flac.VORBIS_COMMENT:
+            _, found = flac.read_vorbis_comment(archive[start : start + length])
+            comments = "\0".join(found).encode("utf-8")
+            break
+    return info.sample_rate, info.channels, info.bits_per_sample, info.total_samples, info.md5, comments
+
+def _read_entries(archive, offsets, lengths) -> tuple:
+    # Columns for a run of entries
+    rates, channels, bits, totals = array("I"), array("B"), array("B"), array("Q")
+    md5s, comments, ends = [], [], array("I")
+    end = 0
+    for offset, length in zip(offsets, lengths):
+        rate, channel_count, bit_depth, total, md5, comment = read_entry(archive, offset, offset + length)
+        rates.append(rate)
+        channels.append(channel_count)
+        bits.append(bit_depth)
+        totals.append(total)
+        md5s.append(md5)
+        comments.append(comment)
+        end += len(comment)
+        ends.append(end)
+    return rates, channels, bits, totals, b"".join(md5s), b"".join(comments), ends
+
+def _read_range(archive: Path, offsets, lengths) -> tuple:
+    # Process pool worker, every worker maps the archive for itself
+    with SablsArchive(archive) as mapped:
+        return _read_entries(mapped, offsets, lengths)
+
+def read_metadata(archive: Path, flacs: ArchiveIndex, jobs: int = None, use_cache: bool = True, progress_callback=None) -> ArchiveMetadata:
+    # Metadata for every entry of flacs, from the cache if it's there
+    #   jobs is the number of processes, None meaning every core, progress is by entries
+    if use_cache:
+        cached = cache.load_metadata(archive, flacs.offsets, flacs.lengths)
+        if cached:
+            if progress_callback:
+                progress_callback(float('inf'))
+            return ArchiveMetadata(*cached)
+    
+    count = len(flacs)
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or count < parallel_threshold:
+        parts = []
+        with SablsArchive(archive) as mapped, tracing.span("metadata.read", entries=count):
+            for start in range(0, count, serial_batch):
+                end = min(start + serial_batch, count)
+                parts.append(_read_entries(mapped, flacs.offsets[start:end], flacs.lengths[start:end]))
+                if progress_callback:
+                    progress_callback(end / count * 100)
+    else:
+        ranges = jobs * 4
+        bounds = [count * i // ranges for i in range(ranges + 1)]
+        parts = []
+        with tracing.span("metadata.read_parallel", entries=count), ProcessPoolExecutor(max_workers=jobs) as pool:
+            done = pool.map(
+                _read_range,
+                [archive] * ranges,
+                [flacs.offsets[start:end] for start, end in zip(bounds, bounds[1:])],
+                [flacs.lengths[start:end] for start, end in zip(bounds, bounds[1:])],
+            )
+            for i, part in enumerate(done):
+                parts.append(part)
+                if progress_callback:
+                    progress_callback(bounds[i + 1] / count * 100)
+    
+    metadata = ArchiveMetadata(*_join(parts))
+    if use_cache:
+        cache.store_metadata(archive, flacs.offsets, flacs.lengths, *metadata.columns())
+    if progress_callback:
+        progress_callback(float('inf'))
+    return metadata
+
+def _join(parts: list[tuple]) -> tuple:
+    # Stitches the columns of consecutive runs together, comment_ends get shifted along
+    rates, channels, bits, totals = array("I"), array("B"), array("B"), array("Q")
+    md5s, comments, ends = [], [], array("I")
+    shift = 0
+    for part_rates, part_channels, part_bits, part_totals, part_md5s, part_comments, part_ends in parts:
+        rates.extend(part_rates)
+        channels.extend(part_channels)
+        bits.extend(part_bits)
+        totals.extend(part_totals)
+        md5s.append(part_md5s)
+        comments.append(part_comments)
+        ends.extend(end + shift for end in part_ends)
+        shift += len(part_comments)
+    return rates, channels, bits, totals, b"".join(md5s), b"".join(comments), ends
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print the FLAC metadata of every entry in a SABLS archive")
+    parser.add_argument("archive", type=Path)
+    parser.add_argument("--jobs", type=int, default=None, help="processes reading metadata (default: every core)")
+    parser.add_argument("--no-cache", action="store_true", help="ignore and don't write the caches")
+    args = parser.parse_args()
+    
+    if not args.archive.is_file():
+        print("No archive at {}".format(args.archive))
+        sys.exit(1)
+    flacs = SablsUnarchiver.index_archive(args.archive, progress_callback=None, use_cache=not args.no_cache)
+    metadata = read_metadata(args.archive, flacs, args.jobs, not args.no_cache)
+    for i in range(len(flacs)):
+        duration = metadata.duration(i)
+        print("{}\t{}\t{}\t{}".format(
+            flacs.path(i), "{:0.3f}".format(duration) if duration is not None else "",
+            metadata.format(i), "; ".join("{}={}".format(key, value) for key, value in metadata.comments(i))
+        ))
@@ -0,0 +1,113 @@
+import threading
+from collections import OrderedDict, Counter
+from concurrent.futures import ThreadPoolExecutor
+from explorer import SablsUnarchiver, SablsArchive
+from index import ArchiveIndex
+import tracing
+
+# Entries held in memory for auditioning
+#   Stepping through a directory means the next entry is almost always one of the neighbours of
+#   the current one, so those get read on a couple of background threads while the current one
+#   plays. Reading them is what pulls their pages off the disk, after that starting one is just
+#   pointing the player at bytes that are already there.
+#
+# Entries are kept least recently used first and dropped from the front once they add up to more
+#   than max_bytes.
+
+class EntryCache:
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, workers: int = 2):
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[int, bytes] = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self.archive = None
+        self.flacs = None
+        self.wanted = set()   # what the last prefetch asked for, anything else still queued gets skipped
+        self.pending = set()  # submitted and not done yet
+        self.generation = 0   # bumped per archive, so a read of the last archive can't land in this one
+        self.reading = Counter()  # archive -> fetches reading out of it right now
+        self.hits = 0
+        self.misses = 0
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def set_archive(self, archive: SablsArchive, flacs: ArchiveIndex):
+        with self.lock:
+            self.archive = archive
+            self.flacs = flacs
+            self.entries.clear()
+            self.size = 0
+            self.wanted = set()
+            self.pending = set()
+            self.generation += 1
+    
+    def get(self, index: int) -> bytes | None:
+        with self.lock:
+            data = self.entries.get(index)
+            if data is not None:
+                self.entries.move_to_end(index)
+            return data
+    
+    def load(self, index: int) -> memoryview:
+        # The entry out of the cache when it's there, straight out of the archive otherwise
+        data = self.get(index)
+        if data is None:
+            self.misses += 1
+            tracing.count("prefetch.miss")
+            return SablsUnarchiver.select_file(self.archive, self.flacs, index)
+        self.hits += 1
+        tracing.count("prefetch.hit")
+        return memoryview(data)
+    
+    def prefetch(self, indices: list[int]):
+        # Reads indices in the background, in the order given
+        with self.lock:
+            if self.archive is None:
+                return
+            self.wanted = set(indices)
+            submit = [index for index in indices if index not in self.entries and index not in self.pending]
+            self.pending.update(submit)
+            job = (self.generation, self.archive, self.flacs)
+        for index in submit:
+            self.pool.submit(self.__fetch, *job, index)
+    
+    def __fetch(self, generation: int, archive: SablsArchive, flacs: ArchiveIndex, index: int):
+        with self.lock:
+            if generation != self.generation:
+                return
+            if index not in self.wanted:  # the selection already moved on
+                self.pending.discard(index)
+                return
+            self.reading[archive] += 1
+        try:
+            with tracing.span("prefetch.read", entries=1) as span:
+                data = bytes(SablsUnarchiver.select_file(archive, flacs, index))
+                span.bytes = len(data)
+        finally:
+            with self.lock:
+                self.reading[archive] -= 1
+                if not self.reading[archive]:
+                    del self.reading[archive]
+        with self.lock:
+            if generation == self.generation:
+                self.pending.discard(index)
+                self.__put(index, data)
+    
+    def __put(self, index: int, data: bytes):
+        if len(data) > self.max_bytes or index in self.entries:
+            return
+        self.entries[index] = data
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+    
+    def reads_from(self, archive: SablsArchive) -> bool:
+        # Whether a fetch is still reading out of archive, it can't be closed under one
+        with self.lock:
+            return archive in self.reading
+    
+    def close(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
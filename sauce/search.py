@@ -0,0 +1,147 @@
+import re
+import sys
+import fnmatch
+import argparse
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, chain
+from pathlib import Path
+from index import ArchiveIndex
+
+# Path search over one or many archives
+#   python search.py "Game Files/all" "vox/*"
+#   python search.py zm_asylum.all.sabs --substring explosion
+#
+# Paths are matched case insensitively with either separator. Every path goes into one flat table
+#   with one row per (archive, entry) and sorted once, so prefix queries are two binary searches and
+#   glob queries only check the range under their literal prefix. Substring queries are one find over
+#   every path joined up with newlines, a hit gets mapped back to its row by where the rows start and
+#   the search carries on from the next row, so a query costs one pass in C over the text and nothing
+#   has to be built for it up front. The paths of an index are decoded and lower cased in one go too,
+#   a whole search is built in well under a second for 500k entries.
+
+wildcards = re.compile(r"[*?\[]")
+# what separates a glob's plain stretches, a closed bracket goes as a whole ([]x] and [!]x] included)
+wildcard_runs = re.compile(r"[*?]|\[!?\]?[^\]]*\]")
+
+def literal_runs(pattern: str) -> list[str]:
+    # The stretches of a glob without wildcards in them, a [ that never closes is plain like fnmatch has it
+    return [run for run in wildcard_runs.split(pattern) if run]
+
+class PathSearch:
+    def __init__(self, sources: dict[str, ArchiveIndex] | ArchiveIndex):
+        # sources is {archive name: index}, like Catalog.archives, or a single index
+        if isinstance(sources, ArchiveIndex):
+            sources = {"": sources}
+        self.archive_names = list(sources)
+        self.archive_ids = array("H")
+        self.entries = array("I")
+        self.paths = []
+        for archive_id, index in enumerate(sources.values()):
+            self.archive_ids.extend(array("H", [archive_id]) * len(index))
+            self.entries.extend(range(len(index)))
+            self.paths += _lower_paths(index)
+        
+        self.order = array("I", sorted(range(len(self.paths)), key=self.paths.__getitem__))
+        self.sorted_paths = [self.paths[i] for i in self.order]
+        self.text = "\n".join(self.paths)
+        self.starts = array("Q", accumulate((len(path) + 1 for path in self.paths[:-1]), initial=0)) if self.paths else array("Q")
+    
+    def __len__(self) -> int:
+        return len(self.paths)
+    
+    def key(self, row: int) -> tuple[str, int]:
+        return self.archive_names[self.archive_ids[row]], self.entries[row]
+    
+    def __normalize(query: str) -> str:
+        return query.replace("/", "\\").lower()
+    
+    def prefix(self, query: str, limit: int = None) -> list[tuple[str, int]]:
+        return [self.key(row) for row in self.__prefix_ids(PathSearch.__normalize(query))[:limit]]
+    
+    def glob(self, pattern: str, limit: int = None) -> list[tuple[str, int]]:
+        # fnmatch style, * also crosses directories
+        pattern = PathSearch.__normalize(pattern)
+        literal = wildcards.split(pattern, 1)[0]
+        if literal:
+            candidates = self.__prefix_ids(literal)
+        else:
+            # no prefix to go on, let the longest run of plain characters pick the candidates
+            longest = max(literal_runs(pattern), key=len, default="")
+            candidates = self.__substring_ids(longest) if len(longest) >= 3 else range(len(self.paths))
+        
+        matcher = re.compile(fnmatch.translate(pattern), re.DOTALL)
+        found = []
+        for row in candidates:
+            if matcher.match(self.paths[row]):
+                found.append(self.key(row))
+                if limit and len(found) >= limit:
+                    break
+        return found
+    
+    def substring(self, query: str, limit: int = None) -> list[tuple[str, int]]:
+        return [self.key(row) for row in self.__substring_ids(PathSearch.__normalize(query), limit)]
+    
+    def search(self, query: str, limit: int = None) -> list[tuple[str, int]]:
+        # Globs if there are wildcards, substrings otherwise
+        if wildcards.search(query):
+            return self.glob(query, limit)
+        return self.substring(query, limit)
+    
+    def __prefix_ids(self, query: str) -> array:
+        start = bisect_left(self.sorted_paths, query)
+        end = bisect_left(self.sorted_paths, query + "\U0010ffff", start)
+        return self.order[start:end]
+    
+    def __substring_ids(self, query: str, limit: int = None) -> list[int]:
+        # Rows holding query, in order
+        found = []
+        if "\n" in query:
+            return found
+        text, starts = self.text, self.starts
+        position = text.find(query)
+        while position >= 0:
+            row = bisect_right(starts, position) - 1
+            found.append(row)
+            if row + 1 >= len(starts) or (limit and len(found) >= limit):
+                break
+            position = text.find(query, starts[row + 1])  # one hit per row is plenty
+        return found
+
+def _lower_paths(index: ArchiveIndex) -> list[str]:
+    # Every path of an index lower cased, like index.path(entry).lower() but decoded all at once
+    if not len(index):
+        return []
+    raw = index.paths
+    if b"\n" in raw or b"\0" in raw:  # wouldn't split back up right, the odd archive like that goes one by one
+        return [index.path(entry).lower() for entry in range(len(index))]
+    ends = index.path_ends
+    lines = b"\n".join([raw[start:end] for start, end in zip(chain((0,), ends), ends)])
+    return lines.decode("utf-8", errors="replace").lower().split("\n")
+
+if __name__ == "__main__":
+    from catalog import build_catalog
+    from explorer import SablsUnarchiver
+    
+    parser = argparse.ArgumentParser(description="Search the paths inside SABLS archives")
+    parser.add_argument("source", type=Path, help="an archive, or a directory of them")
+    parser.add_argument("query")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--prefix", action="store_const", const="prefix", dest="mode")
+    mode.add_argument("--glob", action="store_const", const="glob", dest="mode")
+    mode.add_argument("--substring", action="store_const", const="substring", dest="mode")
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+    
+    if args.source.is_dir():
+        sources = build_catalog(args.source).archives
+    elif args.source.is_file():
+        sources = {args.source.name: SablsUnarchiver.index_archive(args.source, progress_callback=None)}
+    else:
+        print("Nothing at {}".format(args.source))
+        sys.exit(1)
+    
+    searcher = PathSearch(sources)
+    query = getattr(searcher, args.mode or "search")
+    for archive, entry in query(args.query, args.limit):
+        print("{}\t{}\t{}".format(archive, entry, sources[archive].path(entry)))
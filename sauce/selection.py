@@ -0,0 +1,166 @@
+import re
+from array import array
+from index import ArchiveIndex
+from search import literal_runs
+
+# Picking entries out of an index by path, in bulk
+#   table = PathTable(flacs)
+#   indices = table.select(globs=["sound/vox/*"], prefixes=["music\\"])
+#   SablsUnarchiver.dump_files(out, archive, flacs, indices, jobs)
+#
+# The paths are laid out like the path table in the archive, fixed width records one per entry, only
+#   lower cased and padded with newlines to one byte more than the longest path so every path ends in
+#   at least one. That's usually a good deal narrower than the 128 bytes in the archive, and scanning
+#   the table is what a query costs. A query is one regex pass over the whole table in C, and the entry
+#   a match belongs to is just its offset divided by the record size. Newlines keep . and [^\n] inside
+#   a record, and ^ and $ (the table is searched MULTILINE) land on the ends of the path.
+#
+# Globs and prefixes are case insensitive and take either separator, * crosses directories like it
+#   does for PathSearch. Regexes are searched anywhere in the path as it is, \ separated.
+#   Results are array("I") in archive order, which is what dump_files wants anyway.
+
+def _normalize(pattern: str) -> bytes:
+    return pattern.replace("/", "\\").lower().encode("utf-8")
+
+def glob_to_regex(pattern: str) -> bytes:
+    # fnmatch style glob -> regex that can't leave its record, not anchored
+    #   Same shape as fnmatch.translate: what sits between two *s only gets matched at the first place
+    #   it fits, later ones are never tried. That's never a worse place to be for what comes after it,
+    #   and without it a pattern full of *s backtracks exponentially on a path it nearly matches.
+    pattern = _normalize(pattern)
+    out = []  # None for a *, pieces of regex otherwise
+    i = 0
+    while i < len(pattern):
+        char = pattern[i : i + 1]
+        i += 1
+        if char == b"*":
+            if not out or out[-1] is not None:  # a run of them is the same as one
+                out.append(None)
+        elif char == b"?":
+            out.append(rb"[^\n]")
+        elif char == b"[":
+            end = i
+            if pattern[end : end + 1] == b"!":
+                end += 1
+            if pattern[end : end + 1] == b"]":  # a ] straight after the bracket is one of the members
+                end += 1
+            end = pattern.find(b"]", end)
+            if end < 0:  # no closing bracket, fnmatch takes it literally
+                out.append(re.escape(char))
+                continue
+            members = re.sub(rb"([&~|\[\]])", rb"\\\1", pattern[i:end].replace(b"\\", b"\\\\"))  # brackets and set operations are plain here
+            i = end + 1
+            if members.startswith(b"!"):
+                out.append(b"[^\\n" + members[1:] + b"]")  # newlines stay out so it can't run into padding
+            else:
+                out.append(b"[" + (b"\\" + members if members.startswith(b"^") else members) + b"]")
+        else:
+            out.append(re.escape(char))
+    
+    if None not in out:
+        return b"".join(out)
+    first = out.index(None)
+    last = len(out) - out[::-1].index(None) - 1
+    regex = out[:first]
+    fixed = []
+    for piece in out[first + 1 : last + 1]:
+        if piece is not None:
+            fixed.append(piece)
+            continue
+        # (?=(...))\1 is an atomic group before 3.11, once the lookahead matched nothing backtracks into it
+        group = b"s%d" % len(regex)
+        regex.append(b"(?=(?P<" + group + rb">[^\n]*?" + b"".join(fixed) + b"))(?P=" + group + b")")
+        fixed = []
+    regex.append(rb"[^\n]*")
+    regex += out[last + 1:]
+    return b"".join(regex)
+
+def _literal_runs(pattern: str) -> list[bytes]:
+    # The stretches of a glob without wildcards in them, split the same way PathSearch does
+    return [run.encode("utf-8") for run in literal_runs(pattern.replace("/", "\\").lower())]
+
+class PathTable:
+    def __init__(self, flacs: ArchiveIndex):
+        self.count = len(flacs)
+        paths = flacs.paths
+        starts = [0] + list(flacs.path_ends[:-1])
+        ends = flacs.path_ends
+        self.stride = max((end - start for start, end in zip(starts, ends)), default=0) + 1
+        self.table = b"".join(paths[start:end].ljust(self.stride, b"\n") for start, end in zip(starts, ends)).lower()
+    
+    def __len__(self) -> int:
+        return self.count
+    
+    def path(self, index: int) -> bytes:
+        # Lower cased path of an entry as it sits in the table
+        return self.table[index * self.stride : (index + 1) * self.stride].rstrip(b"\n")
+    
+    def __records(self, regex: re.Pattern, aligned: bool) -> array:
+        # Entries with a match, aligned only counts matches that start where a path does
+        stride = self.stride
+        found = array("I")
+        last = -1
+        for match in regex.finditer(self.table):
+            start = match.start()
+            record = start // stride
+            if record != last and (not aligned or start % stride == 0) and (match.end() > start or start % stride == 0):
+                found.append(record)
+                last = record
+        return found
+    
+    def regex(self, pattern: str | bytes) -> array:
+        if isinstance(pattern, str):
+            pattern = pattern.encode("utf-8")
+        # the table is lower case already, and without IGNORECASE the engine can jump between literals
+        flags = re.MULTILINE if pattern == pattern.lower() else re.IGNORECASE | re.MULTILINE
+        regex = re.compile(pattern, flags)
+        # \s, [^x] and the like take newlines too, so a match can run through the padding into the next
+        #   record. The record a match starts in gets searched again on its own, stopping where its path
+        #   does, which is what searching that path by itself does, and the scan goes on from the next one
+        table, stride = self.table, self.stride
+        found = array("I")
+        position = 0
+        while True:
+            match = regex.search(table, position)
+            if match is None or match.start() >= len(table):  # an empty match after the last record
+                return found
+            start = match.start() // stride * stride
+            if regex.search(table, start, table.index(b"\n", start)):
+                found.append(start // stride)
+            position = start + stride
+    
+    def prefix(self, *prefixes: str) -> array:
+        alternatives = b"|".join(re.escape(_normalize(prefix)) for prefix in prefixes)
+        return self.__records(re.compile(b"(?:" + alternatives + b")"), aligned=True)
+    
+    def glob(self, pattern: str) -> array:
+        if pattern and not pattern.strip("*"):
+            return array("I", range(self.count))
+        body = glob_to_regex(pattern)
+        runs = _literal_runs(pattern)
+        longest = max(runs, key=len) if runs else b""
+        if longest and _normalize(pattern).startswith(longest):
+            # the regex engine skips straight between occurrences of the plain start
+            return self.__records(re.compile(body + b"$", re.MULTILINE), aligned=True)
+        
+        if longest:
+            # only paths holding the longest plain stretch can match at all
+            candidates = self.__records(re.compile(re.escape(longest)), aligned=False)
+        else:
+            candidates = range(self.count)
+        whole = re.compile(body)
+        return array("I", (record for record in candidates if whole.fullmatch(self.path(record))))
+    
+    def select(self, globs: list[str] = (), regexes: list[str] = (), prefixes: list[str] = ()) -> array:
+        # Everything matching any of the queries, in archive order
+        parts = [self.glob(pattern) for pattern in globs]
+        parts += [self.regex(pattern) for pattern in regexes]
+        if prefixes:
+            parts.append(self.prefix(*prefixes))
+        if len(parts) == 1:
+            return parts[0]
+        return array("I", sorted(set().union(*parts)))
+
+def select(flacs: ArchiveIndex, globs: list[str] = (), regexes: list[str] = (), prefixes: list[str] = ()) -> array:
+    # One off selection, keep a PathTable around when there's going to be more than one query
+    return PathTable(flacs).select(globs, regexes, prefixes)
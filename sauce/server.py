@@ -0,0 +1,229 @@
+import sys
+import json
+import asyncio
+import argparse
+import ipaddress
+from pathlib import Path
+from urllib.parse import quote, unquote, urlsplit
+from explorer import SablsUnarchiver
+from catalog import Catalog
+from index import ArchiveIndex
+import formats
+import tracing
+
+# Local HTTP server streaming entries straight out of the archives, nothing gets extracted
+#   python server.py "Game Files/all" --port 8765
+#   curl -r 0-1023 http://127.0.0.1:8765/zm_asylum.all.sabs/sound/vox/foo.flac
+#
+#   GET /                          every archive with its entry count and size, as JSON
+#   GET /<archive>/                every entry in it with its url, as JSON
+#   GET /<archive>/<path>.flac     the entry itself (.wav or .ogg for those), HEAD works too
+#
+# Entry urls are their extraction path (what to_filepath makes of it) under the archive's name,
+#   matched case insensitively, unnamed entries are "No Name/File 0042.flac" by index like in the tree.
+#   Single byte ranges get a 206 so players can seek, anything fancier gets the whole entry, which
+#   HTTP allows. The bytes go from the archive file to the socket with sendfile where asyncio can.
+#
+# Only ever listens on a loopback address, it has no authentication and hands out anything in the archives.
+
+header_limit = 64 * 1024
+
+def load_archives(path: Path, use_cache: bool = True, jobs: int = None) -> dict[str, tuple[Path, ArchiveIndex]]:
+    # {name: (archive path, index)} for one archive or every archive under a directory
+    path = Path(path)
+    if path.is_dir():
+        catalog = Catalog(path).update(jobs, use_cache)
+        return {archive: (catalog.archive_path(archive), index) for archive, index in catalog.archives.items()}
+    return {path.name: (path, SablsUnarchiver.index_archive(path, progress_callback=None, use_cache=use_cache, jobs=jobs or 1))}
+
+def byte_range(header: str | None, length: int) -> tuple[int, int] | None:
+    # (start, end) a Range header asks for, None when the whole entry should go out instead
+    #   Raises ValueError when the range can't be satisfied
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, dash, last = header[6:].strip().partition("-")
+    if not dash or not (first.isdigit() or last.isdigit()) or (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+    if not first:  # the last n bytes
+        if int(last) == 0 or length == 0:
+            raise ValueError("empty suffix range")
+        return max(0, length - int(last)), length
+    start = int(first)
+    if last and int(last) < start:
+        return None  # backwards, ignored like any other malformed range
+    if start >= length:
+        raise ValueError("range starts past the end")
+    return start, min(int(last) + 1 if last else length, length)
+
+class EntryServer:
+    reasons = {
+        200: "OK", 206: "Partial Content", 400: "Bad Request", 404: "Not Found",
+        405: "Method Not Allowed", 416: "Range Not Satisfiable",
+    }
+    
+    def __init__(self, archives: dict[str, tuple[Path, ArchiveIndex]]):
+        self.archives = archives
+        self.__by_file = {}   # archive -> {lower cased entry file: index}, made the first time it's asked for
+        self.__listings = {}  # archive -> its listing encoded, same
+        self.server = None
+    
+    async def start(self, host: str = "127.0.0.1", port: int = 8765) -> asyncio.AbstractServer:
+        if host != "localhost" and not ipaddress.ip_address(host).is_loopback:
+            raise ValueError("{} isn't a loopback address, the server only runs on localhost".format(host))
+        self.server = await asyncio.start_server(self.handle, host, port, limit=header_limit)
+        return self.server
+    
+    def url(self, archive: str, index: int) -> str:
+        return "/" + quote(archive) + "/" + quote(SablsUnarchiver.entry_file(self.archives[archive][1], index))
+    
+    def catalog(self) -> bytes:
+        return json.dumps({"archives": [
+            {"name": archive, "url": "/" + quote(archive) + "/", "entries": len(flacs), "bytes": sum(flacs.lengths)}
+            for archive, (_, flacs) in self.archives.items()
+        ]}).encode("utf-8")
+    
+    def listing(self, archive: str) -> bytes:
+        listing = self.__listings.get(archive)
+        if listing is None:
+            flacs = self.archives[archive][1]
+            listing = self.__listings[archive] = json.dumps({"archive": archive, "entries": [
+                {
+                    "index": index, "path": flacs.path(index), "kind": formats.kind_name(flacs.kinds[index]),
+                    "length": flacs.lengths[index], "url": self.url(archive, index),
+                }
+                for index in range(len(flacs))
+            ]}).encode("utf-8")
+        return listing
+    
+    def find(self, target: str) -> tuple[str, int | None] | None:
+        # (archive, entry) a request path points at, entry None for the archive itself
+        path = unquote(urlsplit(target).path).lstrip("/")
+        for archive in self.archives:
+            if path == archive or path == archive + "/":
+                return archive, None
+            if path.startswith(archive + "/"):
+                by_file = self.__by_file.get(archive)
+                if by_file is None:
+                    flacs = self.archives[archive][1]
+                    by_file = self.__by_file[archive] = {SablsUnarchiver.entry_file(flacs, index).lower(): index for index in range(len(flacs))}
+                index = by_file.get(path[len(archive) + 1:].lower())
+                return None if index is None else (archive, index)
+        return None
+    
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # One connection, requests one after the other for as long as the client keeps it open
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                request = lines[0].split(" ")
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                if len(request) != 3 or not request[2].startswith("HTTP/"):
+                    await self.__respond_error(writer, None, 400, False)  # no telling what it asked for
+                    break
+                method, target, version = request
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                if headers.get("content-length", "0").isdigit():
+                    await reader.readexactly(int(headers.get("content-length", "0")))  # a GET has no business sending one
+                else:
+                    await self.__respond_error(writer, method, 400, False)
+                    break
+                tracing.count("server.request")
+                await self.respond(writer, method, target, headers, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # the client went away, a player skipping ahead does that all the time
+        finally:
+            writer.close()
+    
+    async def respond(self, writer: asyncio.StreamWriter, method: str, target: str, headers: dict, keep_alive: bool):
+        if method not in ("GET", "HEAD"):
+            return await self.__respond_error(writer, method, 405, keep_alive, {"Allow": "GET, HEAD"})
+        if urlsplit(target).path in ("", "/"):
+            return await self.__respond_body(writer, method, self.catalog(), keep_alive)
+        found = self.find(target)
+        if found is None:
+            return await self.__respond_error(writer, method, 404, keep_alive)
+        archive, index = found
+        if index is None:
+            return await self.__respond_body(writer, method, self.listing(archive), keep_alive)
+        
+        archive_path, flacs = self.archives[archive]
+        offset, end = SablsUnarchiver.entry_range(None, flacs, index)
+        length = end - offset
+        try:
+            requested = byte_range(headers.get("range"), length)
+        except ValueError:
+            return await self.__respond_error(writer, method, 416, keep_alive, {"Content-Range": "bytes */{}".format(length)})
+        extra = {"Content-Type": formats.formats[flacs.kinds[index]].content_type}
+        if flacs.hashes is not None:
+            extra["ETag"] = '"{}"'.format(flacs.content_hash(index).hex())
+        if requested is None:
+            start, stop, status = 0, length, 200
+        else:
+            (start, stop), status = requested, 206
+            extra["Content-Range"] = "bytes {}-{}/{}".format(start, stop - 1, length)
+        await self.__send_head(writer, status, stop - start, keep_alive, extra)
+        if method == "HEAD" or stop == start:
+            return
+        with tracing.span("server.send", stop - start, 1), open(archive_path, "rb") as archive_file:
+            # a file object each, sendfile moves its position around
+            await asyncio.get_running_loop().sendfile(writer.transport, archive_file, offset + start, stop - start)
+    
+    async def __send_head(self, writer: asyncio.StreamWriter, status: int, length: int, keep_alive: bool, extra: dict = None):
+        lines = [
+            "HTTP/1.1 {} {}".format(status, self.reasons[status]),
+            "Content-Length: {}".format(length),
+            "Accept-Ranges: bytes",
+            "Connection: {}".format("keep-alive" if keep_alive else "close"),
+        ]
+        lines += ["{}: {}".format(name, value) for name, value in (extra or {}).items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+    
+    async def __respond_body(self, writer: asyncio.StreamWriter, method: str, body: bytes, keep_alive: bool):
+        await self.__send_head(writer, 200, len(body), keep_alive, {"Content-Type": "application/json"})
+        if method != "HEAD":
+            writer.write(body)
+            await writer.drain()
+    
+    async def __respond_error(self, writer: asyncio.StreamWriter, method: str | None, status: int, keep_alive: bool, extra: dict = None):
+        body = "{} {}\n".format(status, self.reasons[status]).encode("latin-1")
+        await self.__send_head(writer, status, len(body), keep_alive, {"Content-Type": "text/plain", **(extra or {})})
+        if method != "HEAD":
+            writer.write(body)
+            await writer.drain()
+
+async def serve(archives: dict[str, tuple[Path, ArchiveIndex]], host: str = "127.0.0.1", port: int = 8765):
+    server = await EntryServer(archives).start(host, port)
+    for socket in server.sockets:
+        print("Serving {} archives on http://{}:{}/".format(len(archives), *socket.getsockname()[:2]))
+    async with server:
+        await server.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream entries out of SABLS archives over HTTP on localhost")
+    parser.add_argument("archives", type=Path, help="an archive, or a directory of them")
+    parser.add_argument("--host", default="127.0.0.1", help="loopback address to listen on")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--jobs", type=int, default=None, help="processes indexing archives that aren't cached (default: every core)")
+    parser.add_argument("--no-cache", action="store_true", help="ignore and don't write the index cache")
+    args = parser.parse_args()
+    
+    if not args.archives.exists():
+        print("Nothing at {}".format(args.archives))
+        sys.exit(1)
+    try:
+        asyncio.run(serve(load_archives(args.archives, not args.no_cache, args.jobs), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    except ValueError as error:
+        print(error)
+        sys.exit(1)
@@ -0,0 +1,178 @@
+import re
+import sys
+import random
+import argparse
+from pathlib import Path
+import flac
+import formats
+
+# Synthetic SABLS archives for benchmarks and for checking changes against
+#   python synth.py bench.sabs --entries 2000 --min-size 64K --max-size 2M --spurious 0.05
+#
+# Same layout as the real thing: FLAC entries back to back, then a 128 byte path block per entry.
+#   Every entry is a valid stream as far as flac.py is concerned, STREAMINFO, an APPLICATION block
+#   of random bytes that makes up most of its size, optionally a VORBIS_COMMENT, then a few real
+#   verbatim frames with correct CRCs. So scanning, measuring, hashing and dumping all have the
+#   same amount of work to do as they would on game audio of that size, without encoding anything.
+#
+# spurious is the share of entries with a stray "fLaC" somewhere in their filler, the kind of thing
+#   measure_entries has to see through. mixed is the share of entries that are WAVs or Ogg streams
+#   (random bytes in a valid container) instead of FLAC. Archives are written as they're generated,
+#   so they can be far bigger than memory.
+
+path_blocksize = 128
+frame_samples = 1152
+frames_per_entry = 4
+sample_rate = 48000
+
+def parse_size(size: str) -> int:
+    # "64K", "1.5M", "10G" or plain bytes
+    match = re.fullmatch(r"\s*([\d.]+)\s*([kmgt]?)i?b?\s*", size, re.IGNORECASE)
+    if not match:
+        raise ValueError("not a size: {}".format(size))
+    return int(float(match.group(1)) * 1024 ** " kmgt".index(match.group(2).lower() or " "))
+
+def _coded_number(number: int) -> bytes:
+    # The UTF-8 style frame number in a frame header
+    if number < 0x80:
+        return bytes([number])
+    length = 2
+    while number >= 1 << (5 * length + 1):
+        length += 1
+    tail = []
+    for _ in range(length - 1):
+        tail.append(0x80 | (number & 0x3F))
+        number >>= 6
+    return bytes([((0xFF << (8 - length)) & 0xFF) | number] + tail[::-1])
+
+def make_frames(rnd: random.Random, count: int = frames_per_entry) -> bytes:
+    # count verbatim mono 16 bit frames of frame_samples samples each
+    frames = []
+    for number in range(count):
+        # blocksize from the 16 bit field, sample rate from STREAMINFO, mono, 16 bit
+        header = bytearray([0xFF, 0xF8, 0x70, 0x08]) + _coded_number(number) + (frame_samples - 1).to_bytes(2, "big")
+        header.append(flac.crc8(header))
+        frame = header + b"\x02" + rnd.randbytes(frame_samples * 2)  # verbatim subframe
+        frame += flac.crc16(frame).to_bytes(2, "big")
+        frames.append(bytes(frame))
+    return b"".join(frames)
+
+def make_entry(rnd: random.Random, size: int, spurious: bool = False, comments: list[str] = ()) -> bytes:
+    # One FLAC stream of roughly size bytes (never less than its frames and headers)
+    frames = make_frames(rnd)
+    total_samples = frames_per_entry * frame_samples
+    packed = (sample_rate << 44) | (0 << 41) | (15 << 36) | total_samples  # mono, 16 bit
+    streaminfo = (
+        frame_samples.to_bytes(2, "big") * 2 + bytes(6)  # fixed blocksize, framesizes unknown
+        + packed.to_bytes(8, "big") + bytes(16)
+    )
+    blocks = [(flac.STREAMINFO, streaminfo)]
+    
+    filler = max(0, size - len(frames) - 4 - 38 - 8)
+    application = b"SYNT" + rnd.randbytes(filler).replace(flac.magic, b"fLaK")
+    if spurious and filler > 8:
+        position = rnd.randrange(4, len(application) - 4)
+        application = application[:position] + flac.magic + application[position + 4:]
+    blocks.append((2, application))
+    
+    if comments:
+        encoded = [comment.encode("utf-8") for comment in comments]
+        vendor = b"synth.py"
+        body = len(vendor).to_bytes(4, "little") + vendor + len(encoded).to_bytes(4, "little")
+        body += b"".join(len(comment).to_bytes(4, "little") + comment for comment in encoded)
+        blocks.append((flac.VORBIS_COMMENT, body))
+    
+    out = [flac.magic]
+    for i, (block_type, body) in enumerate(blocks):
+        last = 0x80 if i == len(blocks) - 1 else 0
+        out.append(bytes([last | block_type]) + len(body).to_bytes(3, "big") + body)
+    out.append(frames)
+    return b"".join(out)
+
+def make_wav(rnd: random.Random, size: int) -> bytes:
+    # RIFF WAVE of 16 bit mono PCM, roughly size bytes
+    data = rnd.randbytes(max(2, size - 44) & ~1)
+    fmt = (1).to_bytes(2, "little") + (1).to_bytes(2, "little") + sample_rate.to_bytes(4, "little")
+    fmt += (sample_rate * 2).to_bytes(4, "little") + (2).to_bytes(2, "little") + (16).to_bytes(2, "little")
+    body = b"WAVE" + b"fmt " + len(fmt).to_bytes(4, "little") + fmt + b"data" + len(data).to_bytes(4, "little") + data
+    return b"RIFF" + len(body).to_bytes(4, "little") + body
+
+def _ogg_page(header_type: int, granule: int, serial: int, sequence: int, packet: bytes) -> bytes:
+    # One page holding packet whole (up to 255 * 255 - 1 bytes)
+    lacing = [255] * (len(packet) // 255) + [len(packet) % 255]
+    page = bytearray(b"OggS" + bytes([0, header_type]) + granule.to_bytes(8, "little") + serial.to_bytes(4, "little"))
+    page += sequence.to_bytes(4, "little") + bytes(4) + bytes([len(lacing)]) + bytes(lacing) + packet
+    page[22:26] = formats.ogg_crc(page).to_bytes(4, "little")
+    return bytes(page)
+
+def make_ogg(rnd: random.Random, size: int) -> bytes:
+    # An Ogg stream of random packets, roughly size bytes, a page per packet
+    serial = rnd.getrandbits(32)
+    pages = [_ogg_page(0x02, 0, serial, 0, b"\x01synth.py" + bytes(20))]
+    remaining = max(1, size - len(pages[0]))
+    granule = 0
+    while remaining > 0:
+        packet = rnd.randbytes(min(remaining, 16 * 1024)).replace(b"OggS", b"OggZ")
+        remaining -= len(packet) + 27 + len(packet) // 255 + 1
+        granule += frame_samples
+        pages.append(_ogg_page(0x04 if remaining <= 0 else 0, granule, serial, len(pages), packet))
+    return b"".join(pages)
+
+def entry_path(rnd: random.Random, index: int, directories: int, unnamed: float) -> bytes:
+    # A path block that looks like the game's, some entries left without a name
+    #   No extension, the game's don't have one either, extraction adds the one for the entry's kind
+    if rnd.random() < unnamed:
+        return bytes(path_blocksize)
+    path = "sound\\{}\\bank_{:02d}\\snd_{:06d}".format(
+        ("vox", "weapons", "ambience", "music", "foley")[index % 5], rnd.randrange(directories), index
+    )
+    return path.encode("utf-8")[:path_blocksize].ljust(path_blocksize, b"\0")
+
+def write_archive(
+        path: Path, entries: int, min_size: int = 64 * 1024, max_size: int = 1024 * 1024, seed: int = 0,
+        spurious: float = 0.0, unnamed: float = 0.0, directories: int = 64, comments: float = 0.5,
+        mixed: float = 0.0) -> list[tuple[int, int]]:
+    # Writes the archive, returns the (offset, length) of every entry so results can be checked
+    rnd = random.Random(seed)
+    layout = []
+    paths = []
+    offset = 0
+    with open(path, "wb") as archive_file:
+        for index in range(entries):
+            tags = ["TITLE=snd_{:06d}".format(index), "ENCODER=synth.py"] if rnd.random() < comments else ()
+            size = rnd.randint(min_size, max_size)
+            if rnd.random() < mixed:
+                entry = (make_wav, make_ogg)[index % 2](rnd, size)
+            else:
+                entry = make_entry(rnd, size, rnd.random() < spurious, tags)
+            archive_file.write(entry)
+            layout.append((offset, len(entry)))
+            offset += len(entry)
+            paths.append(entry_path(rnd, index, directories, unnamed))
+        archive_file.write(b"".join(paths))
+    return layout
+
+def entries_for_size(size: int, min_size: int, max_size: int) -> int:
+    # How many entries make an archive of about size bytes
+    return max(1, size // ((min_size + max_size) // 2 + path_blocksize))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic SABLS archive")
+    parser.add_argument("archive", type=Path)
+    count = parser.add_mutually_exclusive_group(required=True)
+    count.add_argument("--entries", type=int)
+    count.add_argument("--size", type=parse_size, help="rough archive size instead of an entry count, like 512M or 20G")
+    parser.add_argument("--min-size", type=parse_size, default="64K")
+    parser.add_argument("--max-size", type=parse_size, default="1M")
+    parser.add_argument("--spurious", type=float, default=0.0, help="share of entries with a stray fLaC inside")
+    parser.add_argument("--unnamed", type=float, default=0.0, help="share of entries without a path")
+    parser.add_argument("--mixed", type=float, default=0.0, help="share of entries that are WAV or Ogg instead of FLAC")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    
+    if args.min_size > args.max_size:
+        print("--min-size is bigger than --max-size")
+        sys.exit(1)
+    entries = args.entries or entries_for_size(args.size, args.min_size, args.max_size)
+    layout = write_archive(args.archive, entries, args.min_size, args.max_size, args.seed, args.spurious, args.unnamed, mixed=args.mixed)
+    print("{} entries, {:0.1f} MiB".format(len(layout), args.archive.stat().st_size / 2**20))
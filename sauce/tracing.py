@@ -0,0 +1,156 @@
+import os
+import sys
+import json
+import atexit
+import threading
+from time import perf_counter_ns
+
+try:
+    import resource
+except ImportError:  # windows, spans just don't get a peak RSS
+    resource = None
+
+# Timing and counters for the hot paths
+#   with tracing.span("index.scan", bytes=size) as span:
+#       ...
+#       span.entries = len(found)
+#   tracing.count("prefetch.hit")
+#
+# Off unless SABLS_TRACE is set or enable() gets called. While it's off span() hands back one shared
+#   object that does nothing, so an instrumented stage costs a global lookup and an empty with block.
+#   When it's on every span is a tuple on a list, plus the process' peak RSS at the time it ended.
+#
+# SABLS_TRACE=trace.json python ui.py writes a Chrome trace-event file at exit (chrome://tracing or
+#   ui.perfetto.dev open it) and prints the per stage summary to stderr.
+
+enabled = False
+events = []    # (name, start ns, duration ns, thread id, bytes, entries, peak rss)
+counters = {}  # name -> total
+counter_events = []  # (name, ns, total), so counters show up on the timeline too
+threads = {}   # thread id -> name
+lock = threading.Lock()
+origin = perf_counter_ns()
+
+def enable():
+    global enabled
+    enabled = True
+
+def disable():
+    global enabled
+    enabled = False
+
+def clear():
+    global origin
+    with lock:
+        events.clear()
+        counters.clear()
+        counter_events.clear()
+        threads.clear()
+        origin = perf_counter_ns()
+
+def peak_rss() -> int | None:
+    # Peak resident set of the process so far, in bytes
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+class Span:
+    __slots__ = ("name", "bytes", "entries", "start")
+    
+    def __init__(self, name: str, bytes: int, entries: int):
+        self.name = name
+        self.bytes = bytes
+        self.entries = entries
+    
+    def __enter__(self) -> 'Span':
+        self.start = perf_counter_ns()
+        return self
+    
+    def __exit__(self, *exc):
+        end = perf_counter_ns()
+        thread = threading.current_thread()
+        threads[thread.ident] = thread.name
+        events.append((self.name, self.start, end - self.start, thread.ident, self.bytes, self.entries, peak_rss()))
+
+class _NullSpan:
+    # What span() gives out while tracing is off, anything set on it is dropped
+    __slots__ = ()
+    
+    def __enter__(self) -> '_NullSpan':
+        return self
+    
+    def __exit__(self, *exc):
+        pass
+    
+    def __setattr__(self, name, value):
+        pass
+
+_null_span = _NullSpan()
+
+def span(name: str, bytes: int = 0, entries: int = 0) -> Span | _NullSpan:
+    # Times the with block under name, bytes and entries are what it got through (for the rates)
+    if not enabled:
+        return _null_span
+    return Span(name, bytes, entries)
+
+def count(name: str, value: int = 1):
+    if not enabled:
+        return
+    with lock:
+        total = counters[name] = counters.get(name, 0) + value
+        counter_events.append((name, perf_counter_ns(), total))
+
+def chrome_trace() -> dict:
+    # Everything recorded, as trace-event JSON
+    pid = os.getpid()
+    trace_events = [
+        {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+        for tid, name in list(threads.items())
+    ]
+    for name, start, duration, tid, size, entries, peak in list(events):
+        args = {"bytes": size, "entries": entries}
+        if peak is not None:
+            args["peak_rss_mib"] = round(peak / 2**20, 1)
+        trace_events.append({
+            "name": name, "cat": name.partition(".")[0], "ph": "X", "pid": pid, "tid": tid,
+            "ts": (start - origin) / 1000, "dur": duration / 1000, "args": args,
+        })
+    for name, at, total in list(counter_events):
+        trace_events.append({"name": name, "ph": "C", "pid": pid, "ts": (at - origin) / 1000, "args": {name: total}})
+    return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+def write_chrome_trace(path: os.PathLike):
+    with open(path, "w") as trace_file:
+        json.dump(chrome_trace(), trace_file)
+
+def stages() -> list[tuple[str, int, float, int, int, int | None]]:
+    # (name, calls, seconds, bytes, entries, peak rss) per span name, in the order they first showed up
+    totals = {}
+    for name, _, duration, _, size, entries, peak in list(events):
+        calls, seconds, total_bytes, total_entries, highest = totals.get(name, (0, 0.0, 0, 0, None))
+        if peak is not None:
+            highest = max(highest or 0, peak)
+        totals[name] = (calls + 1, seconds + duration / 1e9, total_bytes + size, total_entries + entries, highest)
+    return [(name, *values) for name, values in totals.items()]
+
+def summary() -> str:
+    lines = ["{:<24}{:>7}{:>11}{:>12}{:>14}{:>11}".format("stage", "calls", "seconds", "MiB/s", "entries/s", "peak MiB")]
+    for name, calls, seconds, size, entries, peak in stages():
+        lines.append("{:<24}{:>7}{:>11.3f}{:>12}{:>14}{:>11}".format(
+            name, calls, seconds,
+            "{:0.1f}".format(size / 2**20 / seconds) if size and seconds else "-",
+            "{:0.0f}".format(entries / seconds) if entries and seconds else "-",
+            "{:0.1f}".format(peak / 2**20) if peak else "-",
+        ))
+    for name, total in sorted(counters.items()):
+        lines.append("{:<24}{:>7}".format(name, total))
+    return "\n".join(lines)
+
+def _write_at_exit(path: str):
+    write_chrome_trace(path)
+    print(summary(), file=sys.stderr)
+
+if os.environ.get("SABLS_TRACE"):
+    enable()
+    atexit.register(_write_at_exit, os.environ["SABLS_TRACE"])
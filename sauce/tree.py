@@ -0,0 +1,178 @@
+import sys
+from array import array
+from index import ArchiveIndex
+import tracing
+
+# Directory tree of an index, every file and directory a node in one arena
+#   Files are nodes 0 to len(flacs) - 1, the node of a file being the entry it stands for, and the
+#   directories come after them numbered as they turn up walking the index in archive order, the root
+#   first, so a directory always comes before anything below it. Everything about a node is a slot in
+#   a flat array:
+#     parents           i32 per node, -1 for the root
+#     counts, sizes     u64 per node, entries and bytes underneath (1 and its length for a file)
+#     child_starts/ends u32 per directory, directory d's children are children[child_starts[d] : child_ends[d]]
+#                       where d is its node minus root, in archive order
+#   Directory names are interned strings, file names only get decoded when somebody asks for one.
+#
+# Directories are looked up by the raw bytes of their whole path, so an entry costs one dict lookup no
+#   matter how deep it sits.
+
+unnamed = "No Name"  # directory for entries without a path
+
+def unnamed_file(index: int) -> str:
+    # Name of an entry without a path, in the unnamed directory, by its index
+    return "File {:04d}".format(index)
+
+class PathTree:
+    def __init__(self, flacs: ArchiveIndex):
+        with tracing.span("tree.build", entries=len(flacs)):
+            self.__build(flacs)
+    
+    def __build(self, flacs: ArchiveIndex):
+        self.flacs = flacs
+        self.root = count = len(flacs)
+        self.directory_names = [""]
+        directory_parents = [-1]
+        self.__child_lists = [[]]
+        self.__by_path = {b"": self.root}
+        
+        file_parents = []
+        child_lists = self.__child_lists
+        by_path = self.__by_path
+        paths = flacs.paths
+        start = 0
+        last_directory, parent = None, None
+        file_bytes = [0]  # per directory, of the files right inside it
+        for index, (end, length) in enumerate(zip(flacs.path_ends, flacs.lengths)):
+            if end == start:
+                directory = None
+            else:
+                separator = paths.rfind(b"\\", start, end)
+                directory = paths[start:separator] if separator >= 0 else b""
+            start = end
+            if directory != last_directory or parent is None:  # neighbours mostly share a directory, that skips hashing it
+                parent = by_path.get(directory)
+                if parent is None:
+                    parent = self.__directory(directory, directory_parents, file_bytes)
+                last_directory = directory
+            file_parents.append(parent)
+            child_lists[parent - count].append(index)
+            file_bytes[parent - count] += length
+        
+        directories = len(self.directory_names)
+        self.parents = array("i", file_parents + directory_parents)
+        self.counts = array("Q", [1]) * count + array("Q", [0]) * directories
+        self.sizes = array("Q", flacs.lengths) + array("Q", [0]) * directories
+        self.children = array("I")
+        self.child_starts = array("I", [0]) * directories
+        self.child_ends = array("I", [0]) * directories
+        for directory, child_list in enumerate(child_lists):
+            self.child_starts[directory] = len(self.children)
+            self.children.extend(child_list)
+            self.child_ends[directory] = len(self.children)
+        
+        # directories add themselves to their parents, the deepest ones (made last) first so theirs are done already
+        counts, sizes = self.counts, self.sizes
+        subdirectories = [0] * directories
+        for directory in range(directories - 1, 0, -1):
+            subdirectories[directory_parents[directory] - count] += 1
+        for directory in range(directories - 1, -1, -1):
+            node = count + directory
+            counts[node] += len(child_lists[directory]) - subdirectories[directory]
+            sizes[node] += file_bytes[directory]
+            parent = directory_parents[directory]
+            if parent >= 0:
+                counts[parent] += counts[node]
+                sizes[parent] += sizes[node]
+        del self.__child_lists
+    
+    def __directory(self, path: bytes | None, directory_parents: list, file_bytes: list) -> int:
+        # Makes the directory at path and any of its parents that don't exist yet, None is the unnamed one
+        if path is None:
+            parent, name = self.root, unnamed
+        else:
+            parent_path, _, name = path.rpartition(b"\\")
+            parent = self.__by_path.get(parent_path)
+            if parent is None:
+                parent = self.__directory(parent_path, directory_parents, file_bytes)
+            name = sys.intern(name.decode("utf-8", errors="replace"))
+        node = self.root + len(self.directory_names)
+        self.__child_lists[parent - self.root].append(node)
+        self.__child_lists.append([])
+        file_bytes.append(0)
+        self.directory_names.append(name)
+        directory_parents.append(parent)
+        self.__by_path[path] = node
+        return node
+    
+    def __len__(self) -> int:
+        return len(self.parents)
+    
+    def is_directory(self, node: int) -> bool:
+        return node >= self.root
+    
+    def entry(self, node: int) -> int:
+        # The entry a file stands for, -1 for directories
+        return node if node < self.root else -1
+    
+    def name(self, node: int) -> str:
+        if node >= self.root:
+            return self.directory_names[node - self.root]
+        raw = self.flacs.raw_path(node)
+        if not raw:
+            return unnamed_file(node)
+        return raw.rpartition(b"\\")[2].decode("utf-8", errors="replace")
+    
+    def child_count(self, node: int) -> int:
+        if node < self.root:
+            return 0
+        return self.child_ends[node - self.root] - self.child_starts[node - self.root]
+    
+    def children_of(self, node: int) -> array:
+        if node < self.root:
+            return array("I")
+        return self.children[self.child_starts[node - self.root] : self.child_ends[node - self.root]]
+    
+    def path(self, node: int) -> str:
+        # \ separated, like ArchiveIndex.path
+        levels = []
+        while node != self.root:
+            levels.append(self.name(node))
+            node = self.parents[node]
+        return "\\".join(reversed(levels))
+    
+    def find(self, path: str) -> int | None:
+        # Directory at path (either separator), None if there isn't one
+        return self.__by_path.get(path.replace("/", "\\").encode("utf-8").rstrip(b"\\"))
+    
+    def entries_under(self, node: int) -> list[int]:
+        # Every entry in or below node, in archive order
+        if node < self.root:
+            return [node]
+        found = []
+        stack = [node]
+        while stack:
+            for child in self.children_of(stack.pop()):
+                if child < self.root:
+                    found.append(child)
+                else:
+                    stack.append(child)
+        found.sort()
+        return found
+    
+    def walk(self, node: int = None, max_depth: int = None):
+        # (node, depth) of everything below node (the root by default), depth first in archive order
+        node = self.root if node is None else node
+        stack = [(child, 1) for child in reversed(self.children_of(node))]
+        while stack:
+            node, depth = stack.pop()
+            yield node, depth
+            if node >= self.root and (max_depth is None or depth < max_depth):
+                stack.extend((child, depth + 1) for child in reversed(self.children_of(node)))
+    
+    def to_dict(self, node: int = None) -> dict:
+        # Nested {name: {...}} like array_path_tree used to build, files are empty dicts
+        tree = {}
+        for child in self.children_of(self.root if node is None else node):
+            tree[self.name(child)] = self.to_dict(child) if child >= self.root else {}
+        return tree
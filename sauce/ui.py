@@ -1,18 +1,31 @@
 import sys
 import math
-from time import sleep
-from explorer import SablsUnarchiver
+import queue
+import threading
+from collections import Counter
+from array import array
+from itertools import compress
+from time import perf_counter
+from explorer import SablsUnarchiver, Cancelled
+from index import ArchiveIndex
+from search import PathSearch
+from prefetch import EntryCache
+from tree import PathTree, unnamed, unnamed_file
+from metadata import read_metadata
+import cache
+import tracing
+import waveform
 from pathlib import Path
 from PySide6.QtWidgets import (
-    QMainWindow, QApplication, QStyleFactory, QGridLayout, QTreeWidget, 
-    QTreeWidgetItem, QStyle, QSlider, QLabel, QMenuBar, QWidget, QMenu, 
+    QMainWindow, QApplication, QStyleFactory, QGridLayout, QTreeView, 
+    QStyle, QSlider, QLabel, QMenuBar, QWidget, QMenu, 
     QVBoxLayout, QFileDialog, QProgressBar, QHBoxLayout, QPushButton, 
-    QSizePolicy, QWidgetAction, QCheckBox, QTableWidget, QTableWidgetItem,
-    QStackedWidget, QTabWidget, QHeaderView
+    QSizePolicy, QWidgetAction, QTableWidget, QTableWidgetItem,
+    QStackedWidget, QTabWidget, QHeaderView, QLineEdit, QListWidget, QListWidgetItem
 )
-from PySide6.QtGui import QAction, QGuiApplication, QColor, QShortcut
-from PySide6.QtCore import Qt, Signal, QObject, QBuffer, QIODevice, QUrl
-from PySide6.QtMultimedia import QMediaPlayer, QAudioOutput
+from PySide6.QtGui import QAction, QGuiApplication, QColor, QShortcut, QPainter
+from PySide6.QtCore import Qt, Signal, QObject, QThread, QIODevice, QUrl, QAbstractItemModel, QModelIndex, QLineF, Slot, QTimer
+from PySide6.QtMultimedia import QMediaPlayer, QAudioOutput, QAudioDecoder, QAudioFormat
 
 
 class MainWindow(QMainWindow):
@@ -22,7 +35,10 @@ class MainWindow(QMainWindow):
         archive_index_progress = Signal(float)
         change_view_mode = Signal()
         select_file = Signal(int)
-        load_file = Signal(bytes)
+        load_file = Signal(object)  # memoryview into the mapped archive
+        prefetch_files = Signal(list)  # archive indices likely to get played next
+        show_waveform = Signal(object, object)  # (archive path, offset, length), memoryview of the entry
+        show_info = Signal(list)  # (name, value) rows about the loaded entry
     
     def __init__(self):
         super().__init__()
@@ -31,11 +47,37 @@ class MainWindow(QMainWindow):
         
         self.archive_file = None
         self.archive_indices = None
+        self.archive_search = None  # PathSearch over archive_indices, built with it by the loader
+        self.archive_metadata = None  # ArchiveMetadata, shows up a little after the index
         self.unarchive_dir = None
         self.progress_bar = QProgressBar()
         self.progress_bar.setRange(0, 100)
         self.progress_bar.hide()
         self.statusBar().addPermanentWidget(self.progress_bar)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.hide()
+        self.cancel_button.clicked.connect(self.__cancel_load)
+        self.statusBar().addPermanentWidget(self.cancel_button)
+        self.loader = None  # ArchiveLoader while an archive is being opened
+        self.entry_cache = EntryCache()
+        self.retired_archives = []  # swapped out for a newer one, closed once nothing reads from them
+        self.retire_timer = QTimer(self)
+        self.retire_timer.setInterval(1000)
+        self.retire_timer.timeout.connect(self.__close_retired)
+        
+        self.unarchive_status = QLabel()
+        self.unarchive_bar = QProgressBar()
+        self.unarchive_bar.setRange(0, 100)
+        self.unarchive_bar.setMaximumWidth(200)
+        self.unarchive_cancel = QPushButton("Cancel Unarchive")
+        for widget in (self.unarchive_status, self.unarchive_bar, self.unarchive_cancel):
+            widget.hide()
+            self.statusBar().addPermanentWidget(widget)
+        self.unarchive_queue = self.UnarchiveQueue(self)
+        self.unarchive_queue.signals.progress.connect(self.__unarchive_progress)
+        self.unarchive_queue.signals.done.connect(self.__unarchive_done)
+        self.unarchive_cancel.clicked.connect(self.unarchive_queue.cancel)
+        self.unarchive_queue.start()
         
         # Set window to a reasonable size
         self.resize(QGuiApplication.primaryScreen().availableGeometry().size() * 3/5)
@@ -58,6 +100,7 @@ class MainWindow(QMainWindow):
         self.signals.select_unarchive_signal.connect(self.__unarchive_dialogue)
         self.signals.archive_index_progress.connect(self.__indexing_status)
         self.signals.select_file.connect(self.__load_file)
+        self.signals.prefetch_files.connect(self.entry_cache.prefetch)
         
         # Finish creating UI
         self.statusBar().showMessage("UI loaded", 1500)
@@ -109,31 +152,20 @@ class MainWindow(QMainWindow):
                     if self.main_window.archive_indices:
                         self.main_window.signals.select_unarchive_signal.emit()
                         if self.main_window.unarchive_dir:
-                            SablsUnarchiver.dump_archive(self.main_window.unarchive_dir, self.main_window.archive_file, self.main_window.archive_indices)
+                            self.main_window.unarchive(range(len(self.main_window.archive_indices)))
                     else:
                         print("Nothing to save")
                 
                 def __dump_selected_handle(self):
                     if self.main_window.archive_indices:
-                        def recurse(item: QTreeWidgetItem):
-                            if not item.childCount():
-                                check: MainWindow.CentralWidget.TreeView.CheckBox = self.main_window.centralWidget().tree_view.tree.itemWidget(item, 1)
-                                if check.check_box.checkState() == Qt.CheckState.Checked:
-                                    archive_label: MainWindow.CentralWidget.TreeView.ArchiveLabel = self.main_window.centralWidget().tree_view.tree.itemWidget(item, 0)
-                                    self.main_window.statusBar().showMessage(f"Writing {archive_label.text}", 750)
-                                    SablsUnarchiver.dump_file(
-                                        self.main_window.unarchive_dir, 
-                                        self.main_window.archive_file,
-                                        self.main_window.archive_indices, 
-                                        archive_label.index
-                                    )
-                            else:
-                                for i in range(item.childCount()):
-                                    recurse(item.child(i))
+                        indices = self.main_window.centralWidget().tree_view.tree_model.selected_entries()
+                        if not indices:
+                            print("Nothing selected")
+                            return
                         
                         self.main_window.signals.select_unarchive_signal.emit()
                         if self.main_window.unarchive_dir:
-                            recurse(self.main_window.centralWidget().tree_view.tree.invisibleRootItem())
+                            self.main_window.unarchive(indices)
                     else:
                         print("Nothing to save")
         
@@ -156,6 +188,8 @@ class MainWindow(QMainWindow):
             self.tree_view = self.TreeView(self)
             self.music_content = self.MusicWidget(self)
             self.main_window.signals.load_file.connect(self.music_content.signals.load_file.emit)
+            self.main_window.signals.show_waveform.connect(self.music_content.art.show_entry)
+            self.main_window.signals.show_info.connect(self.music_content.info.set_file_info)
             
             root_layout.addWidget(self.tree_view, 5)
             root_layout.addWidget(self.music_content, 2)
@@ -169,85 +203,321 @@ class MainWindow(QMainWindow):
                 
                 layout = QGridLayout()
                 
-                self.tree = QTreeWidget()
-                self.tree.setColumnCount(2)
-                self.tree.setHeaderLabels(["Directory", "To Save"])
-                self.tree.header().swapSections(1,0)
-                self.tree.header().resizeSection(1, 60)
+                self.search_bar = QLineEdit()
+                self.search_bar.setPlaceholderText("Search paths (vox\\*, *explosion*, or any part of a path)")
+                self.search_bar.setClearButtonEnabled(True)
+                self.search_results = QListWidget()
+                
+                self.tree_model = self.Model(self)
+                self.tree = QTreeView()
+                self.tree.setModel(self.tree_model)
+                self.tree.setUniformRowHeights(True)  # saves the view measuring every row it scrolls past
+                self.tree.header().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+                self.tree.header().setStretchLastSection(False)
+                self.tree.header().resizeSection(1, 80)
+                self.tree.header().resizeSection(2, 170)
+                self.tree.header().setSortIndicator(-1, Qt.SortOrder.AscendingOrder)  # archive order until a header gets clicked
+                self.tree.setSortingEnabled(True)
                 
                 
                 self.central_widget.signals.set_data.connect(self.set_tree)
-                self.tree.itemDoubleClicked.connect(self.selected)
+                self.tree.doubleClicked.connect(self.selected)
+                self.tree.selectionModel().currentChanged.connect(self.__prefetch)
                 QShortcut(
                     Qt.Key.Key_Return, 
                     self.tree, 
                     context=Qt.ShortcutContext.WidgetShortcut,
-                    activated=lambda: self.selected(self.tree.selectedItems()[0]) if self.tree.selectedItems() else None
+                    activated=lambda: self.selected(self.tree.currentIndex())
                 )
                 
-                layout.addWidget(self.tree)
+                self.search_bar.returnPressed.connect(self.__search)
+                self.search_bar.textChanged.connect(lambda text: self.views.setCurrentIndex(0) if not text else None)
+                self.search_results.itemActivated.connect(lambda item: self.main_window.signals.select_file.emit(item.data(Qt.ItemDataRole.UserRole)))
+                
+                self.views = QStackedWidget()
+                self.views.addWidget(self.tree)
+                self.views.addWidget(self.search_results)
+                
+                layout.addWidget(self.search_bar)
+                layout.addWidget(self.views)
                 layout.setContentsMargins(0,0,0,0)
                 self.setLayout(layout)
             
-            def selected(self, item:QTreeWidgetItem):
-                label = self.tree.itemWidget(item, 0)
-                if isinstance(label, self.ArchiveLabel):
-                    self.main_window.signals.select_file.emit(label.index)
+            search_limit = 5000  # more results than anyone is going to scroll through
             
-            class CheckBox(QWidget):
-                # A centered checkbox
-                def __init__(self):
-                    super().__init__()
-                    layout = QHBoxLayout()
-                    layout.setContentsMargins(0,0,0,0)
-                    
-                    self.check_box = QCheckBox()
-                    
-                    layout.addStretch()
-                    layout.addWidget(self.check_box)
-                    layout.addStretch()
-                    self.setLayout(layout)
+            def __search(self):
+                query = self.search_bar.text().strip()
+                archive_indices = self.main_window.archive_indices
+                if not query or not archive_indices:
+                    self.views.setCurrentIndex(0)
+                    return
+                
+                self.search_results.clear()
+                results = self.main_window.archive_search.search(query, self.search_limit)
+                for _, index in results:
+                    item = QListWidgetItem(archive_indices.path(index) or "{}\\{}".format(unnamed, unnamed_file(index)))
+                    item.setData(Qt.ItemDataRole.UserRole, index)
+                    self.search_results.addItem(item)
+                self.views.setCurrentIndex(1)
+                self.main_window.statusBar().showMessage(F"{len(results)} matches", 1500)
             
-            class ArchiveLabel(QLabel):
-                # Fundamentally a QLabel but contains the associated MainWindow.archive_indices' index
-                def __init__(self, label:str, index:int):
-                    super().__init__(label)
-                    self.index = index
+            def selected(self, index: QModelIndex):
+                entry = index.siblingAtColumn(0).data(Qt.ItemDataRole.UserRole) if index.isValid() else None
+                if entry is not None and entry >= 0:
+                    self.main_window.signals.select_file.emit(entry)
             
             def set_tree(self):
-                # helper functions, idk if this practice is exactly kosher
-                def tree_recursion(input:dict, parent:QTreeWidgetItem):  # Populate tree widget from paths
-                    for key in input.keys():
-                        level = QTreeWidgetItem(parent)
-                        if isinstance(input[key], dict):  # populate level
-                            level.setText(0, key)
-                            tree_recursion(input[key], level)
-                        else:  # end of path
-                            self.tree.setItemWidget(level, 0, self.ArchiveLabel(key, input[key]))
-                            self.tree.setItemWidget(level, 1, self.CheckBox())
-                
-                def path_recursion(input:list, layer:dict):  # Consolidate many path strings into a single object
-                    if input[1:]:  # setup additional levels
-                        if input[0] not in layer.keys():
-                            layer.update({input[0]: {}})
-                        path_recursion(input[1:], layer[input[0]])
-                    else:  # end of path
-                        layer.update({input[0]: i})
-                
-                self.tree.clear()
-                paths = {}
-                unnamed = "No Name"  # prefix for unnamed records
-                for i, indexed in enumerate(self.central_widget.main_window.archive_indices):
-                    path: str = indexed[1].strip(b'\0').decode('ascii')
-                    if path == "":
-                        path = unnamed + "\\" + F"File {i:04d}"
-                    path_recursion(path.split("\\"), paths)
-                
-                tree_recursion(paths, self.tree.invisibleRootItem())
+                self.search_bar.clear()
+                self.tree_model.set_index(self.main_window.archive_indices)
+            
+            prefetch_rows = (0, 1, -1, 2, -2)  # the current row and its neighbours, the next one down first
+            
+            def __prefetch(self, current: QModelIndex, previous: QModelIndex = None):
+                # Moving through the tree warms up whatever might get played next
+                current = current.siblingAtColumn(0)
+                entries = []
+                for offset in self.prefetch_rows:
+                    sibling = current.siblingAtRow(current.row() + offset) if current.isValid() else QModelIndex()
+                    entry = sibling.data(Qt.ItemDataRole.UserRole) if sibling.isValid() else None
+                    if entry is not None and entry >= 0:
+                        entries.append(entry)
+                if entries:
+                    self.main_window.signals.prefetch_files.emit(entries)
+            
+            class Model(QAbstractItemModel):
+                # Lazy view over a PathTree of MainWindow.archive_indices
+                #   The tree itself is built in one go, but a directory's children are only put in display
+                #   order the first time it's expanded, and the view is handed them fetch_batch rows at a time
+                #   as it scrolls. Rows are PathTree nodes, the node is the index's internalId. Checking is
+                #   one byte per entry in selection, nodes just count how many of theirs are set.
+                #   Sorting only reorders directories that have been expanded, the rest get sorted as they are.
+                fetch_batch = 1000
+                columns = ["Directory", "Duration", "Format"]
+                
+                def __init__(self, parent: QObject = None):
+                    super().__init__(parent)
+                    self.sort_column = -1  # archive order
+                    self.sort_order = Qt.SortOrder.AscendingOrder
+                    self.__reset(None)
+                
+                def set_index(self, archive_indices):
+                    with tracing.span("ui.tree.reset", entries=len(archive_indices) if archive_indices else 0):
+                        self.beginResetModel()
+                        self.__reset(archive_indices)
+                        self.endResetModel()
+                
+                def set_metadata(self, archive_metadata):
+                    # Fills in the duration and format columns, and re-sorts if those are what's sorted by
+                    self.metadata = archive_metadata
+                    if self.sort_column > 0:
+                        self.sort(self.sort_column, self.sort_order)
+                    else:
+                        self.layoutAboutToBeChanged.emit()
+                        self.layoutChanged.emit()
+                
+                def __reset(self, archive_indices):
+                    self.archive_indices = archive_indices
+                    self.metadata = None
+                    self.tree = PathTree(archive_indices if archive_indices else ArchiveIndex([], [], [], b""))
+                    nodes = len(self.tree)
+                    self.selection = bytearray(len(self.tree.flacs))
+                    self.sorted = {}                                           # directory node -> its children in display order, once expanded
+                    self.rows = array("I", [0]) * nodes                        # row of a node under its parent, once that's expanded
+                    self.checked = array("Q", [0]) * nodes                     # checked entries underneath (or 0/1 for a file)
+                    self.fetched = array("I", [0]) * (nodes - self.tree.root)  # per directory, children the view has been told about so far
+                
+                def selected_entries(self) -> list[int]:
+                    return list(compress(range(len(self.selection)), self.selection))
+                
+                def node(self, index: QModelIndex) -> int:
+                    return index.internalId() if index.isValid() else self.tree.root
+                
+                def __populate(self, node: int):
+                    # Puts a directory's children in display order and works out how many of theirs are checked
+                    tree = self.tree
+                    with tracing.span("ui.tree.populate", entries=tree.child_count(node)):
+                        children = self.sorted[node] = self.__sorted(list(tree.children_of(node)))
+                    selection, checked, rows = self.selection, self.checked, self.rows
+                    everything = checked[node] == tree.counts[node]
+                    for row, child in enumerate(children):
+                        rows[child] = row
+                        if everything:
+                            checked[child] = tree.counts[child]
+                        elif not checked[node]:
+                            checked[child] = 0
+                        elif child < tree.root:
+                            checked[child] = selection[child]
+                        else:
+                            checked[child] = sum(selection[i] for i in tree.entries_under(child))
+                
+                def __sort_key(self, column: int):
+                    metadata, name = self.metadata, self.tree.name
+                    if column == 1 and metadata is not None:
+                        return lambda node: (metadata.duration(node) or 0.0, name(node).lower())
+                    if column == 2 and metadata is not None:
+                        return lambda node: (metadata.format(node), name(node).lower())
+                    return lambda node: name(node).lower()
+                
+                def __sorted(self, children: list) -> list:
+                    # Directories first then files, each sorted by the sort column, or left in archive order
+                    if self.sort_column < 0:
+                        return children
+                    descending = self.sort_order == Qt.SortOrder.DescendingOrder
+                    root = self.tree.root
+                    directories = sorted((child for child in children if child >= root), key=self.__sort_key(0), reverse=descending)
+                    files = sorted((child for child in children if child < root), key=self.__sort_key(self.sort_column), reverse=descending)
+                    return directories + files
+                
+                def sort(self, column: int, order: Qt.SortOrder = Qt.SortOrder.AscendingOrder):
+                    self.sort_column = column
+                    self.sort_order = order
+                    self.layoutAboutToBeChanged.emit()
+                    persistent = self.persistentIndexList()
+                    moved = [(index.internalId(), index.column()) for index in persistent]
+                    
+                    tree = self.tree
+                    for node in self.sorted:
+                        if column < 0:  # back to archive order, which is how the tree has them
+                            children = self.sorted[node] = list(tree.children_of(node))
+                        else:
+                            children = self.sorted[node] = self.__sorted(self.sorted[node])
+                        for row, child in enumerate(children):
+                            self.rows[child] = row
+                        self.fetched[node - tree.root] = len(children)  # anything could have moved to the top, it's all built anyway
+                    
+                    self.changePersistentIndexList(persistent, [self.createIndex(self.rows[node], column, node) for node, column in moved])
+                    self.layoutChanged.emit()
+                
+                def index(self, row: int, column: int, parent: QModelIndex = QModelIndex()) -> QModelIndex:
+                    if not self.hasIndex(row, column, parent):
+                        return QModelIndex()
+                    return self.createIndex(row, column, self.sorted[self.node(parent)][row])
+                
+                def parent(self, index: QModelIndex = None):
+                    if index is None:
+                        return super().parent()  # QObject.parent()
+                    if not index.isValid():
+                        return QModelIndex()
+                    parent = self.tree.parents[index.internalId()]
+                    if parent == self.tree.root:
+                        return QModelIndex()
+                    return self.createIndex(self.rows[parent], 0, parent)
+                
+                def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+                    if parent.column() > 0:
+                        return 0
+                    node = self.node(parent)
+                    return self.fetched[node - self.tree.root] if node >= self.tree.root else 0
+                
+                def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+                    return len(self.columns)
+                
+                def hasChildren(self, parent: QModelIndex = QModelIndex()) -> bool:
+                    # directories get their expand arrow before anything inside them is sorted
+                    return self.tree.child_count(self.node(parent)) > 0
+                
+                def canFetchMore(self, parent: QModelIndex) -> bool:
+                    node = self.node(parent)
+                    if not self.tree.child_count(node):
+                        return False
+                    return node not in self.sorted or self.fetched[node - self.tree.root] < len(self.sorted[node])
+                
+                def fetchMore(self, parent: QModelIndex):
+                    node = self.node(parent)
+                    if node not in self.sorted:
+                        self.__populate(node)
+                    fetched = self.fetched[node - self.tree.root]
+                    count = min(self.fetch_batch, len(self.sorted[node]) - fetched)
+                    if count > 0:
+                        with tracing.span("ui.tree.fetch", entries=count):
+                            self.beginInsertRows(parent, fetched, fetched + count - 1)
+                            self.fetched[node - self.tree.root] += count
+                            self.endInsertRows()
+                
+                def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.ItemDataRole.DisplayRole):
+                    if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+                        return self.columns[section]
+                    return None
+                
+                def flags(self, index: QModelIndex) -> Qt.ItemFlag:
+                    if not index.isValid():
+                        return Qt.ItemFlag.NoItemFlags
+                    if index.column() > 0:
+                        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+                    return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsUserCheckable
+                
+                def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+                    if not index.isValid():
+                        return None
+                    node = index.internalId()
+                    entry = self.tree.entry(node)
+                    if index.column() > 0:
+                        if role != Qt.ItemDataRole.DisplayRole or entry < 0 or self.metadata is None:
+                            return None
+                        if index.column() == 1:
+                            duration = self.metadata.duration(entry)
+                            return "{}:{:06.3f}".format(int(duration // 60), duration % 60) if duration is not None else ""
+                        return self.metadata.format(entry)
+                    if role == Qt.ItemDataRole.DisplayRole:
+                        return self.tree.name(node)
+                    if role == Qt.ItemDataRole.CheckStateRole:
+                        if self.checked[node] == 0:
+                            return Qt.CheckState.Unchecked
+                        if self.checked[node] == self.tree.counts[node]:
+                            return Qt.CheckState.Checked
+                        return Qt.CheckState.PartiallyChecked
+                    if role == Qt.ItemDataRole.ToolTipRole and entry >= 0:
+                        return self.tree.path(node)
+                    if role == Qt.ItemDataRole.UserRole:
+                        return entry
+                    return None
+                
+                def setData(self, index: QModelIndex, value, role: int = Qt.ItemDataRole.EditRole) -> bool:
+                    if not index.isValid() or role != Qt.ItemDataRole.CheckStateRole:
+                        return False
+                    self.set_checked(index.internalId(), Qt.CheckState(value) == Qt.CheckState.Checked)
+                    return True
+                
+                def set_checked(self, node: int, checked: bool):
+                    # Checks or unchecks a file or everything under a directory
+                    tree = self.tree
+                    value = 1 if checked else 0
+                    selection = self.selection
+                    for i in tree.entries_under(node):
+                        selection[i] = value
+                    delta = value * tree.counts[node] - self.checked[node]
+                    
+                    roles = [Qt.ItemDataRole.CheckStateRole]
+                    def fill(node: int):
+                        # only the children that have been expanded need their counts kept up
+                        self.checked[node] = value * tree.counts[node]
+                        children = self.sorted.get(node)
+                        if children:
+                            for child in children:
+                                fill(child)
+                            fetched = self.fetched[node - tree.root]
+                            if fetched:
+                                self.dataChanged.emit(
+                                    self.createIndex(0, 0, children[0]),
+                                    self.createIndex(fetched - 1, 0, children[fetched - 1]),
+                                    roles
+                                )
+                    fill(node)
+                    
+                    changed = self.createIndex(self.rows[node], 0, node)
+                    self.dataChanged.emit(changed, changed, roles)
+                    parent = tree.parents[node]
+                    while parent >= 0:
+                        self.checked[parent] += delta
+                        if parent != tree.root:
+                            changed = self.createIndex(self.rows[parent], 0, parent)
+                            self.dataChanged.emit(changed, changed, roles)
+                        parent = tree.parents[parent]
+            
         
         class MusicWidget(QWidget):
             class Signals(QObject):
-                load_file = Signal(bytes)
+                load_file = Signal(object)
                 unload = Signal()
             
             def __init__(self, parent: 'MainWindow.CentralWidget'):
@@ -258,7 +528,7 @@ class MainWindow(QMainWindow):
                 self.media_player = QMediaPlayer()
                 self.audio_output = QAudioOutput()
                 self.media_player.setAudioOutput(self.audio_output)
-                self.buffer = QBuffer()
+                self.device = None  # EntryDevice of whatever is loaded
                 
                 layout = QVBoxLayout()
                 
@@ -279,17 +549,149 @@ class MainWindow(QMainWindow):
                 self.media_player.errorChanged.connect(lambda error: print("Media Player Error: {}".format(error)))            
             
             class Art(QWidget):
+                # Waveform of the loaded entry
+                #   Decoding happens on the art's own thread, the peaks come back through a signal and get
+                #   cached on disk so the next time that entry is loaded it draws straight away
+                class Signals(QObject):
+                    decode = Signal(object, object)  # key, memoryview of the entry
+                
                 def __init__(self, parent: 'MainWindow.CentralWidget.MusicWidget'):
                     super().__init__()
+                    self.signals = self.Signals()
+                    self.key = None    # (archive path, offset, length) of what's being shown
+                    self.peaks = None
+                    
                     layout = QGridLayout()
                     
-                    root_widget = QLabel("Music Visuals")
-                    root_widget.setAlignment(Qt.AlignmentFlag.AlignCenter)
-                    root_widget.setStyleSheet("background: orange")
+                    self.label = QLabel("Music Visuals")
+                    self.label.setAlignment(Qt.AlignmentFlag.AlignCenter)
                     
-                    layout.addWidget(root_widget)
+                    layout.addWidget(self.label)
                     layout.setContentsMargins(0,0,0,0)
                     self.setLayout(layout)
+                    
+                    self.worker_thread = QThread()
+                    self.worker = self.Decoder()
+                    self.worker.moveToThread(self.worker_thread)
+                    self.signals.decode.connect(self.worker.decode)
+                    self.worker.signals.ready.connect(self.__ready)
+                    self.worker_thread.start()
+                
+                def close_worker(self):
+                    self.worker_thread.quit()
+                    self.worker_thread.wait()
+                
+                def show_entry(self, key: tuple, data: memoryview):
+                    self.key = key
+                    self.peaks = None
+                    if not waveform.available():
+                        self.update()
+                        return
+                    cached = cache.load_peaks(*key)
+                    if cached is not None:
+                        tracing.count("waveform.cache_hit")
+                        self.__draw(waveform.from_bytes(cached))
+                    else:
+                        tracing.count("waveform.decode")
+                        self.label.setText("Drawing waveform...")
+                        self.update()
+                        self.signals.decode.emit(key, data)
+                
+                def __ready(self, key: tuple, peaks):
+                    if key != self.key:  # something else got loaded in the meantime
+                        return
+                    if peaks is None:
+                        self.label.setText("No waveform")
+                    else:
+                        self.__draw(peaks)
+                
+                def __draw(self, peaks):
+                    self.peaks = peaks
+                    self.label.setText("")
+                    self.update()
+                
+                def paintEvent(self, event):
+                    painter = QPainter(self)
+                    painter.fillRect(self.rect(), QColor("orange"))
+                    if self.peaks is not None and len(self.peaks):
+                        # one line per pixel column at most, from the column's lowest to its highest sample
+                        columns = waveform.reduce(self.peaks, max(1, self.width()))
+                        step = self.width() / len(columns)
+                        middle = self.height() / 2
+                        painter.setPen(QColor("black"))
+                        painter.drawLines([
+                            QLineF(i * step, middle * (1 - high), i * step, middle * (1 - low))
+                            for i, (low, high) in enumerate(columns.tolist())
+                        ])
+                    painter.end()
+                
+                class Decoder(QObject):
+                    # Lives on the art's worker thread and decodes one entry at a time, a new entry
+                    #   replaces whatever was still going
+                    class Signals(QObject):
+                        ready = Signal(object, object)  # key, peaks (None if it couldn't be decoded)
+                    
+                    sample_formats = {
+                        QAudioFormat.SampleFormat.UInt8: "u8",
+                        QAudioFormat.SampleFormat.Int16: "s16",
+                        QAudioFormat.SampleFormat.Int32: "s32",
+                        QAudioFormat.SampleFormat.Float: "f32",
+                    }
+                    
+                    def __init__(self):
+                        super().__init__()
+                        self.signals = self.Signals()
+                        self.key = None
+                        self.decoder = None
+                        self.device = None
+                        self.builder = None
+                    
+                    @Slot(object, object)
+                    def decode(self, key: tuple, data: memoryview):
+                        self.__stop()
+                        self.key = key
+                        self.builder = waveform.PeakBuilder()
+                        self.device = MainWindow.CentralWidget.MusicWidget.EntryDevice(data)
+                        self.device.open(QIODevice.OpenModeFlag.ReadOnly | QIODevice.OpenModeFlag.Unbuffered)
+                        self.decoder = QAudioDecoder()
+                        self.decoder.bufferReady.connect(self.__buffer_ready)
+                        self.decoder.finished.connect(self.__finished)
+                        self.decoder.error.connect(self.__failed)
+                        self.decoder.setSourceDevice(self.device)
+                        self.decoder.start()
+                    
+                    def __buffer_ready(self):
+                        if self.sender() is not self.decoder:  # left over from an entry that got replaced
+                            return
+                        buffer = self.decoder.read()
+                        audio_format = buffer.format()
+                        sample_format = self.sample_formats.get(audio_format.sampleFormat())
+                        if buffer.isValid() and sample_format:
+                            self.builder.add(waveform.samples(buffer.constData(), sample_format, audio_format.channelCount()))
+                    
+                    def __finished(self):
+                        if self.sender() is not self.decoder:
+                            return
+                        key, peaks = self.key, self.builder.finish()
+                        self.__stop()
+                        cache.store_peaks(*key, waveform.to_bytes(peaks))
+                        self.signals.ready.emit(key, peaks)
+                    
+                    def __failed(self, error):
+                        if self.sender() is not self.decoder:
+                            return
+                        key = self.key
+                        self.__stop()
+                        self.signals.ready.emit(key, None)
+                    
+                    def __stop(self):
+                        if self.decoder is not None:
+                            self.decoder.stop()
+                            self.decoder.deleteLater()
+                            self.device.deleteLater()
+                        self.decoder = None
+                        self.device = None
+                        self.builder = None
             
             class Controls(QWidget):
                 class Signals(QObject):
@@ -547,9 +949,7 @@ class MainWindow(QMainWindow):
                     infos.addTab(self.file_info, "File Info")
                     
                     self.display_stack.addWidget(default_widget)
-                    # Im too lazy to implement the file info so tabs aren't needed yet
-                    #self.display_stack.addWidget(infos)
-                    self.display_stack.addWidget(self.metadata_table)
+                    self.display_stack.addWidget(infos)
                     
                     layout.addWidget(self.display_stack)
                     layout.setContentsMargins(0,0,0,0)
@@ -569,9 +969,21 @@ class MainWindow(QMainWindow):
                             self.metadata_table.setItem(i, 0, tag)
                             self.metadata_table.setItem(i, 1, val)
                     else:  # file unloaded
-                        self.display_stack.setCurrentIndex(0)
                         self.metadata_table.clear()
-                        #self.file_info.clear()
+                        self.metadata_table.setRowCount(0)
+                        if not self.file_info.rowCount():
+                            self.display_stack.setCurrentIndex(0)
+                
+                def set_file_info(self, rows: list[tuple[str, str]]):
+                    # What the archive itself says about the entry, see metadata.ArchiveMetadata.info
+                    self.file_info.clear()
+                    self.file_info.setColumnCount(2)
+                    self.file_info.setRowCount(len(rows))
+                    self.file_info.setHorizontalHeaderLabels(["Field", "Value"])
+                    for i, (name, value) in enumerate(rows):
+                        self.file_info.setItem(i, 0, QTableWidgetItem(name))
+                        self.file_info.setItem(i, 1, QTableWidgetItem(value))
+                    self.display_stack.setCurrentIndex(1)
                 
                 def __make_example_table(self, table: QTableWidget):
                     colors = [
@@ -603,23 +1015,59 @@ class MainWindow(QMainWindow):
                         table.setItem(i, 1, item_code)
                         table.setItem(i, 2, item_color)
             
-            def load_media(self, data:bytes):
-                if self.buffer.isOpen():
-                    self.unload()
-                self.buffer.setData(data)
-                self.buffer.open(QIODevice.OpenModeFlag.ReadOnly)
-                self.buffer.reset()  # same as seek(0)?
-                self.media_player.setSourceDevice(self.buffer, QUrl.fromLocalFile("./"))
-                print("Audio loaded")
+            def load_media(self, data:memoryview):
+                # The player reads the entry straight out of the mapped archive, so switching tracks
+                #   costs nothing no matter how big the entry is
+                previous = self.device
+                self.device = self.EntryDevice(data)
+                self.device.open(QIODevice.OpenModeFlag.ReadOnly | QIODevice.OpenModeFlag.Unbuffered)
+                self.media_player.setSourceDevice(self.device, QUrl.fromLocalFile("./"))
+                self.__retire(previous)
                 self.controls.signals.set_enabled.emit(True)
             
             def unload(self):
                 if self.media_player.playbackState() != QMediaPlayer.PlaybackState.StoppedState:
                     self.media_player.stop()
-                sleep(0.125)  # Avoids what seem to be a race condition with following line
                 self.media_player.setSourceDevice(None)
-                self.buffer.close()
+                self.__retire(self.device)
+                self.device = None
                 self.controls.signals.set_enabled.emit(False)
+            
+            def __retire(self, device: 'MainWindow.CentralWidget.MusicWidget.EntryDevice'):
+                # The player has let go of the device by now, but it's only deleted once control is
+                #   back in the event loop in case anything still has a read queued up on it
+                if device is not None:
+                    device.deleteLater()
+            
+            class EntryDevice(QIODevice):
+                # Read-only, seekable QIODevice over one entry's memoryview into the archive
+                #   Opened unbuffered, so QIODevice doesn't keep a second copy of what it reads and
+                #   pos() is always where the next readData starts
+                def __init__(self, data: memoryview, parent: QObject = None):
+                    super().__init__(parent)
+                    self.data = data
+                
+                def isSequential(self) -> bool:
+                    return False
+                
+                def size(self) -> int:
+                    return len(self.data)
+                
+                def bytesAvailable(self) -> int:
+                    # QIODevice's own already counts size() - pos() for a random access device, adding
+                    #   that to it again would have players reading past the end of the entry
+                    return super().bytesAvailable()
+                
+                def readData(self, maxlen: int) -> bytes:
+                    position = self.pos()
+                    return bytes(self.data[position : position + maxlen])
+                
+                def writeData(self, data) -> int:
+                    return -1
+                
+                def close(self):
+                    super().close()
+                    self.data = memoryview(b"")  # lets go of the mapping
     
     indexing_status_init = False
     def __indexing_status(self, progress: float):
@@ -650,26 +1098,252 @@ class MainWindow(QMainWindow):
             return
         file = Path(file)
         self.statusBar().showMessage("Loading archive...", 0)
-        sleep(0.05)
         self.__load_archive(file)
     
     def __load_archive(self, file: Path):
+        # Indexing happens on a worker, the archive that's already open stays usable until the new one
+        #   is completely done and both get swapped in at once
+        if self.loader is not None:
+            self.loader.signals.blockSignals(True)  # nobody wants what it finds anymore
+            self.loader.requestInterruption()
+        loader = self.loader = self.ArchiveLoader(file, self)
+        loader.signals.progress.connect(self.signals.archive_index_progress.emit)
+        loader.signals.loaded.connect(lambda archive_file, archive_indices, archive_search: self.__archive_loaded(file, archive_file, archive_indices, archive_search))
+        loader.signals.metadata_loaded.connect(self.__metadata_loaded)
+        loader.signals.failed.connect(self.__archive_failed)
+        loader.finished.connect(lambda: self.__loader_finished(loader))
+        loader.finished.connect(loader.deleteLater)
+        self.cancel_button.show()
+        loader.start()
+    
+    def __cancel_load(self):
+        if self.loader is not None:
+            self.loader.requestInterruption()
+    
+    def __loader_finished(self, loader: 'MainWindow.ArchiveLoader'):
+        if self.loader is loader:
+            self.loader = None
+    
+    def __archive_loaded(self, file: Path, archive_file, archive_indices, archive_search):
+        self.cancel_button.hide()
+        previous = self.archive_file
         self.archive_name = file.name
-        self.archive_file = SablsUnarchiver.load_archive(file)
-        self.archive_indices = SablsUnarchiver.find_flacs(
-            self.archive_file,
-            progress_callback = lambda x: self.signals.archive_index_progress.emit(x)
-        )
+        self.archive_file, self.archive_indices, self.archive_search = archive_file, archive_indices, archive_search
+        self.archive_metadata = None
+        self.entry_cache.set_archive(archive_file, archive_indices)
         
         if not self.archive_indices:
             print("Empty Archive")
+        self.centralWidget().signals.set_data.emit()
+        if previous is not None:
+            self.retired_archives.append(previous)
+            self.__close_retired()
+    
+    def __close_retired(self):
+        # Unmaps archives that were swapped out, each as soon as no unarchive job or prefetch read is
+        #   using it and nothing else holds a view into it (the player and waveform devices do while
+        #   they're around, mmap refuses to close under them), otherwise it gets another go in a bit
+        still_open = []
+        for archive_file in self.retired_archives:
+            if self.unarchive_queue.uses(archive_file) or self.entry_cache.reads_from(archive_file):
+                still_open.append(archive_file)
+                continue
+            try:
+                archive_file.close()
+            except BufferError:
+                still_open.append(archive_file)
+        self.retired_archives = still_open
+        if still_open:
+            self.retire_timer.start()
         else:
-            self.centralWidget().signals.set_data.emit()
+            self.retire_timer.stop()
+    
+    def __metadata_loaded(self, archive_indices, archive_metadata):
+        if archive_indices is self.archive_indices:
+            self.archive_metadata = archive_metadata
+            self.centralWidget().tree_view.tree_model.set_metadata(archive_metadata)
+    
+    def __archive_failed(self, message: str):
+        self.cancel_button.hide()
+        self.indexing_status_init = False
+        self.progress_bar.hide()
+        self.statusBar().showMessage(message, 3000)
+    
+    def unarchive(self, indices):
+        # Queues entries of the open archive to be written under unarchive_dir, as one job
+        indices = list(indices)
+        label = "{} ({} files)".format(self.archive_name, len(indices))
+        self.unarchive_queue.add(label, self.unarchive_dir, self.archive_file, self.archive_indices, indices)
+        self.statusBar().showMessage("Queued {}".format(label), 1500)
+    
+    def __unarchive_progress(self, label: str, progress: float, rate: float, queued: int):
+        self.unarchive_bar.setValue(int(progress))
+        self.unarchive_status.setText("{}: {:0.1f} MB/s{}".format(label, rate / 1e6, ", {} queued".format(queued) if queued else ""))
+        for widget in (self.unarchive_status, self.unarchive_bar, self.unarchive_cancel):
+            widget.show()
+    
+    def __unarchive_done(self, message: str, queued: int):
+        self.statusBar().showMessage(message, 3000)
+        if not queued:
+            for widget in (self.unarchive_status, self.unarchive_bar, self.unarchive_cancel):
+                widget.hide()
+    
+    def closeEvent(self, event):
+        # Threads still running when Qt tears them down take the whole process with them
+        if self.loader is not None:
+            self.loader.requestInterruption()
+            self.loader.wait()
+        self.unarchive_queue.stop()
+        self.entry_cache.close()
+        self.centralWidget().music_content.art.close_worker()
+        super().closeEvent(event)
+    
+    class UnarchiveQueue(QThread):
+        # Works through unarchive jobs one at a time off the GUI thread
+        #   A job is a batch of entries out of one archive, it goes to the extraction engine whole so the
+        #   copies run in offset order and in parallel. Cancelling stops the running job at its next
+        #   progress report and drops everything still queued.
+        class Signals(QObject):
+            progress = Signal(str, float, float, int)  # job, percent, bytes per second, jobs still queued
+            done = Signal(str, int)                    # what happened, jobs still queued
+        
+        progress_interval = 0.1
+        
+        def __init__(self, parent: QObject = None):
+            super().__init__(parent)
+            self.signals = self.Signals()
+            self.jobs = queue.Queue()
+            self.cancelled = threading.Event()
+            self.holding = Counter()  # archive -> jobs queued or running out of it
+            self.holding_lock = threading.Lock()
+        
+        def add(self, label: str, unarchive_dir: Path, archive_file, archive_indices, indices: list[int]):
+            self.__hold(archive_file, 1)
+            self.jobs.put((label, unarchive_dir, archive_file, archive_indices, indices))
+        
+        def uses(self, archive_file) -> bool:
+            with self.holding_lock:
+                return archive_file in self.holding
+        
+        def __hold(self, archive_file, count: int):
+            with self.holding_lock:
+                self.holding[archive_file] += count
+                if not self.holding[archive_file]:
+                    del self.holding[archive_file]
+        
+        def cancel(self):
+            while True:
+                try:
+                    job = self.jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if job is not None:
+                    self.__hold(job[2], -1)
+                else:
+                    self.jobs.put(None)  # stop() is waiting on that one
+                    break
+            self.cancelled.set()
+        
+        def stop(self):
+            self.cancel()
+            self.jobs.put(None)
+            self.wait()
+        
+        def run(self):
+            while True:
+                job = self.jobs.get()
+                if job is None:
+                    return
+                self.cancelled.clear()
+                label, unarchive_dir, archive_file, archive_indices, indices = job
+                total = sum(archive_indices.lengths[i] for i in indices)
+                start = perf_counter()
+                last_progress = 0.0
+                
+                def progress(percent: float):
+                    nonlocal last_progress
+                    if self.cancelled.is_set():
+                        raise Cancelled()
+                    now = perf_counter()
+                    if percent != float('inf') and now - last_progress >= self.progress_interval:
+                        last_progress = now
+                        self.signals.progress.emit(label, percent, total * percent / 100 / (now - start), self.jobs.qsize())
+                
+                try:
+                    with tracing.span("ui.extract", total, len(indices)):
+                        SablsUnarchiver.dump_files(unarchive_dir, archive_file, archive_indices, indices, progress_callback=progress)
+                except Cancelled:
+                    message = "Cancelled {}".format(label)
+                except OSError as error:
+                    message = "Couldn't write {}: {}".format(label, error)
+                else:
+                    seconds = perf_counter() - start
+                    message = "Wrote {} in {:0.1f}s, {:0.1f} MB/s".format(label, seconds, total / 1e6 / seconds if seconds else 0.0)
+                finally:
+                    self.__hold(archive_file, -1)
+                self.signals.done.emit(message, self.jobs.qsize())
+    
+    class ArchiveLoader(QThread):
+        # Indexes and maps an archive off the GUI thread, and builds its path search so the first search
+        #   doesn't freeze the window, then reads the metadata of every entry
+        #   Progress only goes out every progress_interval seconds, and asking the thread to stop
+        #   makes the next progress report raise Cancelled, which unwinds the scan
+        class Signals(QObject):
+            progress = Signal(float)
+            loaded = Signal(object, object, object)  # SablsArchive, ArchiveIndex, PathSearch
+            metadata_loaded = Signal(object, object)  # ArchiveIndex it belongs to, ArchiveMetadata
+            failed = Signal(str)
+        
+        progress_interval = 0.1
+        
+        def __init__(self, file: Path, parent: QObject = None):
+            super().__init__(parent)
+            self.file = file
+            self.signals = self.Signals()
+            self.last_progress = 0.0
+        
+        def run(self):
+            try:
+                with tracing.span("ui.load") as span:
+                    archive_indices = SablsUnarchiver.index_archive(self.file, progress_callback=self.__progress)
+                    archive_file = SablsUnarchiver.load_archive(self.file)
+                    archive_search = PathSearch(archive_indices)
+                    span.bytes, span.entries = len(archive_file), len(archive_indices)
+            except Cancelled:
+                self.signals.failed.emit("Cancelled loading {}".format(self.file.name))
+            except (OSError, ValueError) as error:
+                self.signals.failed.emit("Couldn't load {}: {}".format(self.file.name, error))
+            else:
+                self.signals.loaded.emit(archive_file, archive_indices, archive_search)
+                self.__read_metadata(archive_indices)
+        
+        def __read_metadata(self, archive_indices):
+            # The tree is already up by now, this just fills in its columns
+            def cancellable(progress: float):
+                if self.isInterruptionRequested():
+                    raise Cancelled()
+            try:
+                archive_metadata = read_metadata(self.file, archive_indices, progress_callback=cancellable)
+            except (Cancelled, OSError):
+                return
+            self.signals.metadata_loaded.emit(archive_indices, archive_metadata)
+        
+        def __progress(self, progress: float):
+            if self.isInterruptionRequested():
+                raise Cancelled()
+            now = perf_counter()
+            if progress == float('inf') or now - self.last_progress >= self.progress_interval:
+                self.last_progress = now
+                self.signals.progress.emit(progress)
     
     def __load_file(self, archive_index):
-        self.signals.load_file.emit(
-            SablsUnarchiver.select_file(self.archive_file, self.archive_indices, archive_index)
-        )
+        data = self.entry_cache.load(archive_index)
+        with tracing.span("ui.play", len(data), 1):
+            self.signals.load_file.emit(data)
+        start, end = SablsUnarchiver.entry_range(len(self.archive_file), self.archive_indices, archive_index)
+        self.signals.show_waveform.emit((self.archive_file.path, start, end - start), data)
+        if self.archive_metadata is not None:
+            self.signals.show_info.emit(self.archive_metadata.info(archive_index))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,79 @@
+try:
+    import numpy as np
+except ImportError:  # optional, the music visuals panel just stays blank without it
+    np = None
+
+# Waveform overviews
+#   Decoded PCM is boiled down to a (min, max) pair per block_frames frames as it comes in, so even
+#   an hour long track is only a few MB of pairs, and once it's all there those get squeezed into
+#   buckets pairs for drawing. All of it is NumPy reductions, nothing loops over samples in python.
+#
+# Peaks are float32 (min, max) rows between -1 and 1, tobytes() of them is what goes in the cache.
+
+buckets = 2048
+block_frames = 256
+
+# sample format -> (dtype, offset, scale) to get it into -1..1
+sample_formats = {
+    "u8": ("u1", 128, 128),
+    "s16": ("<i2", 0, 32768),
+    "s32": ("<i4", 0, 2 ** 31),
+    "f32": ("<f4", 0, 1),
+}
+
+def available() -> bool:
+    return np is not None
+
+def samples(data, sample_format: str, channels: int):
+    # Interleaved PCM bytes -> float32 array of (frames, channels)
+    dtype, offset, scale = sample_formats[sample_format]
+    pcm = np.frombuffer(data, dtype=dtype)
+    pcm = pcm[: len(pcm) - len(pcm) % channels]
+    if offset or scale != 1:
+        pcm = (pcm.astype(np.float32) - offset) / scale
+    return pcm.astype(np.float32, copy=False).reshape(-1, channels)
+
+class PeakBuilder:
+    def __init__(self, block_frames: int = block_frames):
+        self.block_frames = block_frames
+        self.lows = []
+        self.highs = []
+        self.carry = None  # frames short of a whole block, copied since the decoder reuses its buffers
+    
+    def add(self, frames):
+        # frames is (frames, channels), every channel goes into the same pair
+        if self.carry is not None and len(self.carry):
+            frames = np.concatenate((self.carry, frames))
+        whole = len(frames) - len(frames) % self.block_frames
+        if whole:
+            blocks = frames[:whole].reshape(-1, self.block_frames * frames.shape[1])
+            self.lows.append(blocks.min(axis=1))
+            self.highs.append(blocks.max(axis=1))
+        self.carry = frames[whole:].copy()
+    
+    def finish(self, count: int = buckets):
+        # (count, 2) array of peaks, fewer rows if the track is shorter than count blocks
+        lows = list(self.lows)
+        highs = list(self.highs)
+        if self.carry is not None and self.carry.size:
+            lows.append(self.carry.min(keepdims=True).ravel())
+            highs.append(self.carry.max(keepdims=True).ravel())
+        if not lows:
+            return np.zeros((0, 2), np.float32)
+        return reduce(np.column_stack((np.concatenate(lows), np.concatenate(highs))), count)
+
+def reduce(peaks, count: int):
+    # Squeezes peaks into at most count rows, each one covering an even share of the originals
+    if len(peaks) <= count:
+        return peaks.astype(np.float32, copy=False)
+    starts = np.linspace(0, len(peaks), count, endpoint=False).astype(np.intp)
+    return np.column_stack((
+        np.minimum.reduceat(peaks[:, 0], starts),
+        np.maximum.reduceat(peaks[:, 1], starts),
+    )).astype(np.float32, copy=False)
+
+def from_bytes(data: bytes):
+    return np.frombuffer(data, dtype="<f4").reshape(-1, 2)
+
+def to_bytes(peaks) -> bytes:
+    return np.ascontiguousarray(peaks, dtype="<f4").tobytes()
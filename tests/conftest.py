@@ -0,0 +1,73 @@
+import sys
+import random
+from pathlib import Path
+import pytest
+
+# The modules in sauce/ import each other by name, like they do when run from there
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "sauce"))
+
+import synth
+from index import ArchiveIndex
+
+# Small synthetic archives, kept small so the whole suite runs in a few seconds. Entries are a few KB
+#   rather than the real thing's hundreds, the scan doesn't care how big they are.
+
+small_entry = 2 * 1024
+large_entry = 24 * 1024
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch) -> Path:
+    # Every test gets an index cache of its own, nothing leaks into the user's or between tests
+    directory = tmp_path / "cache"
+    monkeypatch.setenv("SABLS_CACHE_DIR", str(directory))
+    return directory
+
+@pytest.fixture(scope="session")
+def make_archive(tmp_path_factory):
+    # make_archive(entries, **write_archive options) -> (path, layout), the same options give the same file
+    made = {}
+    
+    def make(entries: int = 60, **options) -> tuple[Path, list[tuple[int, int]]]:
+        options = {"min_size": small_entry, "max_size": large_entry, **options}
+        key = (entries, tuple(sorted(options.items())))
+        if key not in made:
+            path = tmp_path_factory.mktemp("archives") / "synth.sabs"
+            made[key] = path, synth.write_archive(path, entries, **options)
+        return made[key]
+    return make
+
+@pytest.fixture(scope="session")
+def archive(make_archive) -> tuple[Path, list[tuple[int, int]]]:
+    # Every kind of entry and a bit of everything the scan has to see through
+    return make_archive(80, seed=3, spurious=0.1, unnamed=0.1, mixed=0.2)
+
+awkward_paths = [
+    "Sound\\Vox\\Hello World", "sound\\vox\\[brackets]\\a", "music\\théme\\Main", "", "a", "a\\b\\c.d",
+    "sound\\vox\\star*name", "UPPER\\CASE", "sound\\weapons\\pistol_01", "sound\\weapons\\pistol_1",
+    "sound\\v]x\\close", "dots...\\..", "x" * 127,
+]
+
+@pytest.fixture(scope="session")
+def named() -> tuple[list[str], ArchiveIndex]:
+    # (paths, index of them) with synth's paths and a few awkward ones, for checking queries against fnmatch and re
+    rnd = random.Random(0)
+    blocks = [synth.entry_path(rnd, i, 8, 0.05) for i in range(400)]
+    blocks += [path.encode("utf-8").ljust(synth.path_blocksize, b"\0") for path in awkward_paths]
+    paths = [block.rstrip(b"\0").decode("utf-8") for block in blocks]
+    count = len(blocks)
+    return paths, ArchiveIndex(range(count), [1] * count, bytes(count), b"".join(blocks))
+
+@pytest.fixture
+def write_entries(tmp_path):
+    # write_entries(name, [(entry bytes, path), ...]) -> archive laid out like write_archive's, path "" for unnamed
+    def write(name: str, entries: list[tuple[bytes, str]]) -> Path:
+        path = tmp_path / name
+        blocks = [file_path.encode("utf-8").ljust(synth.path_blocksize, b"\0") for _, file_path in entries]
+        path.write_bytes(b"".join(data for data, _ in entries) + b"".join(blocks))
+        return path
+    return write
+
+@pytest.fixture(scope="session")
+def entry():
+    # entry(seed) -> bytes of a synthetic FLAC entry, the same seed always giving the same bytes
+    return lambda seed, size=8 * 1024: synth.make_entry(random.Random(seed), size)
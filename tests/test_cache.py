@@ -0,0 +1,105 @@
+import os
+import pytest
+import cache
+from explorer import SablsUnarchiver
+from index import ArchiveIndex
+
+@pytest.fixture
+def indexed(archive):
+    # The archive indexed once, which leaves its cache entry behind
+    path, _ = archive
+    flacs = SablsUnarchiver.index_archive(path, progress_callback=None, hashes=True)
+    assert cache.cache_path(path).is_file()
+    return path, flacs
+
+def no_scan(*args, **kwargs):
+    raise AssertionError("scanned the archive instead of using the cache")
+
+def test_round_trip(indexed):
+    path, flacs = indexed
+    offsets, lengths, flags, file_paths, hashes, kinds = cache.load_index(path)
+    cached = ArchiveIndex(offsets, lengths, flags, file_paths, hashes, kinds)
+    assert cached == flacs
+    assert cached.hashes == flacs.hashes
+
+def test_hit_skips_the_scan(indexed, monkeypatch):
+    path, flacs = indexed
+    monkeypatch.setattr(SablsUnarchiver, "scan_entries", no_scan)
+    assert SablsUnarchiver.index_archive(path, progress_callback=None) == flacs
+
+def test_missing_hashes_get_added(archive, monkeypatch):
+    path, _ = archive
+    flacs = SablsUnarchiver.index_archive(path, progress_callback=None)
+    assert cache.load_index(path)[4] is None
+    monkeypatch.setattr(SablsUnarchiver, "scan_entries", no_scan)
+    hashed = SablsUnarchiver.index_archive(path, progress_callback=None, hashes=True)
+    assert hashed == flacs and hashed.hashes is not None
+    assert cache.load_index(path)[4] == hashed.hashes
+
+def corrupt(path, position: int, replacement: bytes = None):
+    # Overwrites the cache file at position, or cuts it off there when there's no replacement
+    data = bytearray(cache.cache_path(path).read_bytes())
+    if replacement is None:
+        del data[position:]
+    else:
+        data[position : position + len(replacement)] = replacement
+    cache.cache_path(path).write_bytes(bytes(data))
+
+def payload_start(path) -> int:
+    header = cache.header.unpack_from(cache.cache_path(path).read_bytes())
+    return cache.header.size + header[7]
+
+@pytest.mark.parametrize("damage", [
+    lambda path: corrupt(path, 0, b"XXXX"),                                   # magic
+    lambda path: corrupt(path, 4, (cache.cache_version + 1).to_bytes(2, "little")),
+    lambda path: corrupt(path, 10),                                           # inside the header
+    lambda path: corrupt(path, payload_start(path) + 100),                    # truncated payload
+    lambda path: corrupt(path, payload_start(path) + 3, b"\xff"),             # an offset
+    lambda path: corrupt(path, os.path.getsize(cache.cache_path(path)) - 1, b"\x00"),  # a hash
+    lambda path: cache.cache_path(path).write_bytes(b""),
+], ids=["magic", "version", "short-header", "truncated", "flipped-offset", "flipped-hash", "empty"])
+def test_corruption(indexed, damage):
+    path, flacs = indexed
+    damage(path)
+    assert cache.load_index(path) is None
+    assert not cache.cache_path(path).exists()  # thrown out rather than read again next time
+    
+    # and the next index_archive rescans and writes a good one
+    assert SablsUnarchiver.index_archive(path, progress_callback=None, hashes=True) == flacs
+    assert cache.load_index(path) is not None
+
+def test_changed_archive(make_archive, tmp_path):
+    source, _ = make_archive(20, seed=5)
+    path = tmp_path / "changing.sabs"
+    path.write_bytes(source.read_bytes())
+    SablsUnarchiver.index_archive(path, progress_callback=None)
+    stat = os.stat(path)
+    
+    # same size and mtime, different bytes at the start, only the fingerprint catches it
+    data = bytearray(path.read_bytes())
+    data[4:8] = b"\xff\xff\xff\xff"
+    path.write_bytes(bytes(data))
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert cache.load_index(path) is None
+
+def test_stale_after_touch(make_archive, tmp_path):
+    source, _ = make_archive(20, seed=5)
+    path = tmp_path / "touched.sabs"
+    path.write_bytes(source.read_bytes())
+    SablsUnarchiver.index_archive(path, progress_callback=None)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert cache.load_index(path) is None
+
+def test_no_cache_written(archive):
+    path, _ = archive
+    SablsUnarchiver.index_archive(path, progress_callback=None, use_cache=False)
+    assert not cache.cache_path(path).exists()
+
+def test_unwritable_cache_is_not_fatal(archive, tmp_path, monkeypatch):
+    path, _ = archive
+    blocker = tmp_path / "not-a-directory"
+    blocker.write_bytes(b"")
+    monkeypatch.setenv("SABLS_CACHE_DIR", str(blocker))
+    flacs = SablsUnarchiver.index_archive(path, progress_callback=None)
+    assert len(flacs) and cache.load_index(path) is None
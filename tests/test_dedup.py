@@ -0,0 +1,69 @@
+import os
+from pathlib import Path
+import pytest
+import extract
+from explorer import SablsUnarchiver, SablsArchive
+
+@pytest.fixture
+def repeats(write_entries, entry):
+    # An archive where entries 0, 2 and 4 hold the same bytes, and 1 and 5 do too
+    return write_entries("repeats.sabs", [
+        (entry(0), "vox\\a"), (entry(1), "vox\\b"), (entry(0), "vox\\c"),
+        (entry(2), "vox\\d"), (entry(0), ""), (entry(1), "music\\b"),
+    ])
+
+@pytest.mark.parametrize("dedup", ["hardlink", "reflink"])
+def test_dedup(repeats, entry, tmp_path, dedup):
+    flacs = SablsUnarchiver.index_archive(repeats, progress_callback=None)
+    out = tmp_path / "out"
+    with SablsArchive(repeats) as mapped:
+        SablsUnarchiver.dump_archive(out, mapped, flacs, jobs=3, dedup=dedup)
+    assert flacs.hashes is not None  # hashed on the way
+    for file, seed in [("vox/a", 0), ("vox/b", 1), ("vox/c", 0), ("vox/d", 2), ("No Name/File 0004", 0), ("music/b", 1)]:
+        assert (out / (file + ".flac")).read_bytes() == entry(seed)
+    if dedup == "hardlink":
+        inode = lambda file: os.stat(out / (file + ".flac")).st_ino
+        assert inode("vox/a") == inode("vox/c") == inode("No Name/File 0004")
+        assert inode("vox/b") == inode("music/b") != inode("vox/a")
+        assert os.stat(out / "vox/d.flac").st_nlink == 1
+
+def test_rewriting_a_link_leaves_the_others(repeats, write_entries, entry, tmp_path):
+    # a plain extraction over a deduped one mustn't write through a hardlink into its other names
+    flacs = SablsUnarchiver.index_archive(repeats, progress_callback=None)
+    out = tmp_path / "out"
+    with SablsArchive(repeats) as mapped:
+        SablsUnarchiver.dump_archive(out, mapped, flacs, dedup="hardlink")
+    changed = write_entries("changed.sabs", [(entry(0), "vox\\a"), (entry(1), "vox\\b"), (entry(9), "vox\\c")])
+    changed_flacs = SablsUnarchiver.index_archive(changed, progress_callback=None)
+    with SablsArchive(changed) as mapped:
+        SablsUnarchiver.dump_files(out, mapped, changed_flacs, [2])
+    assert (out / "vox/c.flac").read_bytes() == entry(9)
+    assert (out / "vox/a.flac").read_bytes() == (out / "No Name/File 0004.flac").read_bytes() == entry(0)
+
+def test_dedupe():
+    a, b, c, d = (Path(name) for name in "abcd")
+    copies = [(40, 4, d), (10, 1, a), (30, 3, c), (20, 2, b)]
+    keys = ["y", "x", "x", "y"]
+    unique, links = extract.dedupe(copies, keys)
+    assert unique == [(10, 1, a), (20, 2, b)]  # the first by offset keeps the bytes
+    assert links == [(a, c, 3), (b, d, 4)]
+
+def test_dedupe_same_target():
+    # a target written twice only gets its last copy, and that one is what gets deduped
+    a, b = Path("a"), Path("b")
+    unique, links = extract.dedupe([(10, 1, a), (20, 1, b), (30, 1, a)], ["x", "y", "y"])
+    assert unique == [(20, 1, b)]
+    assert links == [(b, a, 1)]
+
+def test_dedupe_across_calls():
+    a, b = Path("a"), Path("b")
+    originals = {}
+    assert extract.dedupe([(0, 1, a)], ["x"], originals) == ([(0, 1, a)], [])
+    assert extract.dedupe([(0, 1, b)], ["x"], originals) == ([], [(a, b, 1)])
+
+def test_hash_entries(repeats, entry):
+    flacs = SablsUnarchiver.index_archive(repeats, progress_callback=None)
+    with SablsArchive(repeats) as mapped:
+        hashes = SablsUnarchiver.hash_entries(mapped, flacs, jobs=2)
+    assert hashes == flacs.hashes and len(hashes) == len(flacs) * flacs.hash_size
+    assert flacs.content_hash(0) == flacs.content_hash(2) == flacs.content_hash(4) != flacs.content_hash(1)
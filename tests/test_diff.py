@@ -0,0 +1,85 @@
+import os
+import pytest
+import diff
+from explorer import SablsUnarchiver, SablsArchive
+
+def index(path):
+    return SablsUnarchiver.index_archive(path, progress_callback=None, hashes=True)
+
+@pytest.fixture
+def versions(write_entries, entry):
+    # (old, new) archives, the patch changes b, removes c, adds e, and puts a named entry in front of
+    #   two unnamed ones, shifting their indices by one, one of them unchanged and the other new
+    old = write_entries("old.sabs", [
+        (entry(0), "vox\\a"), (entry(1), "vox\\b"), (entry(2), "vox\\c"), (entry(3), ""), (entry(4), "vox\\d"),
+    ])
+    new = write_entries("new.sabs", [
+        (entry(0), "vox\\a"), (entry(11), "vox\\b"), (entry(5), "music\\e"), (entry(3), ""), (entry(6), ""), (entry(4), "vox\\d"),
+    ])
+    return old, new
+
+def test_needs_hashes(archive):
+    path, _ = archive
+    with pytest.raises(ValueError):
+        diff.snapshot(SablsUnarchiver.index_archive(path, progress_callback=None))
+
+def test_nothing_changed(archive):
+    path, _ = archive
+    changes = diff.compare(diff.snapshot(index(path)), diff.snapshot(index(path)))
+    assert not changes
+    assert len(changes.unchanged) == len(index(path))
+
+def test_compare(versions):
+    old, new = versions
+    changes = diff.compare(diff.snapshot(index(old)), diff.snapshot(index(new)))
+    assert changes.changed == ["vox\\b"]
+    assert changes.removed == ["vox\\c"]
+    # the unchanged unnamed entry is matched by content and keeps its old name, so it's unchanged and
+    #   the new one is added under the name it has by index
+    assert changes.added == ["music\\e", "No Name\\File 0004"]
+    assert sorted(changes.unchanged) == ["No Name\\File 0003", "vox\\a", "vox\\d"]
+    assert changes.new["No Name\\File 0003"][3] == 3
+    assert changes.summary() == "2 added, 1 changed, 1 removed, 3 unchanged"
+    assert [kind for kind, _, _ in changes.records()] == ["added", "added", "changed", "removed"]
+
+def test_unnamed_collision(write_entries, entry):
+    # the matched entry takes over an old name that another new unnamed entry has by index
+    old = write_entries("old.sabs", [(entry(0), "vox\\a"), (entry(1), "")])
+    new = write_entries("new.sabs", [(entry(1), ""), (entry(2), "")])
+    changes = diff.compare(diff.snapshot(index(old)), diff.snapshot(index(new)))
+    assert changes.unchanged == ["No Name\\File 0001"]
+    assert changes.new["No Name\\File 0001"][2:] == ("No Name/File 0001.flac", 0)
+    assert changes.added == ["No Name\\File 0001 (2)"]
+    assert changes.new["No Name\\File 0001 (2)"][2:] == ("No Name/File 0001 (2).flac", 1)
+    assert changes.removed == ["vox\\a"]
+
+def test_update_extraction(versions, entry, tmp_path):
+    old, new = versions
+    out = tmp_path / "out"
+    with SablsArchive(old) as mapped:
+        first = diff.update_extraction(out, mapped, index(old))
+    assert len(first.added) == 5 and diff.load_manifest(out) == {
+        path: (content_hash, length, file, -1) for path, (content_hash, length, file, _) in diff.snapshot(index(old)).items()
+    }
+    written = {path: os.stat(out / path).st_mtime_ns for path in ("vox/a.flac", "No Name/File 0003.flac")}
+    
+    (out / "vox/d.flac").unlink()  # missing since, so written again even though it didn't change
+    with SablsArchive(new) as mapped:
+        changes = diff.update_extraction(out, mapped, index(new), prune=True)
+    assert changes.summary() == "2 added, 1 changed, 1 removed, 3 unchanged"
+    files = {str(path.relative_to(out)).replace(os.sep, "/") for path in out.rglob("*.flac")}
+    assert files == {"vox/a.flac", "vox/b.flac", "vox/d.flac", "music/e.flac", "No Name/File 0003.flac", "No Name/File 0004.flac"}
+    for file, seed in [("vox/b.flac", 11), ("vox/d.flac", 4), ("music/e.flac", 5), ("No Name/File 0003.flac", 3), ("No Name/File 0004.flac", 6)]:
+        assert (out / file).read_bytes() == entry(seed)
+    for path, mtime in written.items():
+        assert os.stat(out / path).st_mtime_ns == mtime  # unchanged ones are left alone
+    
+    # and once it's up to date there's nothing left to do
+    with SablsArchive(new) as mapped:
+        assert not diff.update_extraction(out, mapped, index(new))
+
+def test_manifest_version(tmp_path):
+    (tmp_path / diff.manifest_name).write_text('{"version": 99, "entries": {}}')
+    with pytest.raises(ValueError):
+        diff.load_manifest(tmp_path)
+    assert diff.load_manifest(tmp_path / "nowhere") is None
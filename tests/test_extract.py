@@ -0,0 +1,90 @@
+import os
+from pathlib import Path
+import pytest
+import extract
+import formats
+from explorer import SablsUnarchiver, SablsArchive
+
+def extracted(out: Path) -> dict[str, bytes]:
+    # Every file under out by its / separated path
+    return {
+        str(path.relative_to(out)).replace(os.sep, "/"): path.read_bytes()
+        for path in out.rglob("*") if path.is_file()
+    }
+
+def entries(path: Path, flacs) -> dict[str, bytes]:
+    # What extracting every entry should leave behind, later entries winning a shared file
+    data = path.read_bytes()
+    return {
+        SablsUnarchiver.entry_file(flacs, index): data[flacs.offsets[index] : flacs.offsets[index] + flacs.lengths[index]]
+        for index in range(len(flacs))
+    }
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_dump_archive(archive, tmp_path, jobs):
+    path, _ = archive
+    flacs = SablsUnarchiver.index_archive(path, progress_callback=None)
+    out = tmp_path / "out"
+    with SablsArchive(path) as mapped:
+        SablsUnarchiver.dump_archive(out, mapped, flacs, jobs)
+    files = extracted(out)
+    assert files == entries(path, flacs)
+    assert {os.path.splitext(file)[1] for file in files} == {entry_format.extension for entry_format in formats.formats}
+    assert any(file.startswith("No Name/File ") for file in files)
+
+def test_dump_some(archive, tmp_path):
+    path, _ = archive
+    flacs = SablsUnarchiver.index_archive(path, progress_callback=None)
+    out = tmp_path / "out"
+    reported = []
+    with SablsArchive(path) as mapped:
+        SablsUnarchiver.dump_files(out, mapped, flacs, [5, 1, 30], jobs=2, progress_callback=reported.append)
+    wanted = entries(path, flacs)
+    assert extracted(out) == {SablsUnarchiver.entry_file(flacs, i): wanted[SablsUnarchiver.entry_file(flacs, i)] for i in (1, 5, 30)}
+    assert reported[-1] == float("inf") and reported[-2] == 100
+
+def test_dump_from_bytes(archive, tmp_path):
+    # anything sliceable works as the archive, without a file behind it the copies go through the view
+    path, _ = archive
+    flacs = SablsUnarchiver.index_archive(path, progress_callback=None)
+    out = tmp_path / "out"
+    SablsUnarchiver.dump_archive(out, path.read_bytes(), flacs, jobs=2)
+    assert extracted(out) == entries(path, flacs)
+
+def test_legacy_tuples(write_entries, entry, tmp_path):
+    # the old list of (offset, path block) tuples extracts the same as an index of that archive
+    path = write_entries("legacy.sabs", [(entry(i), "sound\\legacy\\{}".format(i) if i % 3 else "") for i in range(6)])
+    flacs = SablsUnarchiver.index_archive(path, progress_callback=None, use_cache=False)
+    tuples = [(flacs.offsets[i], flacs.path_block(i)) for i in range(len(flacs))]
+    with SablsArchive(path) as mapped:
+        SablsUnarchiver.dump_archive(tmp_path / "index", mapped, flacs, jobs=2)
+        SablsUnarchiver.dump_archive(tmp_path / "tuples", mapped, tuples, jobs=2)
+        SablsUnarchiver.dump_files(tmp_path / "some", mapped, tuples, [4, 0])
+    assert extracted(tmp_path / "tuples") == extracted(tmp_path / "index")
+    assert set(extracted(tmp_path / "some")) == {"sound/legacy/4.flac", "No Name/File 0000.flac"}
+
+def test_shared_target_keeps_the_last(write_entries, entry, tmp_path):
+    # the same path twice, the later entry is what ends up in the file however many threads copy
+    path = write_entries("twice.sabs", [(entry(0, 40000), "a\\same"), (entry(1), "a\\other"), (entry(2), "a\\same")])
+    flacs = SablsUnarchiver.index_archive(path, progress_callback=None, use_cache=False)
+    out = tmp_path / "out"
+    with SablsArchive(path) as mapped:
+        SablsUnarchiver.dump_archive(out, mapped, flacs, jobs=4)
+    assert extracted(out) == {"a/same.flac": entry(2), "a/other.flac": entry(1)}
+
+def test_rewrites_replace(archive, tmp_path):
+    # a second extraction over the first replaces the files instead of writing into them
+    path, _ = archive
+    flacs = SablsUnarchiver.index_archive(path, progress_callback=None)
+    out = tmp_path / "out"
+    target = out / SablsUnarchiver.entry_file(flacs, 0)
+    target.parent.mkdir(parents=True)
+    target.write_bytes(b"x" * 10 * 1024 * 1024)
+    with SablsArchive(path) as mapped:
+        SablsUnarchiver.dump_files(out, mapped, flacs, [0])
+    assert extracted(out) == {SablsUnarchiver.entry_file(flacs, 0): entries(path, flacs)[SablsUnarchiver.entry_file(flacs, 0)]}
+
+def test_last_per_target():
+    a, b = Path("a"), Path("b")
+    copies = [(30, 1, a), (10, 2, b), (20, 3, a), (40, 4, b)]
+    assert sorted(extract.last_per_target(copies)) == [(30, 1, a), (40, 4, b)]
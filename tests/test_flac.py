@@ -0,0 +1,79 @@
+import random
+import pytest
+import flac
+import synth
+
+def entry(seed: int, size: int = 4096, **options) -> bytes:
+    return synth.make_entry(random.Random(seed), size, **options)
+
+def test_exact_end():
+    for seed in range(20):
+        data = entry(seed)
+        assert flac.measure(data, 0, len(data)) == (len(data), 0)
+
+def test_at_an_offset():
+    data = entry(1)
+    padded = b"\x00" * 100 + data + entry(2)
+    assert flac.measure(padded, 100, 100 + len(data) + 4) == (len(data), 0)
+
+def test_junk_after_the_last_frame():
+    # Whatever follows the stream, the end is either exact or flagged, never silently wrong
+    unsure = 0
+    for seed in range(400):
+        rnd = random.Random(seed)
+        data = entry(seed) + rnd.randbytes(rnd.randrange(1, 3000))
+        length, flags = flac.measure(data, 0, len(data))
+        if flags == flac.UNSURE_END:
+            unsure += 1
+        else:
+            assert (length, flags) == (len(entry(seed)), 0)
+    assert unsure < 100
+
+def test_spurious_magic_inside():
+    data = entry(3, 20000, spurious=True)
+    assert data.count(flac.magic) == 2
+    assert flac.measure(data, 0, len(data)) == (len(data), 0)
+
+def test_comments():
+    data = entry(4, comments=["TITLE=snd_000004", "ENCODER=synth.py"])
+    blocks = flac.metadata_blocks(data, 0, len(data))
+    assert [block[0] for block in blocks] == [flac.STREAMINFO, 2, flac.VORBIS_COMMENT]
+    _, start, length = blocks[-1]
+    assert flac.read_vorbis_comment(data[start : start + length]) == ("synth.py", ["TITLE=snd_000004", "ENCODER=synth.py"])
+    # a cut off block gives what was whole
+    assert flac.read_vorbis_comment(data[start : start + length - 3]) == ("synth.py", ["TITLE=snd_000004"])
+
+def test_streaminfo():
+    data = entry(5)
+    info = flac.read_streaminfo(data, 0, len(data))
+    assert (info.sample_rate, info.channels, info.bits_per_sample) == (synth.sample_rate, 1, 16)
+    assert info.total_samples == synth.frames_per_entry * synth.frame_samples
+    assert info.min_blocksize == info.max_blocksize == synth.frame_samples
+
+@pytest.mark.parametrize("damage", [
+    lambda data: b"fLaC" + b"\x00" * 40,                      # STREAMINFO of nothing
+    lambda data: b"fLaC\x7f" + data[5:],                      # forbidden block type
+    lambda data: data[:4] + b"\x80\x00\x00\x10" + data[8:],   # STREAMINFO the wrong length
+    lambda data: data[:30],                                   # cut off inside the metadata
+])
+def test_not_flac(damage):
+    data = damage(entry(6))
+    assert flac.measure(data, 0, len(data)) == (len(data), flac.NOT_FLAC)
+
+def test_last_frame_missing():
+    data = entry(7)
+    cut = data[:-500]
+    assert flac.measure(cut, 0, len(cut)) == (len(cut), flac.UNSURE_END)
+
+def test_unknown_length():
+    # total samples 0, the encoder didn't know, so there is nothing to look for
+    data = bytearray(entry(8))
+    blocks = flac.metadata_blocks(data, 0, len(data))
+    start = blocks[0][1]
+    data[start + 14 : start + 18] = bytes([data[start + 14] & 0xF0, 0, 0, 0])
+    assert flac.measure(bytes(data), 0, len(data)) == (len(data), flac.UNSURE_END)
+
+def test_crc():
+    assert flac.crc8(b"123456789") == 0xF4
+    assert flac.crc16(b"123456789") == 0xFEE8
+    assert flac.crc16(b"6789", flac.crc16(b"12345")) == 0xFEE8
@@ -0,0 +1,69 @@
+import random
+import pytest
+import flac
+import formats
+import synth
+
+def wav(seed: int, size: int = 5000) -> bytes:
+    return synth.make_wav(random.Random(seed), size)
+
+def ogg(seed: int, size: int = 40000) -> bytes:
+    return synth.make_ogg(random.Random(seed), size)
+
+@pytest.mark.parametrize("kind, make", [(formats.RIFF, wav), (formats.OGG, ogg)])
+def test_measure_with_junk_after(kind, make):
+    entry_format = formats.formats[kind]
+    for seed in range(20):
+        data = make(seed)
+        assert data.startswith(entry_format.signature)
+        junk = random.Random(seed).randbytes(1000)
+        archive = b"\x00" * 7 + data + junk
+        assert entry_format.validate(archive, 7, len(archive))
+        assert entry_format.measure(archive, 7, len(archive)) == (len(data), 0)
+
+@pytest.mark.parametrize("kind, make", [(formats.RIFF, wav), (formats.OGG, ogg)])
+def test_cut_off(kind, make):
+    data = make(1)[:-100]
+    assert formats.formats[kind].measure(data, 0, len(data)) == (len(data), flac.UNSURE_END)
+
+def test_riff_validate():
+    data = wav(2)
+    assert not formats.formats[formats.RIFF].validate(b"RIFF" + bytes(12), 0, 16)
+    assert not formats.formats[formats.RIFF].validate(data[:12], 0, 12)
+    assert not formats.formats[formats.RIFF].validate(data[:8] + b" AVE" + data[12:], 0, len(data))
+
+def test_ogg_validate():
+    data = bytearray(ogg(3))
+    validate = formats.formats[formats.OGG].validate
+    assert validate(data, 0, len(data))
+    second_page = data.index(b"OggS", 4)
+    assert not validate(data, second_page, len(data))  # a stream only starts on its first page
+    data[30] ^= 0xFF
+    assert not validate(data, 0, len(data))  # CRC no longer checks out
+
+def test_ogg_crc():
+    # the CRC written into a page is over the page with that field zeroed
+    page = bytearray(ogg(4)[:200])
+    length = formats.ogg_page(page, 0, len(page))[3]
+    crc = int.from_bytes(page[22:26], "little")
+    page[22:26] = bytes(4)
+    assert formats.ogg_crc(page[:length]) == crc
+
+def test_interleaved_ogg_streams():
+    # two logical streams multiplexed, the physical stream ends with the last of them
+    rnd = random.Random(5)
+    pages = [
+        synth._ogg_page(0x02, 0, 1, 0, rnd.randbytes(100)),
+        synth._ogg_page(0x02, 0, 2, 0, rnd.randbytes(100)),
+        synth._ogg_page(0x04, 10, 1, 1, rnd.randbytes(100)),
+        synth._ogg_page(0x04, 10, 2, 1, rnd.randbytes(100)),
+    ]
+    data = b"".join(pages)
+    assert formats.formats[formats.OGG].measure(data + ogg(6), 0, len(data) + 1000) == (len(data), 0)
+
+def test_registry():
+    assert [entry_format.kind for entry_format in formats.formats] == list(range(len(formats.formats)))
+    assert formats.overlap() == 3
+    assert formats.kind_name(formats.OGG) == "ogg" and formats.kind_name(200) == "unknown"
+    with pytest.raises(ValueError):
+        formats.register(formats.Format("again", flac.magic, ".flac", "audio/flac", None, None))
@@ -0,0 +1,75 @@
+import pickle
+import pytest
+import formats
+import synth
+from explorer import SablsUnarchiver, SablsArchive
+from index import ArchiveIndex
+
+def archive_paths(path, count: int) -> list[bytes]:
+    # The path blocks write_archive put at the end of the archive
+    with open(path, "rb") as archive_file:
+        table = archive_file.read()[-count * synth.path_blocksize:]
+    return [table[i * synth.path_blocksize : (i + 1) * synth.path_blocksize] for i in range(count)]
+
+@pytest.mark.parametrize("options", [
+    {},
+    {"spurious": 0.3},
+    {"unnamed": 0.3},
+    {"mixed": 0.4, "spurious": 0.1, "seed": 7},
+])
+def test_layout(make_archive, options):
+    path, layout = make_archive(50, **options)
+    flacs = SablsUnarchiver.index_archive(path, progress_callback=None, use_cache=False)
+    
+    assert len(flacs) == len(layout)
+    assert list(zip(flacs.offsets, flacs.lengths)) == layout
+    assert not any(flacs.flags)
+    
+    blocks = archive_paths(path, len(layout))
+    for i, block in enumerate(blocks):
+        assert flacs.path_block(i) == block
+        assert flacs.path(i) == block.rstrip(b"\0").decode("utf-8")
+        assert flacs[i] == (layout[i][0], block, layout[i][1], 0)
+    assert flacs.file_paths() == b"".join(blocks)
+
+def test_kinds(make_archive):
+    path, layout = make_archive(50, mixed=0.5, seed=11)
+    flacs = SablsUnarchiver.index_archive(path, progress_callback=None, use_cache=False)
+    with open(path, "rb") as archive_file:
+        data = archive_file.read()
+    for i, (offset, _) in enumerate(layout):
+        assert formats.formats[flacs.kinds[i]].signature == data[offset : offset + 4]
+    assert {formats.FLAC, formats.RIFF, formats.OGG} <= set(flacs.kinds)
+
+def test_entry_at(archive):
+    path, layout = archive
+    flacs = SablsUnarchiver.index_archive(path, progress_callback=None, use_cache=False)
+    for i, (offset, length) in enumerate(layout):
+        assert flacs.entry_at(offset) == i
+        assert flacs.entry_at(offset + length - 1) == i
+    end = layout[-1][0] + layout[-1][1]
+    assert flacs.entry_at(end) is None
+
+def test_select_file(archive):
+    path, layout = archive
+    flacs = SablsUnarchiver.index_archive(path, progress_callback=None, use_cache=False)
+    with open(path, "rb") as archive_file:
+        data = archive_file.read()
+    with SablsArchive(path) as mapped:
+        for i, (offset, length) in enumerate(layout):
+            entry = SablsUnarchiver.select_file(mapped, flacs, i)
+            assert entry == data[offset : offset + length]
+            entry.release()
+
+def test_pickle(archive):
+    path, _ = archive
+    flacs = SablsUnarchiver.index_archive(path, progress_callback=None, use_cache=False, hashes=True)
+    copy = pickle.loads(pickle.dumps(flacs))
+    assert copy == flacs
+    assert copy.hashes == flacs.hashes
+
+def test_empty():
+    flacs = ArchiveIndex([], [], [], b"")
+    assert len(flacs) == 0
+    assert flacs.file_paths() == b""
+    assert flacs.entry_at(0) is None
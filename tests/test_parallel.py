@@ -0,0 +1,57 @@
+import pytest
+from explorer import SablsUnarchiver, SablsArchive, _scan_range
+
+def serial_scan(path) -> list[tuple[int, int]]:
+    with open(path, "rb") as archive_file:
+        return list(SablsUnarchiver.scan_entries(archive_file))
+
+@pytest.fixture
+def small_ranges(monkeypatch):
+    # Cuts even these small archives into a range per few entries, so plenty of boundaries land inside them
+    monkeypatch.setattr(SablsUnarchiver, "parallel_range_size", 32 * 1024)
+
+@pytest.mark.parametrize("options", [
+    {"seed": 1},
+    {"seed": 2, "spurious": 0.3},
+    {"seed": 3, "mixed": 0.4, "unnamed": 0.2},
+])
+def test_scans_agree(make_archive, small_ranges, options):
+    path, layout = make_archive(60, **options)
+    streamed = SablsUnarchiver.index_archive(path, progress_callback=None, use_cache=False, jobs=1)
+    with SablsArchive(path) as mapped:
+        mapped_index = SablsUnarchiver.find_flacs(mapped, progress_callback=None)
+    parallel = SablsUnarchiver.find_flacs_parallel(path, jobs=3, progress_callback=None)
+    through_index_archive = SablsUnarchiver.index_archive(path, progress_callback=None, use_cache=False, jobs=3)
+    
+    assert streamed == mapped_index == parallel == through_index_archive
+    assert list(zip(parallel.offsets, parallel.lengths)) == layout
+
+@pytest.mark.parametrize("chunk_size", [7, 64, 1000, 4096])
+def test_chunk_boundaries(archive, chunk_size):
+    # Signatures split over a chunk boundary, or short enough to fit in the overlap, are found once
+    path, _ = archive
+    expected = serial_scan(path)
+    with open(path, "rb") as archive_file:
+        assert list(SablsUnarchiver.scan_entries(archive_file, chunk_size=chunk_size)) == expected
+    with SablsArchive(path) as mapped:
+        assert list(SablsUnarchiver.scan_entries(mapped, chunk_size=chunk_size)) == expected
+
+def test_range_boundaries(archive):
+    # Cutting the archive right through every signature still finds each one in exactly one range
+    path, layout = archive
+    expected = serial_scan(path)
+    with open(path, "rb") as archive_file:
+        size = len(archive_file.read())
+    for shift in range(5):
+        cuts = sorted({0, size} | {offset + shift for offset, _ in layout if 0 < offset + shift < size})
+        found = []
+        for start, end in zip(cuts, cuts[1:]):
+            found += _scan_range(path, start, end)
+        assert found == expected
+
+def test_progress(archive, small_ranges):
+    path, _ = archive
+    reported = []
+    SablsUnarchiver.find_flacs_parallel(path, jobs=2, progress_callback=reported.append)
+    assert reported[-1] == float("inf")
+    assert reported[:-1] == sorted(reported[:-1]) and reported[-2] == 100
@@ -0,0 +1,59 @@
+from fnmatch import fnmatchcase
+import pytest
+from search import PathSearch, literal_runs
+
+globs = [
+    "*", "sound\\vox\\*", "sound/vox/*", "SOUND/VOX/*", "*pistol*", "*_0?", "sound\\*\\bank_0[0-3]\\*",
+    "*[!a-m]", "*\\snd_00001?", "*[brackets]*", "*[[]brackets]*", "*\\[*", "a", "?", "*.d", "music\\th*",
+    "*hello world", "sound\\v[!o]x\\*", "*[]]*", "*v[]]x*", "*[!]]", "*star[*]name", "[", "*[", "*[*",
+    "x*x", "*\\bank_0*\\snd_*1", "*o*o*", "*snd_0001*", "*weapons*pistol_?1", "*.", "..*", "", "*\\",
+]
+
+def expected(paths: list[str], pattern: str) -> list[int]:
+    pattern = pattern.replace("/", "\\").lower()
+    return [row for row, path in enumerate(paths) if fnmatchcase(path.lower(), pattern)]
+
+@pytest.fixture(scope="module")
+def search(named) -> PathSearch:
+    return PathSearch(named[1])
+
+@pytest.mark.parametrize("pattern", globs)
+def test_glob_matches_fnmatch(named, search, pattern):
+    paths, _ = named
+    assert sorted(entry for _, entry in search.glob(pattern)) == expected(paths, pattern)
+
+@pytest.mark.parametrize("query", ["vox", "VOX\\", "snd_0001", "bank_03\\snd", "é", "..", "x" * 127, "nothing like it", "\\"])
+def test_substring(named, search, query):
+    paths, _ = named
+    wanted = [row for row, path in enumerate(paths) if query.replace("/", "\\").lower() in path.lower()]
+    assert [entry for _, entry in search.substring(query)] == wanted
+    assert [entry for _, entry in search.substring(query, limit=3)] == wanted[:3]
+
+@pytest.mark.parametrize("query", ["sound\\", "Sound/Vox/", "music", "a", "", "zzz"])
+def test_prefix(named, search, query):
+    paths, _ = named
+    normalized = query.replace("/", "\\").lower()
+    assert sorted(entry for _, entry in search.prefix(query)) == [row for row, path in enumerate(paths) if path.lower().startswith(normalized)]
+
+def test_search_picks_glob_or_substring(search):
+    assert search.search("*pistol*") == search.glob("*pistol*")
+    assert search.search("pistol") == search.substring("pistol")
+
+def test_glob_limit(named, search):
+    paths, _ = named
+    # with a plain start the candidates come in path order, so which five isn't archive order
+    found = [entry for _, entry in search.glob("sound\\*", limit=5)]
+    assert len(found) == 5 and set(found) <= set(expected(paths, "sound\\*"))
+    assert [entry for _, entry in search.glob("*\\snd_*", limit=5)] == expected(paths, "*\\snd_*")[:5]
+
+def test_several_archives(named):
+    paths, index = named
+    search = PathSearch({"first": index, "second": index})
+    found = search.substring("hello world")
+    assert found == [("first", paths.index("Sound\\Vox\\Hello World")), ("second", paths.index("Sound\\Vox\\Hello World"))]
+    assert len(search) == 2 * len(paths)
+
+def test_literal_runs():
+    assert literal_runs("sound\\*\\bank_0[0-3]\\snd?x") == ["sound\\", "\\bank_0", "\\snd", "x"]
+    assert literal_runs("*[!]]ab[") == ["ab["]
+    assert literal_runs("***") == []
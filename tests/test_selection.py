@@ -0,0 +1,61 @@
+import re
+from fnmatch import fnmatchcase
+import pytest
+import selection
+from selection import PathTable
+
+globs = [
+    "*", "**", "sound\\vox\\*", "sound/vox/*", "SOUND/VOX/*", "*pistol*", "*_0?", "sound\\*\\bank_0[0-3]\\*",
+    "*[!a-m]", "*\\snd_00001?", "*[brackets]*", "*[[]brackets]*", "*\\[*", "a", "?", "*.d", "music\\th*",
+    "*hello world", "sound\\v[!o]x\\*", "*[]]*", "*v[]]x*", "*[!]]", "*star[*]name", "[", "*[", "*[*",
+    "x*x", "*\\bank_0*\\snd_*1", "*o*o*", "*snd_0001*", "*weapons*pistol_?1", "*.", "..*", "", "*\\",
+    "*[^a]", "*[a-]", "?*?*?*?*?*?*?*?*?*?*?*?*?*?*?*?*?*?*?*?*?*?*?*?*?*?*?*?*?*?*?*?*?*",
+]
+
+regexes = [
+    r"\s", r"[^x]+$", r"^sound\\vox", r"snd_0000[0-4]$", r"bank_\d\d\\", r"^$", r"", r"x*", r"vox|music",
+    r"\bworld", r"Hello", r"HELLO", r"(?i)hello", r"a\\b", r"[^\\]+\\[^\\]+$", r"\S{30,}", r"^.{0,3}$", r"\n",
+    r"[\s\S]{200}", r"d\s", r"\s+s", r"e$", r"^.$", r"x{127}", r"th.me", r"(?s).{128}", r"[^a-z\\_0-9]",
+]
+
+def normalized(pattern: str) -> str:
+    return pattern.replace("/", "\\").lower()
+
+@pytest.fixture(scope="module")
+def table(named) -> PathTable:
+    return PathTable(named[1])
+
+@pytest.mark.parametrize("pattern", globs)
+def test_glob_matches_fnmatch(named, table, pattern):
+    paths, _ = named
+    assert list(table.glob(pattern)) == [row for row, path in enumerate(paths) if fnmatchcase(path.lower(), normalized(pattern))]
+
+@pytest.mark.parametrize("pattern", regexes)
+def test_regex_matches_search(named, table, pattern):
+    # One pass over the whole table gives what searching every path on its own does
+    paths, _ = named
+    regex = re.compile(pattern.encode("utf-8"), re.IGNORECASE if pattern != pattern.lower() else 0)
+    assert list(table.regex(pattern)) == [row for row, path in enumerate(paths) if regex.search(path.lower().encode("utf-8"))]
+
+@pytest.mark.parametrize("prefixes", [["sound\\"], ["Sound/Vox/", "music\\"], ["a"], ["zzz"], ["sound\\weapons\\pistol_0", "x"]])
+def test_prefix(named, table, prefixes):
+    paths, _ = named
+    wanted = [normalized(prefix) for prefix in prefixes]
+    assert list(table.prefix(*prefixes)) == [row for row, path in enumerate(paths) if path.lower().startswith(tuple(wanted))]
+
+def test_select_unions_in_archive_order(named, table):
+    paths, index = named
+    chosen = table.select(globs=["*pistol*", "music\\*"], regexes=[r"hello"], prefixes=["a\\"])
+    expected = sorted(set(table.glob("*pistol*")) | set(table.glob("music\\*")) | set(table.regex("hello")) | set(table.prefix("a\\")))
+    assert list(chosen) == expected
+    assert list(selection.select(index, globs=["*pistol*"])) == list(table.glob("*pistol*"))
+
+def test_path(named, table):
+    paths, _ = named
+    for row, path in enumerate(paths):
+        assert table.path(row) == path.lower().encode("utf-8")
+
+def test_glob_to_regex_stays_in_its_record():
+    regex = re.compile(selection.glob_to_regex("a*[!b]?"))
+    assert not regex.fullmatch(b"a\nc\nd")
+    assert regex.fullmatch(b"axcd")
@@ -0,0 +1,157 @@
+import asyncio
+import pytest
+import formats
+from explorer import SablsUnarchiver
+from server import EntryServer, byte_range
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("bytes=0-99", (0, 100)),
+    ("bytes=500-", (500, 1000)),
+    ("bytes=999-999", (999, 1000)),
+    ("bytes=990-5000", (990, 1000)),
+    ("bytes=-100", (900, 1000)),
+    ("bytes=-2000", (0, 1000)),
+    ("bytes= 5-9", (5, 10)),
+    ("bytes=5-2", None),        # backwards
+    ("bytes=1500-1000", None),  # backwards and past the end, still just malformed
+    ("bytes=0-1,5-6", None),    # more than one range, the whole entry will do
+    ("items=0-1", None),
+    ("bytes=a-b", None),
+    ("bytes=-", None),
+    ("bytes=5", None),
+    ("bytes=1-x", None),
+])
+def test_byte_range(header, expected):
+    assert byte_range(header, 1000) == expected
+
+@pytest.mark.parametrize("header, length", [
+    ("bytes=1000-", 1000),
+    ("bytes=1000-1001", 1000),
+    ("bytes=-0", 1000),
+    ("bytes=0-0", 0),
+    ("bytes=-5", 0),
+])
+def test_byte_range_unsatisfiable(header, length):
+    with pytest.raises(ValueError):
+        byte_range(header, length)
+
+async def request(port: int, method: str, target: str, headers: dict = None, connection: tuple = None):
+    # (status, headers, body) of one request, over connection when given one to keep alive
+    reader, writer = connection or await asyncio.open_connection("127.0.0.1", port)
+    lines = ["{} {} HTTP/1.1".format(method, target), "Host: localhost"]
+    lines += ["{}: {}".format(name, value) for name, value in (headers or {}).items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+    await writer.drain()
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+    status = int(head[0].split(" ")[1])
+    response = {}
+    for line in head[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            response[name.strip().lower()] = value.strip()
+    body = b"" if method == "HEAD" else await reader.readexactly(int(response["content-length"]))
+    if connection is None:
+        writer.close()
+    return status, response, body
+
+@pytest.fixture
+def served(archive):
+    # (archive bytes, index, archive name, EntryServer over it), run starts it on a free port
+    path, _ = archive
+    flacs = SablsUnarchiver.index_archive(path, progress_callback=None, hashes=True)
+    return path.read_bytes(), flacs, path.name, EntryServer({path.name: (path, flacs)})
+
+def run(entry_server: EntryServer, test):
+    async def main():
+        server = await entry_server.start("127.0.0.1", 0)
+        async with server:
+            await test(server.sockets[0].getsockname()[1])
+    asyncio.run(main())
+
+def test_ranges(served):
+    data, flacs, name, entry_server = served
+    index = list(flacs.kinds).index(formats.FLAC)
+    url = entry_server.url(name, index)
+    offset, length = flacs.offsets[index], flacs.lengths[index]
+    entry = data[offset : offset + length]
+    
+    async def test(port):
+        status, headers, body = await request(port, "GET", url)
+        assert (status, body) == (200, entry)
+        assert headers["content-type"] == "audio/flac" and headers["accept-ranges"] == "bytes"
+        assert headers["etag"] == '"{}"'.format(flacs.content_hash(index).hex())
+        
+        status, headers, body = await request(port, "GET", url, {"Range": "bytes=10-19"})
+        assert (status, body, headers["content-range"]) == (206, entry[10:20], "bytes 10-19/{}".format(length))
+        
+        status, headers, body = await request(port, "GET", url, {"Range": "bytes=-16"})
+        assert (status, body) == (206, entry[-16:])
+        assert headers["content-range"] == "bytes {}-{}/{}".format(length - 16, length - 1, length)
+        
+        status, _, body = await request(port, "GET", url, {"Range": "bytes=100-"})
+        assert (status, body) == (206, entry[100:])
+        
+        status, _, body = await request(port, "GET", url, {"Range": "bytes=20-10"})
+        assert (status, body) == (200, entry)
+        
+        status, headers, body = await request(port, "GET", url, {"Range": "bytes={}-".format(length)})
+        assert status == 416 and headers["content-range"] == "bytes */{}".format(length)
+        assert body == b"416 Range Not Satisfiable\n"
+    run(entry_server, test)
+
+def test_head(served):
+    data, flacs, name, entry_server = served
+    index = list(flacs.kinds).index(formats.FLAC)
+    url = entry_server.url(name, index)
+    
+    async def test(port):
+        # HEAD never gets a body, errors included, so the next response on the connection lines up
+        connection = await asyncio.open_connection("127.0.0.1", port)
+        status, headers, _ = await request(port, "HEAD", url, connection=connection)
+        assert status == 200 and int(headers["content-length"]) == flacs.lengths[index]
+        status, headers, _ = await request(port, "HEAD", url, {"Range": "bytes=99999999-"}, connection=connection)
+        assert status == 416 and int(headers["content-length"]) > 0
+        status, _, _ = await request(port, "HEAD", "/" + name + "/nothing.flac", connection=connection)
+        assert status == 404
+        status, _, body = await request(port, "GET", url, {"Range": "bytes=0-3"}, connection=connection)
+        assert (status, body) == (206, b"fLaC")
+        connection[1].close()
+    run(entry_server, test)
+
+def test_every_entry(served):
+    data, flacs, name, entry_server = served
+    
+    async def test(port):
+        connection = await asyncio.open_connection("127.0.0.1", port)
+        for index in range(len(flacs)):
+            status, _, body = await request(port, "GET", entry_server.url(name, index), connection=connection)
+            assert status == 200
+            assert body == data[flacs.offsets[index] : flacs.offsets[index] + flacs.lengths[index]]
+        connection[1].close()
+    run(entry_server, test)
+
+def test_errors(served):
+    _, _, name, entry_server = served
+    
+    async def test(port):
+        assert (await request(port, "POST", "/"))[0] == 405
+        assert (await request(port, "GET", "/nothing/"))[0] == 404
+        assert (await request(port, "GET", "/" + name + "/"))[0] == 200
+        assert (await request(port, "GET", "/"))[0] == 200
+    run(entry_server, test)
+
+def test_find(served):
+    _, flacs, name, entry_server = served
+    for index in range(len(flacs)):
+        url = entry_server.url(name, index)
+        assert entry_server.find(url) == (name, index)
+        # entries case insensitively, the archive by its name as it is
+        assert entry_server.find(url[: len(name) + 2] + url[len(name) + 2 :].upper()) == (name, index)
+    assert entry_server.find("/" + name) == (name, None)
+
+def test_loopback_only(served):
+    entry_server = served[3]
+    with pytest.raises(ValueError):
+        asyncio.run(entry_server.start("0.0.0.0", 0))